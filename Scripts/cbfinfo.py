@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+
+# This script validates a CNTK binary format file, as produced by ctf2bin.py,
+# and reports statistics about each of its streams.
+#
+# The file is memory-mapped and never loaded into Python objects: the header
+# and the chunk table are checked first, then every chunk is walked in place
+# (in a pool of worker processes if --workers is given) to verify its layout,
+# its checksum and the ranges of sparse indices, and to collect:
+#   - a histogram of the sequence lengths (in samples) of each stream,
+#   - the number of non-zero values of each sparse stream.
+#
+# Example usage:
+#    python cbfinfo.py train.bin --workers 4
+#
+# The exit code is 1 if any error was found.
+
+import sys
+import argparse
+import mmap
+import struct
+import zlib
+import multiprocessing
+import numpy as np
+
+from ctf2bin import MAGIC_NUMBER, CBF_VERSION, ElementType, MatrixEncodingType, read_header
+
+class StreamStatistics:
+    def __init__(self, name, matrix_type):
+        self.name = name
+        self.matrix_type = matrix_type
+        # number of sequences of each length (in samples)
+        self.lengths = np.zeros(1, dtype=np.int64)
+        # for sparse streams, the total and the largest per sample nnz count
+        self.nnz = 0
+        self.max_sample_nnz = 0
+
+    def is_sparse(self):
+        return self.matrix_type == MatrixEncodingType.SPARSE_CSC
+
+    def num_sequences(self):
+        return int(self.lengths.sum())
+
+    def num_samples(self):
+        return int(np.dot(self.lengths, np.arange(self.lengths.size)))
+
+    def add_lengths(self, lengths):
+        self.merge_lengths(np.bincount(lengths))
+
+    def merge_lengths(self, histogram):
+        if histogram.size > self.lengths.size:
+            histogram = histogram.copy()
+            histogram[:self.lengths.size] += self.lengths
+            self.lengths = histogram
+        else:
+            self.lengths[:histogram.size] += histogram
+
+    def merge(self, other):
+        self.merge_lengths(other.lengths)
+        self.nnz += other.nnz
+        self.max_sample_nnz = max(self.max_sample_nnz, other.max_sample_nnz)
+
+    # Sequence length histogram with power of two buckets, e.g. '1: 10, 2-3: 4'
+    def format_lengths(self):
+        buckets = []
+        low = 0
+        while low < self.lengths.size:
+            high = max(2 * low, 1)
+            count = int(self.lengths[low:high].sum())
+            if count > 0:
+                label = str(low) if high - low == 1 else "{0}-{1}".format(low, high - 1)
+                buckets.append("{0}: {1}".format(label, count))
+            low = high
+        return ", ".join(buckets)
+
+class Report:
+    def __init__(self, path):
+        self.path = path
+        self.streams = []
+        self.chunks = []
+        self.statistics = []
+        self.errors = []
+        self.has_checksums = False
+
+    def is_valid(self):
+        return len(self.errors) == 0
+
+    def write(self, output):
+        output.write("{0}: {1} chunks, {2} sequences, {3} samples\n".format(self.path,
+            len(self.chunks), sum(c[1] for c in self.chunks), sum(c[2] for c in self.chunks)))
+        output.write("checksums: {0}\n".format("present" if self.has_checksums else "absent"))
+        for ((matrix_type, name, element_type, sample_dim), statistics) in zip(self.streams, self.statistics):
+            output.write("stream '{0}': {1}, {2}, dimension {3}, {4} samples\n".format(name,
+                "sparse" if statistics.is_sparse() else "dense",
+                "float" if element_type == ElementType.FLOAT else "double",
+                sample_dim, statistics.num_samples()))
+            output.write("  sequence lengths: {0}\n".format(statistics.format_lengths()))
+            if statistics.is_sparse():
+                output.write("  nnz: {0} total, {1:.2f} per sample, {2} max per sample\n".format(
+                    statistics.nnz, statistics.nnz / float(max(statistics.num_samples(), 1)),
+                    statistics.max_sample_nnz))
+        for error in self.errors:
+            output.write("error: {0}\n".format(error))
+
+# Walks the data of a chunk in [offset, end), checking its layout against
+# the chunk table and the stream descriptions.
+def scan_chunk(data, streams, offset, end, num_sequences, num_samples, statistics):
+    position = offset + 4 * num_sequences
+    if position > end:
+        raise ValueError("the sequence table exceeds the chunk")
+    sequences = np.frombuffer(data, dtype=np.uint32, count=num_sequences, offset=offset)
+    if int(sequences.sum()) != num_samples:
+        raise ValueError("the sequences have {0} samples instead of {1}".format(
+            int(sequences.sum()), num_samples))
+
+    for ((matrix_type, name, element_type, sample_dim), stream) in zip(streams, statistics):
+        value_size = 4 if element_type == ElementType.FLOAT else 8
+        lengths = np.empty(num_sequences, dtype=np.int64)
+        for i in range(num_sequences):
+            if position + 4 > end:
+                raise ValueError("stream '{0}', sequence {1} exceeds the chunk".format(name, i))
+            (length,) = struct.unpack_from('I', data, position)
+            lengths[i] = length
+            if matrix_type == MatrixEncodingType.DENSE:
+                position += 4 + length * sample_dim * value_size
+            else:
+                (nnz,) = struct.unpack_from('i', data, position + 4) if position + 8 <= end else (-1,)
+                position += 8
+                if nnz < 0 or position + nnz * (value_size + 4) + 4 * length > end:
+                    raise ValueError("stream '{0}', sequence {1} exceeds the chunk".format(name, i))
+                indices = np.frombuffer(data, dtype=np.int32, count=nnz, offset=position + nnz * value_size)
+                sizes = np.frombuffer(data, dtype=np.int32, count=length, offset=position + nnz * (value_size + 4))
+                if nnz > 0 and (indices.min() < 0 or indices.max() >= sample_dim):
+                    raise ValueError("stream '{0}', sequence {1} has indices out of range".format(name, i))
+                if length > 0 and (sizes.min() < 0 or int(sizes.sum()) != nnz):
+                    raise ValueError("stream '{0}', sequence {1} has inconsistent nnz counts".format(name, i))
+                stream.nnz += nnz
+                if length > 0:
+                    stream.max_sample_nnz = max(stream.max_sample_nnz, int(sizes.max()))
+                position += nnz * (value_size + 4) + 4 * length
+            if position > end:
+                raise ValueError("stream '{0}', sequence {1} exceeds the chunk".format(name, i))
+        if np.any(lengths > sequences):
+            raise ValueError("stream '{0}' has sequences longer than the sequence table".format(name))
+        stream.add_lengths(lengths)
+
+    if position != end:
+        raise ValueError("{0} trailing bytes".format(end - position))
+
+# Scans a list of (index, offset, end, number of sequences, number of samples,
+# checksum) chunks. Returns (errors, statistics).
+def scan_chunks(path, streams, chunks, verify_checksums):
+    errors = []
+    statistics = [StreamStatistics(name, matrix_type) for (matrix_type, name, _, _) in streams]
+    with open(path, "rb") as binfile:
+        data = mmap.mmap(binfile.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        for (index, offset, end, num_sequences, num_samples, checksum) in chunks:
+            try:
+                if verify_checksums and checksum is not None:
+                    actual = zlib.crc32(memoryview(data)[offset:end]) & 0xffffffff
+                    if actual != checksum:
+                        raise ValueError("checksum mismatch (0x{0:08x} instead of 0x{1:08x})".format(actual, checksum))
+                scan_chunk(data, streams, offset, end, num_sequences, num_samples, statistics)
+            except ValueError as error:
+                errors.append("chunk {0}: {1}".format(index, error))
+    finally:
+        data.close()
+    return errors, statistics
+
+# Validates a binary file and collects its statistics, scanning the chunks in
+# num_workers processes.
+def verify(path, num_workers=1, verify_checksums=True):
+    report = Report(path)
+    with open(path, "rb") as binfile:
+        prefix = binfile.read(12)
+        if len(prefix) < 12 or struct.unpack('Q', prefix[:8])[0] != MAGIC_NUMBER:
+            report.errors.append("the file does not start with the magic number")
+            return report
+        (version,) = struct.unpack('I', prefix[8:])
+        if version != CBF_VERSION:
+            report.errors.append("unsupported version {0}".format(version))
+            return report
+        try:
+            (report.streams, report.chunks, header_offset) = read_header(binfile)
+        except (ValueError, struct.error) as error:
+            report.errors.append("invalid header: {0}".format(error))
+            return report
+
+    report.has_checksums = all(c[3] is not None for c in report.chunks)
+    report.statistics = [StreamStatistics(name, matrix_type) for (matrix_type, name, _, _) in report.streams]
+    offsets = [c[0] for c in report.chunks] + [header_offset]
+    if offsets[0] < 12 or any(b < a for (a, b) in zip(offsets[:-1], offsets[1:])):
+        report.errors.append("the chunk offsets are not increasing within the data section")
+        return report
+
+    chunks = [(i, offsets[i], offsets[i + 1], c[1], c[2], c[3]) for (i, c) in enumerate(report.chunks)]
+    num_tasks = max(1, min(len(chunks), 4 * num_workers))
+    tasks = [chunks[i::num_tasks] for i in range(num_tasks)]
+    if num_workers <= 1:
+        results = [scan_chunks(path, report.streams, task, verify_checksums) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(num_workers)
+        try:
+            results = [r.get() for r in [pool.apply_async(scan_chunks,
+                (path, report.streams, task, verify_checksums)) for task in tasks]]
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    for (errors, statistics) in results:
+        report.errors.extend(errors)
+        for (total, partial) in zip(report.statistics, statistics):
+            total.merge(partial)
+    report.errors.sort(key=lambda e: int(e.split(':')[0].split()[1]))
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Validates a CNTK binary format file and reports statistics about its streams.")
+    parser.add_argument('input', help="CNTK binary format file.")
+    parser.add_argument('--workers', type=int, help='Number of worker processes scanning the chunks. Default is 1',
+        default=1, required=False)
+    parser.add_argument('--skip_checksums', help='Do not verify the chunk checksums',
+        action='store_true', required=False)
+    args = parser.parse_args()
+
+    report = verify(args.input, args.workers, not args.skip_checksums)
+    report.write(sys.stdout)
+    sys.exit(0 if report.is_valid() else 1)
+
+
+#####################################################################################################
+# Tests
+#####################################################################################################
+try:
+    import StringIO
+    stringio = StringIO.StringIO
+except ImportError:
+    from io import StringIO
+    stringio = StringIO
+try:
+    import pytest
+except ImportError:
+    pass
+
+INPUT = """0\t|x 1 2 3\t|y 5:1 1:0.5
+0\t|x 4 5 6 |# comment
+0\t|y 9:2
+1\t|x 7 8 9\t|y 0:1
+|x 0.1 0.2 0.3
+2 |y 3:1 3:2 2:-1
+3\t|x 1e-3 -2.5 1e10 |y 7:0.25
+"""
+
+def _write(tmpdir, text, chunk_size):
+    import ctf2bin
+    header = tmpdir.join("header.txt")
+    header.write("features x dense 3\nlabels y sparse 10\n")
+    path = str(tmpdir.join("data.bin"))
+    with open(path, "wb") as output:
+        ctf2bin.convert(stringio(text), output, ctf2bin.build_converters(str(header), ElementType.FLOAT), chunk_size)
+    return path
+
+def test_validFile(tmpdir):
+    path = _write(tmpdir, INPUT * 5, 50)
+    for num_workers in [1, 2]:
+        report = verify(path, num_workers)
+        assert report.is_valid()
+        assert report.has_checksums
+        assert len(report.chunks) > 1
+        (features, labels) = report.statistics
+        assert (features.num_sequences(), features.num_samples()) == (20, 25)
+        assert features.lengths.tolist() == [5, 5, 10]
+        assert (labels.num_samples(), labels.nnz, labels.max_sample_nnz) == (25, 40, 3)
+
+    output = stringio()
+    report.write(output)
+    assert "  sequence lengths: 0: 5, 1: 5, 2-3: 10\n" in output.getvalue()
+
+def test_corruptedChunk(tmpdir):
+    path = _write(tmpdir, INPUT * 5, 50)
+    data = bytearray(open(path, "rb").read())
+    # flip a bit in the first value of the first chunk
+    data[12 + 4 * 2 + 4] ^= 1
+    open(path, "wb").write(bytes(data))
+
+    report = verify(path)
+    assert report.errors == ["chunk 0: " + report.errors[0].split(': ', 1)[1]]
+    assert report.errors[0].startswith("chunk 0: checksum mismatch")
+    assert verify(path, verify_checksums=False).is_valid()
+
+def test_invalidSparseIndex(tmpdir):
+    path = _write(tmpdir, "0 |y 3:1\n", 50)
+    data = bytearray(open(path, "rb").read())
+    # the index of the only sparse value: chunk start, sequence table, dense stream, nnz header, value
+    struct.pack_into('i', data, 12 + 4 + 4 + 8 + 4, 10)
+    open(path, "wb").write(bytes(data))
+
+    report = verify(path, verify_checksums=False)
+    assert report.errors == ["chunk 0: stream 'labels', sequence 0 has indices out of range"]
+
+def test_invalidHeader(tmpdir):
+    path = _write(tmpdir, INPUT, 50)
+    data = open(path, "rb").read()
+    open(path, "wb").write(data[:-8] + struct.pack('q', len(data)))
+    assert verify(path).errors[0].startswith("invalid header")
+
+    open(path, "wb").write(b"not a binary file")
+    assert verify(path).errors == ["the file does not start with the magic number"]
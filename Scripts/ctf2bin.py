@@ -13,15 +13,28 @@
 #   <matrix type> is the matrix type, i.e., dense or sparse
 #   <sample dimension> is the dimensino of each sample for the input
 #
+# By default the input is parsed in blocks of whole sequences into NumPy
+# buffers, optionally in a pool of worker processes (--workers). The original,
+# sample-by-sample implementation is kept as --engine legacy; --benchmark runs
+# both engines on the same input and reports their throughput.
+#
 
 import sys
 import argparse
 import struct
 import os
-from collections import OrderedDict
+import time
+import tempfile
+import zlib
+import multiprocessing
+from collections import OrderedDict, deque
+import numpy as np
 
 MAGIC_NUMBER = 0x636e746b5f62696e;
 CBF_VERSION = 1;
+# Marks the optional table of per-chunk CRC-32 checksums, which follows the
+# chunk table (and is ignored by the CNTK binary reader).
+CHECKSUM_MAGIC_NUMBER = 0x636e746b5f637263;
 
 class ElementType:
     FLOAT = 0
@@ -107,8 +120,8 @@ class DenseConverter(Converter):
 class SparseConverter(Converter):
 
     def add_sample(self, sample):
-        pairs = map(lambda x: (int(x[0]),float(x[1])),
-            [pair.split(':', 1) for pair in sample])
+        pairs = [(int(x[0]), float(x[1]))
+            for x in [pair.split(':', 1) for pair in sample]]
 
         for pair in pairs:
             index = pair[0]
@@ -169,17 +182,27 @@ def process_sequence(data, converters, chunk):
     chunk.add_sequence(sequence_length_samples)
     return byte_size
 
+# Forwards writes to the output while updating the checksum of a chunk
+class ChecksumWriter:
+    def __init__(self, output, chunk):
+        self.output = output
+        self.chunk = chunk
+
+    def write(self, data):
+        self.chunk.update_checksum(data)
+        self.output.write(data)
+
 # Output a binary chunk
 def write_chunk(binfile, converters, chunk):
     binfile.flush()
     chunk.offset = binfile.tell()
+    output = ChecksumWriter(binfile, chunk)
     # write out the number of samples for each sequence in the chunk
-    binfile.write(b''.join([struct.pack('I', x) for x in chunk.sequences]))
+    output.write(b''.join([struct.pack('I', x) for x in chunk.sequences]))
 
     for converter in converters.values():
-        converter.write_data(binfile)
+        converter.write_data(output)
         converter.reset()
-    # TODO: add a hash of the chunk
 
 def get_converter(input_type, name, sample_dim, element_type):
     if(input_type.lower() == 'dense'):
@@ -203,6 +226,8 @@ class Chunk:
     def __init__(self):
         self.offset = 0
         self.sequences = []
+        # CRC-32 of the chunk data
+        self.checksum = 0
 
     def num_sequences(self):
         return len(self.sequences)
@@ -213,6 +238,9 @@ class Chunk:
     def add_sequence(self, num_samples):
         return self.sequences.append(num_samples)
 
+    def update_checksum(self, data):
+        self.checksum = zlib.crc32(data, self.checksum) & 0xffffffff
+
 class Header:
     def __init__(self, converters):
         self.converters = converters
@@ -242,59 +270,714 @@ class Header:
             output_file.write(struct.pack('I', chunk.num_sequences()))
             # uint32: number of samples in the chunk
             output_file.write(struct.pack('I', chunk.num_samples()))
+        # write the checksum table: the checksum magic number (uint64), then
+        # the CRC-32 of each chunk (uint32)
+        output_file.write(struct.pack('Q', CHECKSUM_MAGIC_NUMBER))
+        output_file.write(b''.join([struct.pack('I', chunk.checksum) for chunk in self.chunks]))
 
         output_file.write(struct.pack('q', header_offset));
 
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description="Transforms a CNTK Text Format file into CNTK binary format given a header.")
-    parser.add_argument('--input', help="CNTK Text Format file to convert to binary.", required=True)
-    parser.add_argument('--header',  help="Header file describing each stream in the input.", required=True)
-    parser.add_argument('--chunk_size', type=int, help='Chunk size in bytes.', required=True)
-    parser.add_argument('--output', help='Name of the output file, stdout if not given', required=True)
-    parser.add_argument('--precision', help='Floating point precision (double or float). Default is float',
-        choices=["float", "double"], default="float", required=False)
-    args = parser.parse_args()
-
-    output = open(args.output, "wb")
+# Output the very first bytes of a binary file: the magic number and the version.
+def write_file_prefix(output):
     # The very first 8 bytes of the file is the CBF magic number.
     output.write(struct.pack('Q', MAGIC_NUMBER));
     # Next 4 bytes is the CBF version.
     output.write(struct.pack('I', CBF_VERSION));
 
-    converters = build_converters(args.header, 
-        ElementType.FLOAT if args.precision == 'float' else ElementType.DOUBLE)
+# Sample-by-sample conversion of a CTF input stream into the binary format.
+def convert_legacy(input_file, output, converters, chunk_size):
+    write_file_prefix(output)
 
     header = Header(converters)
     chunk = Chunk()
 
-    with open(args.input, "r") as input_file:
-        sequence = []
-        seq_id = None
-        estimated_chunk_size = 0
-        for line in input_file:
-            (prefix, _) = line.rstrip().split('|',1)
-            # if the sequence id is empty or not equal to the previous sequence id,
-            # we are at a new sequence.
-            if((not seq_id and not prefix) or (len(prefix) > 0 and seq_id != prefix)):
-                if(len(sequence) > 0):
-                    estimated_chunk_size += process_sequence(sequence, converters, chunk)
-                    sequence = []
-                    if(estimated_chunk_size >= int(args.chunk_size)):
-                        write_chunk(output, converters, chunk)
-                        header.add_chunk(chunk)
-                        chunk = Chunk()
-                seq_id = prefix
-
-            sequence.append(line)
-        # we must parse the last line
-        if(len(sequence) > 0):
-            process_sequence(sequence, converters, chunk)
-
-        write_chunk(output, converters, chunk)
-        header.add_chunk(chunk)
-
-        header.write(output)
-
-        output.flush()
-        output.close()
\ No newline at end of file
+    sequence = []
+    seq_id = None
+    estimated_chunk_size = 0
+    for line in input_file:
+        (prefix, _) = line.rstrip().split('|',1)
+        # if the sequence id is empty or not equal to the previous sequence id,
+        # we are at a new sequence.
+        if((not seq_id and not prefix) or (len(prefix) > 0 and seq_id != prefix)):
+            if(len(sequence) > 0):
+                estimated_chunk_size += process_sequence(sequence, converters, chunk)
+                sequence = []
+                if(estimated_chunk_size >= int(chunk_size)):
+                    write_chunk(output, converters, chunk)
+                    header.add_chunk(chunk)
+                    chunk = Chunk()
+                    estimated_chunk_size = 0
+            seq_id = prefix
+
+        sequence.append(line)
+    # we must parse the last line
+    if(len(sequence) > 0):
+        process_sequence(sequence, converters, chunk)
+
+    write_chunk(output, converters, chunk)
+    header.add_chunk(chunk)
+
+    header.write(output)
+    output.flush()
+
+#####################################################################################################
+# Vectorized conversion engine
+#####################################################################################################
+
+# Default amount of input text (in characters) parsed at once.
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+
+def get_numpy_type(element_type):
+    return np.float32 if element_type == ElementType.FLOAT else np.float64
+
+# Reads the input line by line and groups whole sequences into blocks of
+# roughly block_size characters. Yields (lines, starts) pairs, where starts
+# contains the index of the first line of each sequence in the block.
+def read_blocks(input_file, block_size):
+    lines = []
+    starts = []
+    size = 0
+    seq_id = None
+    for line in input_file:
+        pipe = line.find('|')
+        if pipe < 0:
+            raise ValueError("Invalid input line, no input stream found: '{0}'".format(line.rstrip()))
+        prefix = line[:pipe]
+        # same sequence boundary rule as in convert_legacy
+        if((not seq_id and not prefix) or (len(prefix) > 0 and seq_id != prefix)):
+            if size >= block_size:
+                yield lines, starts
+                lines = []
+                starts = []
+                size = 0
+            starts.append(len(lines))
+            seq_id = prefix
+        lines.append(line)
+        size += len(line)
+    if len(lines) > 0:
+        yield lines, starts
+
+# Lays out per-sequence fields back to back, i.e. for every sequence its
+# slice of each field, in field order. fields is a list of (lengths, words)
+# pairs, where lengths gives the number of uint32 words each sequence has in
+# the flat words array. Returns the packed words and the word offset of each
+# sequence (plus the end offset).
+def interleave(fields, num_sequences):
+    offsets = np.zeros(num_sequences + 1, dtype=np.int64)
+    np.cumsum(sum(lengths for lengths, _ in fields), out=offsets[1:])
+    packed = np.empty(offsets[-1], dtype=np.uint32)
+    base = offsets[:-1].copy()
+    for lengths, words in fields:
+        field_starts = np.cumsum(lengths) - lengths
+        packed[np.repeat(base - field_starts, lengths) + np.arange(words.size)] = words
+        base += lengths
+    return packed, offsets
+
+def as_words(array):
+    return np.ascontiguousarray(array).view(np.uint32)
+
+# Parses all samples of a dense stream. Returns the packed stream data and
+# the estimated byte size of each sequence.
+def convert_dense_block(stream, dtype, samples, counts):
+    (_, name, _, sample_dim) = stream
+    num_sequences = counts.size
+    # every sample must have sample_dim values, not just the block in total
+    sizes = np.array([len(sample.split()) for sample in samples], dtype=np.int64)
+    if np.any(sizes != sample_dim):
+        raise ValueError("Invalid sample dimension for input {0}".format(name))
+    if len(samples) > 0:
+        values = np.fromstring(' '.join(samples), dtype=np.float64, sep=' ')
+    else:
+        values = np.empty(0, dtype=np.float64)
+    if values.size != len(samples) * sample_dim:
+        raise ValueError("Invalid sample dimension for input {0}".format(name))
+
+    words_per_value = np.dtype(dtype).itemsize // 4
+    packed = interleave([
+        (np.ones(num_sequences, dtype=np.int64), counts.astype(np.uint32)),
+        (counts * sample_dim * words_per_value, as_words(values.astype(dtype)))],
+        num_sequences)
+    estimates = counts * sample_dim * np.dtype(dtype).itemsize
+    return packed, estimates
+
+# Parses all samples of a sparse stream into CSC sequences. Returns the packed
+# stream data and the estimated byte size of each sequence.
+def convert_sparse_block(stream, dtype, samples, counts):
+    (_, name, _, sample_dim) = stream
+    num_sequences = counts.size
+    sizes = np.array([sample.count(':') for sample in samples], dtype=np.int64)
+    if len(samples) > 0:
+        pairs = np.fromstring(' '.join(samples).replace(':', ' '), dtype=np.float64, sep=' ')
+    else:
+        pairs = np.empty(0, dtype=np.float64)
+    if pairs.size != 2 * sizes.sum():
+        raise ValueError("Invalid sparse sample for input {0}, expected index:value pairs".format(name))
+
+    indices = pairs[0::2]
+    values = pairs[1::2]
+    if np.any(indices != np.floor(indices)):
+        raise ValueError("Invalid sparse index for input {0}".format(name))
+    indices = indices.astype(np.int64)
+    invalid = (indices < 0) | (indices >= sample_dim)
+    if np.any(invalid):
+        raise ValueError("Invalid sample dimension for input {0}. Max {1}, given {2}"
+                .format(name, sample_dim, indices[np.argmax(invalid)]))
+
+    # sort the entries of each sample by index, keeping the input order of duplicates
+    sample_ids = np.repeat(np.arange(sizes.size), sizes)
+    order = np.lexsort((indices, sample_ids))
+    indices = indices[order]
+    values = values[order]
+
+    sequence_ids = np.repeat(np.arange(num_sequences), counts)
+    nnz = np.bincount(sequence_ids, weights=sizes, minlength=num_sequences).astype(np.int64)
+    words_per_value = np.dtype(dtype).itemsize // 4
+    ones = np.ones(num_sequences, dtype=np.int64)
+    packed = interleave([
+        (ones, counts.astype(np.uint32)),
+        (ones, nnz.astype(np.int32).view(np.uint32)),
+        (nnz * words_per_value, as_words(values.astype(dtype))),
+        (nnz, indices.astype(np.int32).view(np.uint32)),
+        (counts, sizes.astype(np.int32).view(np.uint32))],
+        num_sequences)
+    estimates = nnz * (np.dtype(dtype).itemsize + 4) + counts * 4
+    return packed, estimates
+
+class ConvertedBlock:
+    def __init__(self, sequences, estimates, streams):
+        # number of samples in each sequence
+        self.sequences = sequences
+        # estimated byte size of each sequence
+        self.estimates = estimates
+        # (packed words, sequence word offsets) for each stream
+        self.streams = streams
+
+# Converts a block of whole sequences. streams is a list of
+# (alias, name, matrix type, sample dimension) tuples.
+def convert_block(streams, element_type, lines, starts):
+    num_sequences = len(starts)
+    aliases = dict((stream[0], index) for index, stream in enumerate(streams))
+    samples = [[] for _ in streams]
+    owners = [[] for _ in streams]
+    bounds = starts + [len(lines)]
+    for sequence in range(num_sequences):
+        for line in lines[bounds[sequence]:bounds[sequence + 1]]:
+            for input_stream in line.split("|")[1:]:
+                split = input_stream.split(None, 1)
+                if (len(split) < 2):
+                    continue
+                (alias, values) = split
+                # We need to ignore comments
+                if alias[0] == '#':
+                    continue
+                try:
+                    index = aliases[alias]
+                except KeyError:
+                    raise ValueError("Unknown input stream alias '{0}'".format(alias))
+                samples[index].append(values)
+                owners[index].append(sequence)
+
+    dtype = get_numpy_type(element_type)
+    sequences = np.zeros(num_sequences, dtype=np.int64)
+    estimates = np.zeros(num_sequences, dtype=np.int64)
+    packed_streams = []
+    for index, stream in enumerate(streams):
+        counts = np.bincount(np.array(owners[index], dtype=np.int64), minlength=num_sequences)
+        if stream[2] == MatrixEncodingType.SPARSE_CSC:
+            packed, stream_estimates = convert_sparse_block(stream, dtype, samples[index], counts)
+        else:
+            packed, stream_estimates = convert_dense_block(stream, dtype, samples[index], counts)
+        np.maximum(sequences, counts, out=sequences)
+        estimates += stream_estimates
+        packed_streams.append(packed)
+    return ConvertedBlock(sequences.astype(np.uint32), estimates, packed_streams)
+
+# Converts blocks in order, either inline or in a pool of worker processes.
+# At most two blocks per worker are in flight, so memory stays bounded.
+def convert_blocks(blocks, streams, element_type, num_workers):
+    if num_workers <= 1:
+        for (lines, starts) in blocks:
+            yield convert_block(streams, element_type, lines, starts)
+        return
+
+    pool = multiprocessing.Pool(num_workers)
+    try:
+        pending = deque()
+        for (lines, starts) in blocks:
+            pending.append(pool.apply_async(convert_block, (streams, element_type, lines, starts)))
+            if len(pending) >= 2 * num_workers:
+                yield pending.popleft().get()
+        while len(pending) > 0:
+            yield pending.popleft().get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+# Output a binary chunk made of sequence ranges (block, begin, end)
+def write_block_chunk(output, pieces, num_streams):
+    output.flush()
+    chunk = Chunk()
+    chunk.offset = output.tell()
+    output = ChecksumWriter(output, chunk)
+    for (block, begin, end) in pieces:
+        sequences = block.sequences[begin:end]
+        output.write(sequences.tobytes())
+        chunk.sequences.extend(sequences.tolist())
+    for stream in range(num_streams):
+        for (block, begin, end) in pieces:
+            (packed, offsets) = block.streams[stream]
+            output.write(packed[offsets[begin]:offsets[end]].tobytes())
+    return chunk
+
+# Block-wise conversion of a CTF input stream into the binary format. Produces
+# the same output as convert_legacy. If by_samples is set, chunk_size is the
+# number of samples per chunk instead of the estimated size in bytes.
+def convert(input_file, output, converters, chunk_size, num_workers=1, block_size=DEFAULT_BLOCK_SIZE,
+        by_samples=False):
+    write_file_prefix(output)
+
+    header = Header(converters)
+    element_type = next(iter(converters.values())).element_type
+    streams = [(alias, converter.name, converter.get_matrix_type(), converter.sample_dim)
+        for alias, converter in converters.items()]
+
+    # sequences accumulated for the current chunk
+    pieces = []
+    estimated_chunk_size = 0
+    blocks = read_blocks(input_file, block_size)
+    for block in convert_blocks(blocks, streams, element_type, num_workers):
+        num_sequences = block.sequences.size
+        cumulative = np.cumsum(block.sequences if by_samples else block.estimates, dtype=np.int64)
+        begin = 0
+        while begin < num_sequences:
+            base = int(cumulative[begin - 1]) if begin > 0 else 0
+            # first sequence after which the chunk reaches chunk_size
+            last = int(np.searchsorted(cumulative, base + chunk_size - estimated_chunk_size))
+            last = max(last, begin)
+            if last >= num_sequences:
+                pieces.append((block, begin, num_sequences))
+                estimated_chunk_size += int(cumulative[-1]) - base
+                break
+            pieces.append((block, begin, last + 1))
+            header.add_chunk(write_block_chunk(output, pieces, len(streams)))
+            pieces = []
+            estimated_chunk_size = 0
+            begin = last + 1
+
+    # the last sequence always ends up in the last chunk, even if it is empty
+    if len(pieces) > 0 or len(header.chunks) == 0:
+        header.add_chunk(write_block_chunk(output, pieces, len(streams)))
+
+    header.write(output)
+    output.flush()
+
+#####################################################################################################
+# Sharded conversion
+#####################################################################################################
+
+# Reads the stream descriptions and the chunk table of a binary file.
+# Returns (streams, chunks, header offset), where streams is a list of
+# (matrix type, name, element type, sample dimension) tuples and chunks a
+# list of (offset, number of sequences, number of samples, checksum) tuples.
+# The checksum is None for files written without a checksum table.
+def read_header(binfile):
+    binfile.seek(-8, os.SEEK_END)
+    end_offset = binfile.tell()
+    (header_offset,) = struct.unpack('q', binfile.read(8))
+    if header_offset < 12 or header_offset + 16 > end_offset:
+        raise ValueError("Invalid binary file, the header offset {0} is out of range".format(header_offset))
+    binfile.seek(header_offset)
+    (magic, num_chunks, num_streams) = struct.unpack('QII', binfile.read(16))
+    if magic != MAGIC_NUMBER:
+        raise ValueError("Invalid binary file, the header does not start with the magic number")
+    streams = []
+    for _ in range(num_streams):
+        (matrix_type, name_length) = struct.unpack('=BI', binfile.read(5))
+        name = binfile.read(name_length).decode('ascii')
+        (element_type, sample_dim) = struct.unpack('=BI', binfile.read(5))
+        streams.append((matrix_type, name, element_type, sample_dim))
+    table = np.frombuffer(binfile.read(16 * num_chunks), dtype=np.dtype(
+        [('offset', '<i8'), ('sequences', '<u4'), ('samples', '<u4')]))
+    checksums = [None] * num_chunks
+    if binfile.tell() + 8 + 4 * num_chunks <= end_offset and \
+            struct.unpack('Q', binfile.read(8))[0] == CHECKSUM_MAGIC_NUMBER:
+        checksums = np.frombuffer(binfile.read(4 * num_chunks), dtype='<u4').tolist()
+    chunks = [(int(c['offset']), int(c['sequences']), int(c['samples']), checksum)
+        for (c, checksum) in zip(table, checksums)]
+    return streams, chunks, header_offset
+
+# Returns the byte offset of the first sequence that starts at or after
+# offset, which must be the start of a line. If the input has sequence ids,
+# that is the first line with an id different from the id of the first line;
+# without ids, every line is a sequence.
+def find_sequence_start(binfile, offset, has_ids):
+    binfile.seek(offset)
+    if not has_ids:
+        # lines without ids only form one sequence each if no line has an id
+        line = binfile.readline()
+        if len(line) > 0 and not line.startswith((b'|', b'\n', b'\r')):
+            raise ValueError("Cannot split an input that mixes lines with and without sequence ids")
+        return offset
+    first_id = None
+    for line in iter(binfile.readline, b''):
+        pipe = line.find(b'|')
+        prefix = line[:pipe] if pipe >= 0 else line
+        if len(prefix) > 0:
+            if first_id is None:
+                first_id = prefix
+            elif prefix != first_id:
+                return offset
+        offset += len(line)
+    return offset
+
+# Returns the offset right after the line-th line break of a file, given the
+# number of line breaks in each block of block_size bytes.
+def find_line_end(binfile, line, block_lines, block_size):
+    block = int(np.searchsorted(np.cumsum(block_lines), line))
+    binfile.seek(block * block_size)
+    data = np.frombuffer(binfile.read(block_size), dtype=np.uint8)
+    previous = int(block_lines[:block].sum())
+    return block * block_size + int(np.flatnonzero(data == ord('\n'))[line - previous - 1]) + 1
+
+# Splits the input into num_shards byte ranges on sequence boundaries, so that
+# each range has about the same number of lines (i.e., samples).
+# Whether the input has sequence ids is decided by its first line: either all
+# sequences have ids, or none has and every line is a sequence.
+def find_shard_boundaries(input_path, num_shards, block_size=DEFAULT_BLOCK_SIZE):
+    with open(input_path, "rb") as binfile:
+        has_ids = not binfile.readline().startswith(b'|')
+        binfile.seek(0)
+        # first pass: only the number of line breaks per block is kept
+        block_lines = []
+        offset = 0
+        for block in iter(lambda: binfile.read(block_size), b''):
+            block_lines.append(np.count_nonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n')))
+            offset += len(block)
+        block_lines = np.array(block_lines, dtype=np.int64)
+        num_lines = int(block_lines.sum())
+
+        # second pass: seek to the block of each boundary
+        boundaries = [0]
+        for shard in range(1, num_shards):
+            line = shard * num_lines // num_shards
+            start = find_line_end(binfile, line, block_lines, block_size) if line > 0 else 0
+            start = max(find_sequence_start(binfile, start, has_ids), boundaries[-1])
+            boundaries.append(start)
+        boundaries.append(offset)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+# Yields the decoded lines in the byte range [begin, end) of a file.
+def read_lines(binfile, begin, end):
+    binfile.seek(begin)
+    position = begin
+    while position < end:
+        line = binfile.readline()
+        if len(line) == 0:
+            break
+        position += len(line)
+        yield line.decode('utf-8')
+
+def get_shard_path(output_path, shard):
+    (root, ext) = os.path.splitext(output_path)
+    return "{0}.{1}{2}".format(root, shard, ext)
+
+def convert_shard(input_path, begin, end, output_path, converters, chunk_size, block_size, by_samples):
+    with open(input_path, "rb") as binfile, open(output_path, "wb") as output:
+        convert(read_lines(binfile, begin, end), output, converters, chunk_size,
+            1, block_size, by_samples)
+    return output_path
+
+# Concatenates the chunks of several binary files into a single file with a
+# merged chunk table. The chunks of each shard stay contiguous, in shard order.
+def merge_shards(shard_paths, output, converters):
+    write_file_prefix(output)
+    header = Header(converters)
+    for path in shard_paths:
+        with open(path, "rb") as shard:
+            (_, chunks, header_offset) = read_header(shard)
+            shard.seek(12)
+            delta = output.tell() - 12
+            remaining = header_offset - 12
+            while remaining > 0:
+                data = shard.read(min(remaining, DEFAULT_BLOCK_SIZE))
+                output.write(data)
+                remaining -= len(data)
+            for (offset, num_sequences, _, checksum) in chunks:
+                shard.seek(offset)
+                chunk = Chunk()
+                chunk.offset = offset + delta
+                chunk.sequences = np.frombuffer(shard.read(4 * num_sequences), dtype=np.uint32).tolist()
+                chunk.checksum = checksum
+                header.add_chunk(chunk)
+    header.write(output)
+    output.flush()
+
+# Converts the input into num_shards binary files concurrently, one per
+# distributed worker, or into a single file with a merged chunk table.
+# Returns the paths of the written files.
+def convert_sharded(input_path, output_path, converters, chunk_size, num_shards, num_workers=1,
+        block_size=DEFAULT_BLOCK_SIZE, by_samples=False, merge=False):
+    ranges = find_shard_boundaries(input_path, num_shards, block_size)
+    if merge:
+        shard_paths = ["{0}.shard{1}".format(output_path, i) for i in range(num_shards)]
+    else:
+        shard_paths = [get_shard_path(output_path, i) for i in range(num_shards)]
+    tasks = [(input_path, begin, end, path, converters, chunk_size, block_size, by_samples)
+        for ((begin, end), path) in zip(ranges, shard_paths)]
+
+    if num_workers <= 1:
+        for task in tasks:
+            convert_shard(*task)
+    else:
+        pool = multiprocessing.Pool(min(num_workers, num_shards))
+        try:
+            for result in [pool.apply_async(convert_shard, task) for task in tasks]:
+                result.get()
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    if not merge:
+        return shard_paths
+
+    try:
+        with open(output_path, "wb") as output:
+            merge_shards(shard_paths, output, converters)
+    finally:
+        for path in shard_paths:
+            os.remove(path)
+    return [output_path]
+
+# Runs both engines on the same input and reports their throughput in MB/s.
+def benchmark(input_path, header_path, chunk_size, element_type, num_workers, block_size=DEFAULT_BLOCK_SIZE):
+    input_size = os.path.getsize(input_path)
+    results = OrderedDict()
+    engines = [('legacy', lambda i, o, c: convert_legacy(i, o, c, chunk_size)),
+        ('vectorized', lambda i, o, c: convert(i, o, c, chunk_size, 1, block_size))]
+    if num_workers > 1:
+        engines.append(('vectorized x{0}'.format(num_workers),
+            lambda i, o, c: convert(i, o, c, chunk_size, num_workers, block_size)))
+
+    outputs = []
+    for (name, engine) in engines:
+        (handle, path) = tempfile.mkstemp(suffix='.bin')
+        os.close(handle)
+        outputs.append(path)
+        converters = build_converters(header_path, element_type)
+        with open(input_path, "r") as input_file, open(path, "wb") as output:
+            start = time.time()
+            engine(input_file, output, converters)
+            elapsed = time.time() - start
+        results[name] = elapsed
+        print("{0:>16}: {1:8.2f}s {2:10.2f} MB/s".format(
+            name, elapsed, input_size / (1024.0 * 1024.0) / max(elapsed, 1e-9)))
+
+    try:
+        reference = open(outputs[0], "rb").read()
+        for (name, path) in zip(results.keys(), outputs):
+            if open(path, "rb").read() != reference:
+                print("{0:>16}: output differs from the legacy engine".format(name))
+    finally:
+        for path in outputs:
+            os.remove(path)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Transforms a CNTK Text Format file into CNTK binary format given a header.")
+    parser.add_argument('--input', help="CNTK Text Format file to convert to binary.", required=True)
+    parser.add_argument('--header',  help="Header file describing each stream in the input.", required=True)
+    chunking = parser.add_mutually_exclusive_group(required=True)
+    chunking.add_argument('--chunk_size', type=int, help='Chunk size in bytes.')
+    chunking.add_argument('--chunk_samples', type=int, help='Chunk size in samples (vectorized engine only).')
+    parser.add_argument('--output', help='Name of the output file, stdout if not given', required=False)
+    parser.add_argument('--precision', help='Floating point precision (double or float). Default is float',
+        choices=["float", "double"], default="float", required=False)
+    parser.add_argument('--engine', help='Conversion engine. Default is vectorized',
+        choices=["vectorized", "legacy"], default="vectorized", required=False)
+    parser.add_argument('--workers', type=int, help='Number of worker processes for the vectorized engine. Default is 1',
+        default=1, required=False)
+    parser.add_argument('--block_size', type=int, help='Amount of input text parsed at once by the vectorized engine.',
+        default=DEFAULT_BLOCK_SIZE, required=False)
+    parser.add_argument('--shards', type=int, help='Number of output files, split on sequence boundaries. '
+        'Shard i is written to <output>.i<ext>. Default is 1', default=1, required=False)
+    parser.add_argument('--merge', help='Write the shards into a single output file with a merged chunk table',
+        action='store_true', required=False)
+    parser.add_argument('--benchmark', help='Measure the throughput of both engines instead of converting',
+        action='store_true', required=False)
+    args = parser.parse_args()
+
+    by_samples = args.chunk_samples is not None
+    chunk_size = args.chunk_samples if by_samples else args.chunk_size
+    if by_samples and (args.engine == 'legacy' or args.benchmark):
+        parser.error("--chunk_samples is not supported by the legacy engine")
+    if args.shards > 1 and args.engine == 'legacy':
+        parser.error("--shards is not supported by the legacy engine")
+
+    element_type = ElementType.FLOAT if args.precision == 'float' else ElementType.DOUBLE
+
+    if args.benchmark:
+        benchmark(args.input, args.header, args.chunk_size, element_type, args.workers, args.block_size)
+        sys.exit(0)
+
+    if not args.output:
+        parser.error("--output is required unless --benchmark is given")
+
+    converters = build_converters(args.header, element_type)
+
+    if args.shards > 1:
+        convert_sharded(args.input, args.output, converters, chunk_size, args.shards,
+            args.workers, args.block_size, by_samples, args.merge)
+        sys.exit(0)
+
+    with open(args.input, "r") as input_file, open(args.output, "wb") as output:
+        if args.engine == 'legacy':
+            convert_legacy(input_file, output, converters, chunk_size)
+        else:
+            convert(input_file, output, converters, chunk_size, args.workers, args.block_size, by_samples)
+
+
+#####################################################################################################
+# Tests
+#####################################################################################################
+try:
+    import StringIO
+    stringio = StringIO.StringIO
+except ImportError:
+    from io import StringIO
+    stringio = StringIO
+from io import BytesIO
+try:
+    import pytest
+except ImportError:
+    pass
+
+HEADER = "features x dense 3\nlabels y sparse 10\n"
+
+INPUT = """0\t|x 1 2 3\t|y 5:1 1:0.5
+0\t|x 4 5 6 |# comment
+0\t|y 9:2
+1\t|x 7 8 9\t|y 0:1
+|x 0.1 0.2 0.3
+2 |y 3:1 3:2 2:-1
+3\t|x 1e-3 -2.5 1e10 |y 7:0.25
+"""
+
+def _converters(tmpdir, element_type):
+    header = tmpdir.join("header.txt")
+    header.write(HEADER)
+    return build_converters(str(header), element_type)
+
+def _convert(tmpdir, engine, text, chunk_size, element_type=ElementType.FLOAT, **kwargs):
+    output = BytesIO()
+    engine(stringio(text), output, _converters(tmpdir, element_type), chunk_size, **kwargs)
+    return output.getvalue()
+
+def test_vectorizedMatchesLegacy(tmpdir):
+    for element_type in [ElementType.FLOAT, ElementType.DOUBLE]:
+        for chunk_size in [1, 20, 100, 10000]:
+            expected = _convert(tmpdir, convert_legacy, INPUT, chunk_size, element_type)
+            for block_size in [1, 50, DEFAULT_BLOCK_SIZE]:
+                actual = _convert(tmpdir, convert, INPUT, chunk_size, element_type, block_size=block_size)
+                assert expected == actual
+
+def test_parallelMatchesLegacy(tmpdir):
+    text = INPUT * 50
+    expected = _convert(tmpdir, convert_legacy, text, 64)
+    actual = _convert(tmpdir, convert, text, 64, num_workers=3, block_size=100)
+    assert expected == actual
+
+def test_emptyInput(tmpdir):
+    assert _convert(tmpdir, convert_legacy, "", 10) == _convert(tmpdir, convert, "", 10)
+
+def test_layout(tmpdir):
+    data = _convert(tmpdir, convert, "0 |x 1 2 3 |y 4:1\n0 |x 4 5 6\n", 100)
+    (magic, version) = struct.unpack_from('QI', data, 0)
+    assert (magic, version) == (MAGIC_NUMBER, CBF_VERSION)
+    chunk = 12
+    (_, chunks, _) = read_header(BytesIO(data))
+    assert chunks == [(chunk, 1, 2, zlib.crc32(data[chunk:chunk + 52]) & 0xffffffff)]
+    # one sequence with two samples
+    assert struct.unpack_from('I', data, chunk) == (2,)
+    # dense stream: sample count, then the values
+    assert struct.unpack_from('I6f', data, chunk + 4) == (2, 1, 2, 3, 4, 5, 6)
+    # sparse stream: sample count, nnz, values, indices, per sample nnz
+    assert struct.unpack_from('Iifii', data, chunk + 32) == (1, 1, 1.0, 4, 1)
+    (header_offset,) = struct.unpack_from('q', data, len(data) - 8)
+    assert header_offset == chunk + 52
+    assert struct.unpack_from('QII', data, header_offset) == (MAGIC_NUMBER, 1, 2)
+
+def test_invalidDenseDimension(tmpdir):
+    with pytest.raises(ValueError) as info:
+        _convert(tmpdir, convert, "0 |x 1 2\n", 100)
+    assert str(info.value) == "Invalid sample dimension for input features"
+    # a short and a long sample that add up to the right number of values
+    with pytest.raises(ValueError) as info:
+        _convert(tmpdir, convert, "0 |x 1 2\n0 |x 3 4 5 6\n", 100)
+    assert str(info.value) == "Invalid sample dimension for input features"
+
+def test_invalidSparseIndex(tmpdir):
+    with pytest.raises(ValueError) as info:
+        _convert(tmpdir, convert, "0 |y 3:1 10:1\n", 100)
+    assert str(info.value) == "Invalid sample dimension for input labels. Max 10, given 10"
+
+def test_chunkSizeInSamples(tmpdir):
+    data = _convert(tmpdir, convert, INPUT * 3, 4, by_samples=True)
+    (streams, chunks, _) = read_header(BytesIO(data))
+    assert [s[1] for s in streams] == ['features', 'labels']
+    # sequences of 2, 2, 1 and 1 samples per repetition of the input
+    assert [c[2] for c in chunks] == [4, 4, 4, 4, 2]
+
+def _sequences(data):
+    binfile = BytesIO(data)
+    (_, chunks, _) = read_header(binfile)
+    sequences = []
+    for (offset, num_sequences, _, _) in chunks:
+        binfile.seek(offset)
+        sequences.extend(struct.unpack('{0}I'.format(num_sequences), binfile.read(4 * num_sequences)))
+    return sequences
+
+def test_sharding(tmpdir):
+    text = INPUT * 7
+    source = tmpdir.join("input.ctf")
+    source.write(text)
+    converters = _converters(tmpdir, ElementType.FLOAT)
+    expected = _sequences(_convert(tmpdir, convert, text, 100))
+
+    output = str(tmpdir.join("output.bin"))
+    paths = convert_sharded(str(source), output, converters, 100, 3, num_workers=2)
+    assert paths == [str(tmpdir.join("output.{0}.bin".format(i))) for i in range(3)]
+    shards = [_sequences(open(path, "rb").read()) for path in paths]
+    assert all(len(shard) > 0 for shard in shards)
+    assert sum(shards, []) == expected
+
+    paths = convert_sharded(str(source), output, converters, 100, 3, merge=True)
+    assert paths == [output]
+    assert _sequences(open(output, "rb").read()) == expected
+    assert len(tmpdir.listdir()) == 6
+
+def test_shardBoundariesWithoutIds(tmpdir):
+    source = tmpdir.join("input.ctf")
+    source.write("|x 1 2 3\n" * 10)
+    ranges = find_shard_boundaries(str(source), 4)
+    assert ranges == [(0, 18), (18, 45), (45, 63), (63, 90)]
+    # boundaries do not depend on where the blocks end
+    for block_size in [1, 7, 9, 100]:
+        assert find_shard_boundaries(str(source), 4, block_size) == ranges
+
+    source.write("|x 1 2 3\n" * 5 + "0 |x 1 2 3\n" * 5)
+    with pytest.raises(ValueError):
+        find_shard_boundaries(str(source), 2)
+
+def test_shardBoundariesWithIds(tmpdir):
+    text = INPUT * 7
+    source = tmpdir.join("input.ctf")
+    source.write(text)
+    ranges = find_shard_boundaries(str(source), 5)
+    for block_size in [1, 13, 64]:
+        assert find_shard_boundaries(str(source), 5, block_size) == ranges
+    starts = [begin for (begin, _) in ranges[1:]]
+    assert all(text[begin - 1] == '\n' for begin in starts)
@@ -26,10 +26,196 @@
 #
 
 import sys
+import os
 import argparse
 import re
+import time
+import tempfile
+import itertools
+import multiprocessing
+from collections import deque, OrderedDict
+import numpy as np
 
-def convert(dictionaryStreams, inputs, output, unk, annotated):
+# Number of input lines converted at once by the streaming engine
+DEFAULT_BLOCK_LINES = 16384
+
+# Dtype of a persisted vocabulary index: the utf-8 encoded tokens sorted, with
+# their line numbers in the dictionary file
+def _indexType(width):
+    return np.dtype([('token', 'S{0}'.format(max(width, 1))), ('index', '<i4')])
+
+# Sorted array of the tokens of a dictionary, so that whole blocks of tokens
+# can be looked up at once with a binary search. It can be saved as a .npy file
+# and memory-mapped, instead of being rebuilt from the dictionary every run.
+# path is the .npy file a memory-mapped index was loaded from.
+class VocabularyIndex:
+    def __init__(self, entries, path=None):
+        self.entries = entries
+        self.path = path
+        self.tokens = entries['token']
+        self.indices = entries['index']
+
+    @staticmethod
+    def fromDictionary(dictionaryStream):
+        tokens = [line.rstrip('\r\n').strip().encode('utf-8') for line in dictionaryStream]
+        entries = np.empty(len(tokens), dtype=_indexType(max([len(t) for t in tokens] + [1])))
+        entries['token'] = tokens
+        entries['index'] = np.arange(len(tokens))
+        # like for the dict of convertLegacy, a token listed twice gets its last index
+        entries = entries[np.argsort(entries['token'], kind='mergesort')]
+        last = np.append(entries['token'][1:] != entries['token'][:-1], True)
+        return VocabularyIndex(entries[last])
+
+    @staticmethod
+    def load(path):
+        return VocabularyIndex(np.load(path, mmap_mode='r'), path)
+
+    def save(self, path):
+        np.save(path, np.asarray(self.entries))
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Returns the indices of a list of tokens, -1 for tokens not in the dictionary
+    def lookup(self, tokens):
+        if len(tokens) == 0 or len(self.entries) == 0:
+            return np.full(len(tokens), -1, dtype=np.int64)
+        # tokens never contain newlines, so they are encoded in one go
+        encoded = np.array('\n'.join(tokens).encode('utf-8').split(b'\n'))
+        keys = encoded.astype(self.tokens.dtype)
+        positions = np.minimum(np.searchsorted(self.tokens, keys), len(self.entries) - 1)
+        found = self.tokens[positions] == keys
+        if encoded.dtype.itemsize > self.tokens.dtype.itemsize:
+            # tokens longer than any in the dictionary were truncated
+            found &= encoded == keys
+        return np.where(found, self.indices[positions], -1)
+
+    def indexOf(self, token):
+        return int(self.lookup([token])[0])
+
+def loadIndices(paths, saveIndex=False):
+    indices = []
+    for path in paths:
+        if path.endswith('.npy'):
+            indices.append(VocabularyIndex.load(path))
+            continue
+        with open(path, encoding="utf-8") as dic:
+            index = VocabularyIndex.fromDictionary(dic)
+        if saveIndex:
+            index.save(path + '.npy')
+        indices.append(index)
+    return indices
+
+def _escape(token):
+    return re.sub(r'(\|(?!#))|(\|$)', r'|#', token)
+
+# Converts a block of input lines, the first of which has the given sequence id,
+# into CNTK text format. The tokens of each stream are looked up at once, and
+# the output lines are assembled column by column in object arrays.
+def convertBlock(indices, lines, firstSequenceId, unk, annotated):
+    numStreams = len(indices)
+    tokensPerStream = [[] for _ in range(numStreams)]
+    lengths = []
+    for lineIndex, line in enumerate(lines):
+        line = line.rstrip('\r\n')
+        columns = line.split("\t")
+        if len(columns) != numStreams:
+            raise Exception("Number of dictionaries {0} does not correspond to the number of streams in line {1}:'{2}'"
+                .format(numStreams, firstSequenceId + lineIndex, line))
+        counts = []
+        for streamIndex, column in enumerate(columns):
+            tokens = [t for t in column.split(' ') if t != ""]
+            tokensPerStream[streamIndex].extend(tokens)
+            counts.append(len(tokens))
+        lengths.append(counts)
+    lengths = np.array(lengths, dtype=np.int64).reshape(len(lines), numStreams)
+
+    # one output line per sample of the longest stream of each sequence
+    numSamples = lengths.max(axis=1) if numStreams > 0 else np.zeros(len(lines), dtype=np.int64)
+    lineStarts = np.cumsum(numSamples) - numSamples
+    sequenceIds = np.arange(firstSequenceId, firstSequenceId + len(lines)).astype(str).astype(object)
+    out = np.repeat(sequenceIds, numSamples)
+
+    for streamIndex, (index, tokens) in enumerate(zip(indices, tokensPerStream)):
+        values = index.lookup(tokens)
+        missing = np.flatnonzero(values < 0)
+        if len(missing) > 0:
+            unkValue = index.indexOf(unk) if unk is not None else -1
+            if unkValue < 0:
+                token = unk if unk is not None else tokens[missing[0]]
+                raise Exception("Token '{0}' cannot be found in the dictionary for stream {1}".format(token, streamIndex))
+            values[missing] = unkValue
+            for i in missing:
+                tokens[i] = unk
+
+        fields = "\t|S{0} ".format(streamIndex) + values.astype(str).astype(object) + ":1"
+        if annotated:
+            fields = fields + " |# " + np.array([_escape(t) for t in tokens], dtype=object)
+
+        # row of every token: the first row of its sequence plus its position
+        counts = lengths[:, streamIndex]
+        positions = np.arange(len(tokens)) - np.repeat(np.cumsum(counts) - counts, counts)
+        column = np.full(len(out), "\t", dtype=object)
+        column[np.repeat(lineStarts, counts) + positions] = fields
+        out = out + column
+
+    return ''.join((out + "\n").tolist())
+
+# Blocks of (lines, id of the first sequence); every line is a sequence, and
+# sequence ids start at 0 in every input
+def readBlocks(inputs, blockLines):
+    for input in inputs:
+        sequenceId = 0
+        while True:
+            lines = list(itertools.islice(input, blockLines))
+            if len(lines) == 0:
+                break
+            yield (lines, sequenceId)
+            sequenceId += len(lines)
+
+_workerIndices = None
+
+# Memory-mapped indices are passed to the workers by path, so that every worker
+# maps the same file instead of receiving a pickled copy of it.
+def _workerSource(index):
+    return index.path if index.path is not None else index
+
+def _initWorker(sources):
+    global _workerIndices
+    _workerIndices = [VocabularyIndex.load(s) if isinstance(s, str) else s for s in sources]
+
+def _convertBlockInWorker(lines, firstSequenceId, unk, annotated):
+    return convertBlock(_workerIndices, lines, firstSequenceId, unk, annotated)
+
+# Streaming conversion: the input is converted in blocks of lines, in parallel
+# if numWorkers > 1, and each block is written at once. dictionaries is a list
+# of dictionary streams or VocabularyIndex instances. Produces the same output
+# as convertLegacy.
+def convert(dictionaries, inputs, output, unk, annotated, numWorkers=1, blockLines=DEFAULT_BLOCK_LINES):
+    indices = [d if isinstance(d, VocabularyIndex) else VocabularyIndex.fromDictionary(d) for d in dictionaries]
+    blocks = readBlocks(inputs, blockLines)
+
+    if numWorkers <= 1:
+        for (lines, sequenceId) in blocks:
+            output.write(convertBlock(indices, lines, sequenceId, unk, annotated))
+        return
+
+    pool = multiprocessing.Pool(numWorkers, _initWorker, ([_workerSource(i) for i in indices],))
+    try:
+        pending = deque()
+        for (lines, sequenceId) in blocks:
+            pending.append(pool.apply_async(_convertBlockInWorker, (lines, sequenceId, unk, annotated)))
+            if len(pending) >= 2 * numWorkers:
+                output.write(pending.popleft().get())
+        while len(pending) > 0:
+            output.write(pending.popleft().get())
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+# Sample by sample conversion, writing every field separately
+def convertLegacy(dictionaryStreams, inputs, output, unk, annotated):
     # create in memory dictionaries
     dictionaries = [{ line.rstrip('\r\n').strip():index for index, line in enumerate(dic) } for dic in dictionaryStreams]
 
@@ -67,17 +253,70 @@ def _convertSequence(dictionaries, streams, sequenceId, output, unk, annotated):
                 output.write(" |# " + re.sub(r'(\|(?!#))|(\|$)', r'|#', token))
         output.write("\n")
 
+def benchmark(dictionaryPaths, inputPath, unk, annotated, numWorkers, blockLines=DEFAULT_BLOCK_LINES):
+    indices = loadIndices(dictionaryPaths)
+    numTokens = 0
+    with open(inputPath, encoding="utf-8") as input:
+        for line in input:
+            numTokens += sum(1 for t in line.rstrip('\r\n').replace('\t', ' ').split(' ') if t != "")
+
+    engines = [('legacy', lambda i, o: convertLegacy([open(d, encoding="utf-8") for d in dictionaryPaths], i, o, unk, annotated)),
+        ('streaming', lambda i, o: convert(indices, i, o, unk, annotated, 1, blockLines))]
+    if numWorkers > 1:
+        engines.append(('streaming x{0}'.format(numWorkers),
+            lambda i, o: convert(indices, i, o, unk, annotated, numWorkers, blockLines)))
+
+    results = OrderedDict()
+    outputs = []
+    for (name, engine) in engines:
+        (handle, path) = tempfile.mkstemp(suffix='.ctf')
+        os.close(handle)
+        outputs.append(path)
+        with open(inputPath, encoding="utf-8") as input, open(path, "w", encoding="utf-8") as output:
+            start = time.time()
+            engine([input], output)
+            elapsed = time.time() - start
+        results[name] = elapsed
+        print("{0:>16}: {1:8.2f}s {2:14.0f} tokens/s".format(name, elapsed, numTokens / max(elapsed, 1e-9)))
+
+    try:
+        reference = open(outputs[0], "rb").read()
+        for (name, path) in zip(results.keys(), outputs):
+            if open(path, "rb").read() != reference:
+                print("{0:>16}: output differs from the legacy engine".format(name))
+    finally:
+        for path in outputs:
+            os.remove(path)
+    return results
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Transforms text file given dictionaries into CNTK text format.")
-    parser.add_argument('--map', help='List of dictionaries, given in the same order as streams in the input files',
+    parser.add_argument('--map', help='List of dictionaries, given in the same order as streams in the input files. '
+        'Files ending with .npy are loaded as vocabulary indices saved with --save_index',
         nargs="+", required=True)
     parser.add_argument('--annotated', help='Whether to annotate indices with tokens. Default is false',
         choices=["True", "False"], default="False", required=False)
     parser.add_argument('--output', help='Name of the output file, stdout if not given', default="", required=False)
     parser.add_argument('--input', help='Name of the inputs files, stdin if not given', default="", nargs="*", required=False)
     parser.add_argument('--unk', help='Name fallback symbol for tokens not in dictionary (same for all columns)', default=None, required=False)
+    parser.add_argument('--workers', type=int, help='Number of worker processes converting blocks of lines. Default is 1',
+        default=1, required=False)
+    parser.add_argument('--block_lines', type=int, help='Number of input lines converted at once',
+        default=DEFAULT_BLOCK_LINES, required=False)
+    parser.add_argument('--save_index', help='Save a vocabulary index <dictionary>.npy next to each text dictionary',
+        action='store_true', required=False)
+    parser.add_argument('--benchmark', help='Measure the tokens/s of the legacy and the streaming conversion of the '
+        'first input file instead of converting', action='store_true', required=False)
     args = parser.parse_args()
 
+    if args.benchmark:
+        if len(args.input) != 1:
+            parser.error('--benchmark requires a single --input file')
+        benchmark(args.map, args.input[0], args.unk, args.annotated == "True", args.workers, args.block_lines)
+        sys.exit(0)
+
+    indices = loadIndices(args.map, args.save_index)
+
     # creating inputs
     inputs = [sys.stdin]
     if len(args.input) != 0:
@@ -88,7 +327,7 @@ if __name__ == "__main__":
     if args.output != "":
         output = open(args.output, "w")
 
-    convert([open(d, encoding="utf-8") for d in args.map], inputs, output, args.unk, args.annotated == "True")
+    convert(indices, inputs, output, args.unk, args.annotated == "True", args.workers, args.block_lines)
 
 
 #####################################################################################################
@@ -147,3 +386,59 @@ def test_nonExistingWord():
     with pytest.raises(Exception) as info:
         convert([dictionary1], [input], output, None, False)
     assert str(info.value) == "Token 'nonexistent' cannot be found in the dictionary for stream 0"
+
+def _randomCorpus(numLines, seed=0):
+    rng = np.random.RandomState(seed)
+    words1 = ["w{0}".format(i) for i in range(50)] + ["|pipe", "unicodé"]
+    words2 = ["v{0}".format(i) for i in range(30)]
+    lines = []
+    for _ in range(numLines):
+        column1 = " ".join(rng.choice(words1, rng.randint(0, 6)))
+        column2 = " ".join(rng.choice(words2, rng.randint(1, 4)))
+        lines.append(column1 + "\t " + column2 + "\n")
+    return "\n".join(words1) + "\n", "\n".join(words2) + "\n", "".join(lines)
+
+def test_streamingMatchesLegacy():
+    dictionary1, dictionary2, text = _randomCorpus(200)
+
+    # pytest is optional for the script, so the cases are not parametrized
+    for (numWorkers, annotated) in [(1, False), (1, True), (2, True)]:
+        expectedOutput = stringio()
+        convertLegacy([stringio(dictionary1), stringio(dictionary2)], [stringio(text), stringio("".join(text.splitlines(True)[:3]))],
+            expectedOutput, None, annotated)
+
+        output = stringio()
+        convert([stringio(dictionary1), stringio(dictionary2)], [stringio(text), stringio("".join(text.splitlines(True)[:3]))],
+            output, None, annotated, numWorkers, blockLines=7)
+
+        assert expectedOutput.getvalue() == output.getvalue()
+
+def test_vocabularyIndex(tmpdir):
+    dictionary = "b\na\ncé\na\nlonger_token\n"
+    path = str(tmpdir / "dict.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(dictionary)
+
+    loadIndices([path], saveIndex=True)
+    index = loadIndices([path + ".npy"])[0]
+    assert len(index) == 4
+    assert index.lookup(["a", "b", "cé", "longer_token", "x", "longer_token_2", "c"]).tolist() == \
+        [3, 0, 2, 4, -1, -1, -1]
+
+    # the workers map the index file themselves
+    assert _workerSource(index) == path + ".npy"
+    output = stringio()
+    convert([index], [stringio("a b\ncé\n")], output, None, False, numWorkers=2, blockLines=1)
+    assert output.getvalue() == "0\t|S0 3:1\n0\t|S0 0:1\n1\t|S0 2:1\n"
+
+def test_unknownToken():
+    dictionary1 = stringio("hello\nmy\n<unk>\n")
+    input = stringio("hello world|\n")
+    output = stringio()
+
+    convert([dictionary1], [input], output, "<unk>", True)
+    assert output.getvalue() == "0\t|S0 0:1 |# hello\n0\t|S0 2:1 |# <unk>\n"
+
+    with pytest.raises(Exception) as info:
+        convert([stringio("hello\n")], [stringio("hello world\n")], stringio(), "<unk>", False)
+    assert str(info.value) == "Token '<unk>' cannot be found in the dictionary for stream 0"
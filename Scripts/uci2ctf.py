@@ -1,7 +1,20 @@
 import argparse
+import itertools
+from collections import OrderedDict
+import numpy as np
 
-def convert(file_in, file_out, features_start, features_dim, 
-  labels_start, labels_dim, num_labels, label_type='Category', mapping_file=None):
+# Number of input rows parsed at once; every chunk of rows is also written as
+# one chunk of the binary format
+DEFAULT_CHUNK_ROWS = 10000
+
+def read_chunks(input_file, chunk_rows):
+  while True:
+      lines = list(itertools.islice(input_file, chunk_rows))
+      if len(lines) == 0:
+          break
+      yield lines
+
+def build_label_map(label_type, num_labels, mapping_file):
   label_map = {}
   if label_type == "Category":
       if mapping_file is not None:
@@ -12,48 +25,138 @@ def convert(file_in, file_out, features_start, features_dim,
           num_labels = max(num_labels, len(label_map))
       else:
           label_map = {str(x) : x for x in range(num_labels)}
+  return label_map, num_labels
 
-  input_file = open(file_in, 'r')
-  output_file = open(file_out, 'w')
-
-  for line in input_file.readlines():
+# Splits a chunk of rows into the label and feature columns. Returns the
+# labels (None, the label ids for 'Category' or the label column text for
+# 'Regression') and the feature column text of every row.
+def parse_chunk(lines, features_start, features_dim, labels_start, labels_dim,
+  label_type, label_map):
+  features_end = features_start + features_dim
+  labels_end = labels_start + labels_dim if label_type != 'None' else 0
+  features = []
+  labels = []
+  shortest = None
+  # the rows are not kept, only their columns of interest
+  for line in lines:
       values = line.split()
-
+      if shortest is None or len(values) < shortest:
+          shortest = len(values)
+      features.append(" ".join(values[features_start:features_end]))
       if label_type != 'None':
-          max_length = max(labels_start + labels_dim, features_start + features_dim)
-          if len(values) < (labels_dim + features_dim):
-              raise RuntimeError(("Too few input columns ({} out of expected {}) ")
-                  .format(len(values), (labels_dim + features_dim)))
-          elif len(values) < max_length:
-              raise RuntimeError(
-                  ("Too few input columns ({} out of expected {}) ")
-                  .format(len(values), max_length))
-
-          labels = values[labels_start:labels_start+labels_dim]
-
-          if label_type == 'Category':
-              one_hot = ['0'] * num_labels
-              # there's only one label
-              label = labels[0]
-              if label not in label_map:
-                  raise RuntimeError(("Illegal label value: '{}'").format(label))
-              one_hot[label_map[label]] = '1'
-              labels = one_hot
-
-          output_file.write("|labels " + " ".join(labels))
-          output_file.write("\t")
-
-      elif len(values) < features_start+features_dim:
+          labels.append(" ".join(values[labels_start:labels_end]))
+
+  if label_type != 'None':
+      max_length = max(labels_end, features_end)
+      if shortest < (labels_dim + features_dim):
+          raise RuntimeError(("Too few input columns ({} out of expected {}) ")
+              .format(shortest, (labels_dim + features_dim)))
+      elif shortest < max_length:
           raise RuntimeError(
               ("Too few input columns ({} out of expected {}) ")
-              .format(len(values), features_start+features_dim))
+              .format(shortest, max_length))
+  elif shortest < features_end:
+      raise RuntimeError(
+          ("Too few input columns ({} out of expected {}) ")
+          .format(shortest, features_end))
+
+  if label_type == 'None':
+      labels = None
+  elif label_type == 'Category':
+      # there's only one label
+      try:
+          labels = np.array([label_map[label] for label in labels], dtype=np.int64)
+      except KeyError as e:
+          raise RuntimeError(("Illegal label value: '{}'").format(e.args[0]))
+
+  return labels, features
+
+def write_text_chunk(output_file, labels, features, label_type, one_hot):
+  if label_type == 'None':
+      lines = ["|features " + f + "\n" for f in features]
+  else:
+      if label_type == 'Category':
+          labels = [one_hot[i] for i in labels.tolist()]
+      lines = ["|labels " + l + "\t|features " + f + "\n" for l, f in zip(labels, features)]
+  output_file.write("".join(lines))
+
+# Streams of the binary output, as (alias, name, matrix type, sample dimension)
+# tuples for ctf2bin
+def binary_streams(features_dim, labels_dim, num_labels, label_type):
+  from ctf2bin import MatrixEncodingType
+  streams = []
+  if label_type == 'Category':
+      streams.append(('labels', 'labels', MatrixEncodingType.SPARSE_CSC, num_labels))
+  elif label_type == 'Regression':
+      streams.append(('labels', 'labels', MatrixEncodingType.DENSE, labels_dim))
+  streams.append(('features', 'features', MatrixEncodingType.DENSE, features_dim))
+  return streams
+
+# Writes a chunk of rows as one binary chunk with one single-sample sequence
+# per row; categorical labels become a sparse one-hot stream
+def write_binary_chunk(output_file, streams, labels, features, label_type, dtype):
+  from ctf2bin import ConvertedBlock, convert_dense_block, convert_sparse_block, write_block_chunk
+  num_rows = len(features)
+  counts = np.ones(num_rows, dtype=np.int64)
+  packed_streams = []
+  estimates = np.zeros(num_rows, dtype=np.int64)
+  for stream in streams:
+      if stream[0] == 'features':
+          (packed, stream_estimates) = convert_dense_block(stream, dtype, features, counts)
+      elif label_type == 'Category':
+          samples = (labels.astype(str).astype(object) + ":1").tolist()
+          (packed, stream_estimates) = convert_sparse_block(stream, dtype, samples, counts)
+      else:
+          (packed, stream_estimates) = convert_dense_block(stream, dtype, labels, counts)
+      packed_streams.append(packed)
+      estimates += stream_estimates
+  block = ConvertedBlock(counts.astype(np.uint32), estimates, packed_streams)
+  return write_block_chunk(output_file, [(block, 0, num_rows)], len(streams))
+
+# Converts the input in chunks of chunk_rows rows, so that memory use does not
+# depend on the size of the input. output_format is 'text' (CNTK text format)
+# or 'binary' (CNTK binary format, with the given element precision).
+def convert(file_in, file_out, features_start, features_dim,
+  labels_start, labels_dim, num_labels, label_type='Category', mapping_file=None,
+  output_format='text', chunk_rows=DEFAULT_CHUNK_ROWS, precision='float'):
+  (label_map, num_labels) = build_label_map(label_type, num_labels, mapping_file)
+  one_hot = None
 
-      output_file.write(
-          "|features " + " ".join(values[features_start:features_start+features_dim]))
-      output_file.write("\n")
+  if output_format == 'binary':
+      import ctf2bin
+      element_type = ctf2bin.ElementType.DOUBLE if precision == 'double' else ctf2bin.ElementType.FLOAT
+      dtype = ctf2bin.get_numpy_type(element_type)
+      streams = binary_streams(features_dim, labels_dim, num_labels, label_type)
+      header = ctf2bin.Header(OrderedDict(
+          (alias, ctf2bin.get_converter('sparse' if matrix_type == ctf2bin.MatrixEncodingType.SPARSE_CSC else 'dense',
+              name, sample_dim, element_type))
+          for (alias, name, matrix_type, sample_dim) in streams))
+  elif label_type == 'Category':
+      # the text of every one-hot label vector
+      one_hot = []
+      for i in range(num_labels):
+          values = ['0'] * num_labels
+          values[i] = '1'
+          one_hot.append(" ".join(values))
 
-  input_file.close()
-  output_file.close()
+  with open(file_in, 'r') as input_file, \
+      open(file_out, 'wb' if output_format == 'binary' else 'w') as output_file:
+      if output_format == 'binary':
+          ctf2bin.write_file_prefix(output_file)
+
+      for lines in read_chunks(input_file, chunk_rows):
+          (labels, features) = parse_chunk(lines, features_start, features_dim,
+              labels_start, labels_dim, label_type, label_map)
+          if output_format == 'binary':
+              header.add_chunk(write_binary_chunk(output_file, streams, labels, features, label_type, dtype))
+          else:
+              write_text_chunk(output_file, labels, features, label_type, one_hot)
+
+      if output_format == 'binary':
+          if len(header.chunks) == 0:
+              header.add_chunk(write_binary_chunk(output_file, streams,
+                  np.zeros(0, dtype=np.int64) if label_type == 'Category' else [], [], label_type, dtype))
+          header.write(output_file)
 
 if __name__ == "__main__":
   parser = argparse.ArgumentParser(
@@ -103,6 +206,18 @@ if __name__ == "__main__":
                             "label value is interpreted as a numerical "
                             "identifier)"))
   parser.add_argument("-out", "--output_file", help="output file path")
+  parser.add_argument("-of", "--output_format", default="text",
+                      help=("'text' for the CNTK text format, 'binary' for the "
+                            "CNTK binary format (categorical labels are "
+                            "written as a sparse stream)"),
+                      choices=["text", "binary"])
+  parser.add_argument("--chunk_rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                      help=("number of input rows converted at once, and rows "
+                            "per chunk of the binary format (default is {})"
+                            .format(DEFAULT_CHUNK_ROWS)))
+  parser.add_argument("--precision", default="float",
+                      help="floating point precision of the binary format",
+                      choices=["float", "double"])
 
   args = parser.parse_args()
 
@@ -137,10 +252,65 @@ if __name__ == "__main__":
       dot = file_in.rfind(".")
       if dot == -1:
           dot = len(file_in)
-      file_out = file_in[:dot] + "_cntk_text" + file_in[dot:]
+      suffix = "_cntk_binary" if args.output_format == "binary" else "_cntk_text"
+      file_out = file_in[:dot] + suffix + file_in[dot:]
 
   print (" Converting from UCI format\n\t '{}'\n"
-         " to CNTK text format\n\t '{}'".format(file_in, file_out))
+         " to CNTK {} format\n\t '{}'".format(file_in, args.output_format, file_out))
+
+  convert(file_in, file_out, args.features_start, args.features_dim,
+    args.labels_start, args.labels_dim, args.num_labels, args.label_type, args.mapping_file,
+    args.output_format, args.chunk_rows, args.precision)
+
+
+#####################################################################################################
+# Tests
+#####################################################################################################
+try:
+    import pytest
+except ImportError:
+    pass
+
+UCI_INPUT = "1 0.5 0.25 7\n0 1.5 2 8\n1 0 0 9\n"
+
+def _convert(tmpdir, text, output_format, **kwargs):
+    input_path = str(tmpdir / "input.txt")
+    output_path = str(tmpdir / "output")
+    with open(input_path, "w") as f:
+        f.write(text)
+    convert(input_path, output_path, 1, 2, 0, 1, 2, output_format=output_format, **kwargs)
+    with open(output_path, "rb") as f:
+        return f.read()
+
+def test_textOutput(tmpdir):
+    expected = (b"|labels 0 1\t|features 0.5 0.25\n"
+                b"|labels 1 0\t|features 1.5 2\n"
+                b"|labels 0 1\t|features 0 0\n")
+    assert _convert(tmpdir, UCI_INPUT, "text") == expected
+    # the chunking does not change the output
+    assert _convert(tmpdir, UCI_INPUT, "text", chunk_rows=2) == expected
+
+def test_illegalLabel(tmpdir):
+    with pytest.raises(RuntimeError) as info:
+        _convert(tmpdir, "1 0.5 0.25\n2 0 0\n", "text")
+    assert str(info.value) == "Illegal label value: '2'"
+
+def test_binaryOutputMatchesCtf2bin(tmpdir):
+    import ctf2bin
+    ctf_path = str(tmpdir / "input.ctf")
+    header_path = str(tmpdir / "header.txt")
+    with open(ctf_path, "w") as f:
+        f.write("0\t|labels 1:1\t|features 0.5 0.25\n"
+                "1\t|labels 0:1\t|features 1.5 2\n"
+                "2\t|labels 1:1\t|features 0 0\n")
+    with open(header_path, "w") as f:
+        f.write("labels labels sparse 2\nfeatures features dense 2\n")
+
+    expected_path = str(tmpdir / "expected.bin")
+    with open(ctf_path, "r") as input_file, open(expected_path, "wb") as output:
+        ctf2bin.convert(input_file, output, ctf2bin.build_converters(header_path, ctf2bin.ElementType.FLOAT),
+            3, by_samples=True)
+    with open(expected_path, "rb") as f:
+        expected = f.read()
 
-  convert(file_in, file_out, args.features_start, args.features_dim, 
-    args.labels_start, args.labels_dim, args.num_labels, args.label_type, args.mapping_file)
\ No newline at end of file
+    assert _convert(tmpdir, UCI_INPUT, "binary", chunk_rows=3) == expected
@@ -22,6 +22,7 @@
 #include <mutex>
 #include <future>
 #include <cstddef>
+#include <tuple>
 
 #ifdef SWIG
 #define final
@@ -687,6 +688,15 @@ namespace CNTK
         template <typename ElementType>
         CNTK_API const ElementType* DataBuffer() const;
 
+        ///
+        /// Returns read-only pointers to the non-zero values, the column starts and the row indices of 'this' view in the
+        /// SparseCSC format. The column starts of a slice view may not begin at 0; the values and row indices of column 'j'
+        /// are at the offset 'colStarts[j] - colStarts[0]' of the respective buffer.
+        /// Throws an exception if 'this' view is not a SparseCSC view on the CPU.
+        ///
+        template <typename ElementType>
+        CNTK_API std::tuple<const ElementType*, const SparseIndexType*, const SparseIndexType*> SparseCSCDataBuffers() const;
+
         ///
         /// Returns the descriptor of the device that 'this' view resides on
         ///
@@ -4881,6 +4891,74 @@ namespace CNTK
         ///
         CNTK_API void SummarizeTrainingProgress();
 
+        ///
+        /// Sets the number of minibatches whose gradients are summed up before the learners are called once with
+        /// the sum and the total number of samples of these minibatches. The default of 1 updates the parameters
+        /// after every minibatch. The gradients are also applied at the end of a sweep and at the end of the data,
+        /// which is signalled by an empty minibatch. Not supported with distributed learners.
+        ///
+        CNTK_API void SetGradientAccumulationSteps(size_t steps);
+
+        ///
+        /// Returns the number of minibatches whose gradients are summed up before the parameters are updated.
+        ///
+        size_t GradientAccumulationSteps() const { return m_gradientAccumulationSteps; }
+
+        ///
+        /// Returns the number of minibatches whose gradients have been accumulated, but not yet applied.
+        ///
+        size_t AccumulatedMinibatchCount() const { return m_accumulatedMinibatchCount; }
+
+        ///
+        /// Returns the number of samples in the minibatches whose gradients have been accumulated, but not yet applied.
+        ///
+        size_t AccumulatedSampleCount() const { return m_accumulatedSampleCount; }
+
+        ///
+        /// Configures how SaveCheckpoint writes checkpoints. With 'background' set, SaveCheckpoint only takes a snapshot of the
+        /// model and the trainer state in host memory and writes it to disk on a worker thread while the training continues.
+        /// At most one checkpoint is written at a time; saving the next one first waits for the previous one.
+        /// If 'keepLast' is not 0, only the last 'keepLast' checkpoints saved by 'this' Trainer are kept and older ones are deleted.
+        /// Distributed trainers always write their checkpoints synchronously.
+        ///
+        CNTK_API void SetCheckpointWriting(bool background, size_t keepLast = 0);
+
+        ///
+        /// Waits until the checkpoint that is being written in the background is complete.
+        /// Throws the error that occurred while writing it, if any.
+        ///
+        CNTK_API void WaitForCheckpoint();
+
+        ///
+        /// Returns the number of checkpoints written by 'this' Trainer.
+        ///
+        CNTK_API size_t CheckpointCount() const;
+
+        ///
+        /// Returns the total number of seconds the training was paused for taking checkpoint snapshots.
+        ///
+        CNTK_API double CheckpointSnapshotTime() const;
+
+        ///
+        /// Returns the total number of seconds spent writing checkpoints to disk.
+        ///
+        CNTK_API double CheckpointWriteTime() const;
+
+        ///
+        /// Returns the number of seconds the training was paused for the snapshot of the last checkpoint.
+        ///
+        CNTK_API double LastCheckpointSnapshotTime() const;
+
+        ///
+        /// Returns the number of seconds spent writing the last checkpoint to disk.
+        ///
+        CNTK_API double LastCheckpointWriteTime() const;
+
+        ///
+        /// Destruct 'this' Trainer, after waiting for the checkpoint that is being written in the background.
+        ///
+        CNTK_API virtual ~Trainer();
+
     private:
         template <typename T1, typename ...CtorArgTypes>
         friend std::shared_ptr<T1> MakeSharedObject(CtorArgTypes&& ...ctorArgs);
@@ -4907,6 +4985,15 @@ namespace CNTK
         void UpdateTrainingProgress(size_t numSamples, const ValuePtr& loss, const ValuePtr& evalCriterion, const DeviceDescriptor& computeDevice);
         void AddProgressWriters(const std::vector<ProgressWriterPtr>& progressWriters);
 
+        void AccumulateGradients(const std::unordered_map<Parameter, NDArrayViewPtr>& gradients);
+        bool ApplyAccumulatedGradients(bool sweepEnd);
+        void ResetAccumulatedGradients();
+
+        void WriteCheckpoint(const std::wstring& modelFilePath, const Dictionary& model, Dictionary& state);
+        void RecordCheckpointWritten(const std::wstring& modelFilePath, double writeTime);
+        Dictionary GradientAccumulationState() const;
+        void RestoreGradientAccumulationState(const Dictionary& state);
+
         FunctionPtr m_model;
         FunctionPtr m_combinedTrainingFunction;
         FunctionPtr m_lossFunction;
@@ -4926,6 +5013,22 @@ namespace CNTK
         AccumulatorPtr m_aggregatedTrainingEvalCriterionValue;
 
         size_t m_prevDistributedTotalNumSamples;
+
+        size_t m_gradientAccumulationSteps;
+        size_t m_accumulatedMinibatchCount;
+        size_t m_accumulatedSampleCount;
+        std::unordered_map<Parameter, NDArrayViewPtr> m_accumulatedGradients;
+
+        bool m_backgroundCheckpointing;
+        size_t m_keepLastCheckpoints;
+        std::future<void> m_pendingCheckpoint;
+        mutable std::mutex m_checkpointMutex;
+        std::vector<std::wstring> m_writtenCheckpoints;
+        size_t m_checkpointCount;
+        double m_checkpointSnapshotTime;
+        double m_checkpointWriteTime;
+        double m_lastCheckpointSnapshotTime;
+        double m_lastCheckpointWriteTime;
     };
 
     ///
@@ -5428,12 +5531,16 @@ namespace CNTK
         /// checkpointFrequencyInSamples: frequency in samples when to perform checkpointing.
         /// restoreFromCheckpointIfExists: if flag is set, the training session will try to restore before training.
         /// preserveAllCheckpoints: if flag is set, all checkpoints will be preserved.
+        /// writeInBackground: if flag is set, checkpoints are written on a worker thread while the training continues.
+        /// keepLast: if not 0, only the last 'keepLast' checkpoints are kept.
         ///
         CNTK_API CheckpointConfig(
             const std::wstring& checkPointFileName,
             size_t checkpointFrequencyInSamples = std::numeric_limits<size_t>::max(),
             bool restoreFromCheckpointIfExists = true,
-            bool preserveAllCheckpoints = false);
+            bool preserveAllCheckpoints = false,
+            bool writeInBackground = false,
+            size_t keepLast = 0);
 
     private:
         friend class TrainingSession;
@@ -5441,6 +5548,8 @@ namespace CNTK
         const bool m_restore;
         const bool m_preserveAll;
         const size_t m_frequency;
+        const bool m_background;
+        const size_t m_keepLast;
     };
 
     ///
@@ -426,6 +426,23 @@ namespace CNTK
         return matrix->Data();
     }
 
+    template <typename ElementType>
+    std::tuple<const ElementType*, const SparseIndexType*, const SparseIndexType*> NDArrayView::SparseCSCDataBuffers() const
+    {
+        if (AsDataType<ElementType>() != m_dataType)
+            InvalidArgument("NDArrayView::SparseCSCDataBuffers: The specified ElementType '%s' does not match this NDArrayView's DataType '%s'.", typeid(ElementType).name(), DataTypeName(m_dataType));
+
+        if (GetStorageFormat() != StorageFormat::SparseCSC)
+            InvalidArgument("NDArrayView::SparseCSCDataBuffers: The NDArrayView is not in the SparseCSC storage format.");
+
+        if (m_device.Type() != DeviceKind::CPU)
+            InvalidArgument("NDArrayView::SparseCSCDataBuffers: The NDArrayView has to reside on the CPU.");
+
+        auto matrix = GetMatrix<ElementType>();
+        auto cpuSparseMatrix = matrix->m_CPUSparseMatrix;
+        return std::make_tuple<const ElementType*, const SparseIndexType*, const SparseIndexType*>(cpuSparseMatrix->Data(), cpuSparseMatrix->SecondaryIndexLocation(), cpuSparseMatrix->MajorIndexLocation());
+    }
+
     void NDArrayView::ChangeDevice(const DeviceDescriptor& device)
     {
         if (device == m_device)
@@ -521,6 +538,9 @@ namespace CNTK
     template CNTK_API const float* NDArrayView::DataBuffer<float>() const;
     template CNTK_API const double* NDArrayView::DataBuffer<double>() const;
 
+    template CNTK_API std::tuple<const float*, const SparseIndexType*, const SparseIndexType*> NDArrayView::SparseCSCDataBuffers<float>() const;
+    template CNTK_API std::tuple<const double*, const SparseIndexType*, const SparseIndexType*> NDArrayView::SparseCSCDataBuffers<double>() const;
+
     template CNTK_API float* NDArrayView::WritableDataBuffer<float>();
     template CNTK_API double* NDArrayView::WritableDataBuffer<double>();
 
@@ -10,6 +10,8 @@
 #include "PerformanceProfiler.h"
 #include "CompositeFunction.h"
 #include "Serialization.h"
+#include "Matrix.h"
+#include <chrono>
 
 namespace
 {
@@ -17,12 +19,17 @@ namespace
     const std::wstring learnersPropertyName = L"Learners";
     const std::wstring externalStatePropertyName = L"ExternalState";
     const std::wstring distributedStatePropertyName = L"DistributedState";
+    const std::wstring gradientAccumulationPropertyName = L"GradientAccumulation";
+    const std::wstring accumulatedMinibatchCountPropertyName = L"AccumulatedMinibatchCount";
+    const std::wstring accumulatedSampleCountPropertyName = L"AccumulatedSampleCount";
+    const std::wstring accumulatedGradientsPropertyName = L"AccumulatedGradients";
 
     // Version history:
     // 0 -- a version number before the versioning was introduced for the trainer's checkpoints.
     // 1 -- initial version: added a key-value pair for the checkpoint version info, added
     //      distributed state key to save all local state collected from distributed workers.
-    static const size_t trainerCheckpointVersion = 1;
+    // 2 -- added the partially accumulated gradients, if gradient accumulation is enabled.
+    static const size_t trainerCheckpointVersion = 2;
 }
 
 namespace CNTK
@@ -44,7 +51,17 @@ namespace CNTK
           m_distributed(false),
           m_aggregatedTrainingLossValue(std::make_shared<Accumulator>()),
           m_aggregatedTrainingEvalCriterionValue(),
-          m_prevDistributedTotalNumSamples(0)
+          m_prevDistributedTotalNumSamples(0),
+          m_gradientAccumulationSteps(1),
+          m_accumulatedMinibatchCount(0),
+          m_accumulatedSampleCount(0),
+          m_backgroundCheckpointing(false),
+          m_keepLastCheckpoints(0),
+          m_checkpointCount(0),
+          m_checkpointSnapshotTime(0),
+          m_checkpointWriteTime(0),
+          m_lastCheckpointSnapshotTime(0),
+          m_lastCheckpointWriteTime(0)
     {
         std::vector<Variable> combinedFunctionArgs;
         if (m_model) // model is optional, since it may not be adding any information on top of lossFunction
@@ -197,6 +214,9 @@ namespace CNTK
         if (emptyMinibatch) // Nothing to train with.
         {
             m_prevMinibatchNumSamples = 0;
+            // The end of the data; apply what has been accumulated so far.
+            if (m_accumulatedMinibatchCount > 0)
+                ApplyAccumulatedGradients(sweepEnd);
             return false;
         }
 
@@ -208,7 +228,111 @@ namespace CNTK
         std::unordered_map<Parameter, NDArrayViewPtr> gradients;
         for (const auto& parameter : m_learnerParameters)
             gradients[parameter] = parameterGradients[parameter]->Data();
-        return m_parameterLearners->Update(gradients, m_prevMinibatchNumSamples, sweepEnd);
+
+        if (m_gradientAccumulationSteps <= 1 && m_accumulatedMinibatchCount == 0)
+            return m_parameterLearners->Update(gradients, m_prevMinibatchNumSamples, sweepEnd);
+
+        AccumulateGradients(gradients);
+        m_accumulatedSampleCount += m_prevMinibatchNumSamples;
+        m_accumulatedMinibatchCount++;
+        if (m_accumulatedMinibatchCount < m_gradientAccumulationSteps && !sweepEnd)
+            return true;
+
+        return ApplyAccumulatedGradients(sweepEnd);
+    }
+
+    void Trainer::SetGradientAccumulationSteps(size_t steps)
+    {
+        if (steps == 0)
+            InvalidArgument("Trainer: the number of gradient accumulation steps must be positive.");
+        if (m_distributed && steps > 1)
+            InvalidArgument("Trainer: gradient accumulation is not supported with distributed learners.");
+
+        m_gradientAccumulationSteps = steps;
+    }
+
+    void Trainer::AccumulateGradients(const std::unordered_map<Parameter, NDArrayViewPtr>& gradients)
+    {
+        for (const auto& kv : gradients)
+        {
+            const auto& parameter = kv.first;
+            const auto& gradient = kv.second;
+
+            auto accumulated = m_accumulatedGradients.find(parameter);
+            if (accumulated == m_accumulatedGradients.end())
+            {
+                // The buffers are allocated once and kept for the lifetime of the trainer.
+                auto buffer = MakeSharedObject<NDArrayView>(0, gradient->GetDataType(), parameter.Shape(), gradient->Device());
+                accumulated = m_accumulatedGradients.insert({ parameter, buffer }).first;
+            }
+
+            if (gradient->GetDataType() == DataType::Float)
+                Microsoft::MSR::CNTK::Matrix<float>::ScaleAndAdd(1.0f, *gradient->GetMatrix<float>(), *accumulated->second->GetWritableMatrix<float>());
+            else if (gradient->GetDataType() == DataType::Double)
+                Microsoft::MSR::CNTK::Matrix<double>::ScaleAndAdd(1.0, *gradient->GetMatrix<double>(), *accumulated->second->GetWritableMatrix<double>());
+            else
+                LogicError("Trainer: unsupported data type %s of the gradient of parameter '%S'.", DataTypeName(gradient->GetDataType()), parameter.AsString().c_str());
+        }
+    }
+
+    bool Trainer::ApplyAccumulatedGradients(bool sweepEnd)
+    {
+        // The learners may modify the gradients in place, e.g. when clipping them.
+        std::unordered_map<Parameter, NDArrayViewPtr> gradients(m_accumulatedGradients);
+        bool updated = m_parameterLearners->Update(gradients, m_accumulatedSampleCount, sweepEnd);
+        ResetAccumulatedGradients();
+        return updated;
+    }
+
+    void Trainer::ResetAccumulatedGradients()
+    {
+        for (auto& kv : m_accumulatedGradients)
+        {
+            if (kv.second->GetDataType() == DataType::Float)
+                kv.second->SetValue(0.0f);
+            else
+                kv.second->SetValue(0.0);
+        }
+
+        m_accumulatedMinibatchCount = 0;
+        m_accumulatedSampleCount = 0;
+    }
+
+    Dictionary Trainer::GradientAccumulationState() const
+    {
+        Dictionary gradients;
+        for (const auto& kv : m_accumulatedGradients)
+            gradients[kv.first.Uid()] = *kv.second;
+
+        Dictionary state;
+        state[accumulatedMinibatchCountPropertyName] = m_accumulatedMinibatchCount;
+        state[accumulatedSampleCountPropertyName] = m_accumulatedSampleCount;
+        state[accumulatedGradientsPropertyName] = gradients;
+        return state;
+    }
+
+    void Trainer::RestoreGradientAccumulationState(const Dictionary& state)
+    {
+        ResetAccumulatedGradients();
+
+        const auto& gradients = state[accumulatedGradientsPropertyName].Value<Dictionary>();
+        for (const auto& parameter : m_learnerParameters)
+        {
+            if (!gradients.Contains(parameter.Uid()))
+                continue;
+
+            const auto& saved = gradients[parameter.Uid()].Value<NDArrayView>();
+            auto accumulated = m_accumulatedGradients.find(parameter);
+            if (accumulated == m_accumulatedGradients.end())
+            {
+                auto buffer = MakeSharedObject<NDArrayView>(0, saved.GetDataType(), parameter.Shape(), parameter.Value()->Device());
+                accumulated = m_accumulatedGradients.insert({ parameter, buffer }).first;
+            }
+            accumulated->second->CopyFrom(saved);
+        }
+
+        m_accumulatedMinibatchCount = state[accumulatedMinibatchCountPropertyName].Value<size_t>();
+        m_accumulatedSampleCount = state[accumulatedSampleCountPropertyName].Value<size_t>();
     }
 
     bool Trainer::TrainDistributedMinibatch(const std::unordered_map<Variable, ValuePtr>& arguments, std::unordered_map<Variable, ValuePtr>& outputsToFetch, bool sweepEnd, const DeviceDescriptor& computeDevice /*= DeviceDescriptor::UseDefaultDevice()*/)
@@ -395,14 +519,47 @@ namespace CNTK
 
     void Trainer::Save(const std::wstring& modelFilePath, const std::vector<DictionaryValue>& learnerState, const Dictionary& externalState, const Dictionary& distributedState)
     {
+        // Serializing the model copies the parameters to host memory, so the snapshot
+        // is not affected by the minibatches trained while it is written.
+        auto snapshotStart = std::chrono::steady_clock::now();
+        auto model = std::make_shared<Dictionary>(m_combinedTrainingFunction->Serialize());
+        auto state = std::make_shared<Dictionary>();
+        (*state)[versionPropertyName] = trainerCheckpointVersion;
+        (*state)[learnersPropertyName] = learnerState;
+        (*state)[externalStatePropertyName] = externalState;
+        (*state)[distributedStatePropertyName] = distributedState;
+        if (m_accumulatedMinibatchCount > 0)
+            (*state)[gradientAccumulationPropertyName] = GradientAccumulationState();
+        double snapshotTime = std::chrono::duration<double>(std::chrono::steady_clock::now() - snapshotStart).count();
+
+        {
+            std::lock_guard<std::mutex> lock(m_checkpointMutex);
+            m_checkpointSnapshotTime += snapshotTime;
+            m_lastCheckpointSnapshotTime = snapshotTime;
+        }
+
+        // Distributed workers synchronize on the checkpoint being written, so it is written right away.
+        if (!m_backgroundCheckpointing || m_distributed)
+            return WriteCheckpoint(modelFilePath, *model, *state);
+
+        // Only one checkpoint is written at a time.
+        WaitForCheckpoint();
+        m_pendingCheckpoint = std::async(std::launch::async, [this, modelFilePath, model, state]()
+        {
+            WriteCheckpoint(modelFilePath, *model, *state);
+        });
+    }
+
+    void Trainer::WriteCheckpoint(const std::wstring& modelFilePath, const Dictionary& model, Dictionary& state)
+    {
+        auto writeStart = std::chrono::steady_clock::now();
         std::wstring tempModelFile = modelFilePath + L".tmp";
-        Dictionary state;
-        state[versionPropertyName] = trainerCheckpointVersion;
-        state[learnersPropertyName] = learnerState;
-        state[externalStatePropertyName] = externalState;
-        state[distributedStatePropertyName] = distributedState;
+        {
+            auto stream = GetFstream(tempModelFile, false);
+            *stream << model;
+            stream->flush();
+        }
 
-        m_combinedTrainingFunction->Save(tempModelFile);
         std::wstring trainerStateCheckpointFilePath = GetTrainerStateCheckpointFilePath(modelFilePath);
         std::wstring tempCheckpointFile = trainerStateCheckpointFilePath + L".tmp";
 
@@ -414,10 +571,93 @@ namespace CNTK
 
         renameOrDie(tempModelFile, modelFilePath);
         renameOrDie(tempCheckpointFile, trainerStateCheckpointFilePath);
+
+        RecordCheckpointWritten(modelFilePath, std::chrono::duration<double>(std::chrono::steady_clock::now() - writeStart).count());
+    }
+
+    void Trainer::RecordCheckpointWritten(const std::wstring& modelFilePath, double writeTime)
+    {
+        std::lock_guard<std::mutex> lock(m_checkpointMutex);
+        m_checkpointCount++;
+        m_checkpointWriteTime += writeTime;
+        m_lastCheckpointWriteTime = writeTime;
+
+        m_writtenCheckpoints.erase(std::remove(m_writtenCheckpoints.begin(), m_writtenCheckpoints.end(), modelFilePath), m_writtenCheckpoints.end());
+        m_writtenCheckpoints.push_back(modelFilePath);
+        if (m_keepLastCheckpoints == 0)
+            return;
+
+        while (m_writtenCheckpoints.size() > m_keepLastCheckpoints)
+        {
+            const auto& oldest = m_writtenCheckpoints.front();
+            // The return values are ignored here, the files may have been removed already.
+            _wunlink(oldest.c_str());
+            _wunlink(GetTrainerStateCheckpointFilePath(oldest).c_str());
+            m_writtenCheckpoints.erase(m_writtenCheckpoints.begin());
+        }
+    }
+
+    void Trainer::SetCheckpointWriting(bool background, size_t keepLast)
+    {
+        WaitForCheckpoint();
+        std::lock_guard<std::mutex> lock(m_checkpointMutex);
+        m_backgroundCheckpointing = background;
+        m_keepLastCheckpoints = keepLast;
+    }
+
+    void Trainer::WaitForCheckpoint()
+    {
+        if (m_pendingCheckpoint.valid())
+            m_pendingCheckpoint.get(); // Rethrows the error of the write, if any.
+    }
+
+    size_t Trainer::CheckpointCount() const
+    {
+        std::lock_guard<std::mutex> lock(m_checkpointMutex);
+        return m_checkpointCount;
+    }
+
+    double Trainer::CheckpointSnapshotTime() const
+    {
+        std::lock_guard<std::mutex> lock(m_checkpointMutex);
+        return m_checkpointSnapshotTime;
+    }
+
+    double Trainer::CheckpointWriteTime() const
+    {
+        std::lock_guard<std::mutex> lock(m_checkpointMutex);
+        return m_checkpointWriteTime;
+    }
+
+    double Trainer::LastCheckpointSnapshotTime() const
+    {
+        std::lock_guard<std::mutex> lock(m_checkpointMutex);
+        return m_lastCheckpointSnapshotTime;
+    }
+
+    double Trainer::LastCheckpointWriteTime() const
+    {
+        std::lock_guard<std::mutex> lock(m_checkpointMutex);
+        return m_lastCheckpointWriteTime;
+    }
+
+    Trainer::~Trainer()
+    {
+        try
+        {
+            WaitForCheckpoint();
+        }
+        catch (const std::exception& e)
+        {
+            fprintf(stderr, "Writing the last checkpoint failed: %s\n", e.what());
+        }
     }
 
     Dictionary Trainer::RestoreFromCheckpoint(const std::wstring& modelFilePath)
     {
+        // The checkpoint may still be written in the background.
+        WaitForCheckpoint();
+
         // Restore the model's parameters
         m_combinedTrainingFunction->Restore(modelFilePath);
 
@@ -433,6 +673,12 @@ namespace CNTK
 
         m_parameterLearners->RestoreFromCheckpoint(learnerState);
 
+        // Gradients accumulated before the restore belong to a different point of the training.
+        if (checkpoint.Contains(gradientAccumulationPropertyName))
+            RestoreGradientAccumulationState(checkpoint[gradientAccumulationPropertyName].Value<Dictionary>());
+        else
+            ResetAccumulatedGradients();
+
         if (!m_distributed)
         {
             return externalState;
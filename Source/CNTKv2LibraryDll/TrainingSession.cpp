@@ -26,11 +26,15 @@ namespace CNTK
         const std::wstring& checkPointFileName,
         size_t checkpointFrequencyInSamples,
         bool restoreFromCheckpointIfExists,
-        bool preserveAllCheckpoints) :
+        bool preserveAllCheckpoints,
+        bool writeInBackground,
+        size_t keepLast) :
         m_preserveAll(preserveAllCheckpoints),
         m_restore(restoreFromCheckpointIfExists),
         m_fileName(checkPointFileName),
-        m_frequency(checkpointFrequencyInSamples)
+        m_frequency(checkpointFrequencyInSamples),
+        m_background(writeInBackground),
+        m_keepLast(keepLast)
     {
         if (m_fileName.empty())
         {
@@ -164,6 +168,9 @@ namespace CNTK
         std::unordered_map<Variable, ValuePtr> minibatch;
         bool shouldTrain = m_maxNumSamples > 0;
 
+        if (!m_checkpoint.m_fileName.empty())
+            Trainer()->SetCheckpointWriting(m_checkpoint.m_background, m_checkpoint.m_keepLast);
+
         // Let's try to restore if required.
         size_t restoredNumberOfSamples = 0;
         if (m_checkpoint.m_restore && !m_checkpoint.m_fileName.empty())
@@ -219,6 +226,9 @@ namespace CNTK
             }
         }
 
+        // The last checkpoint may still be written in the background.
+        Trainer()->WaitForCheckpoint();
+
         // In case of incremental - save final checkpoint.
         // This is required only when we keep all existing checkpoints, otherwise 
         // The checkpoint was already saved with the proper name.
@@ -227,6 +237,8 @@ namespace CNTK
             !fexists(m_checkpoint.m_fileName))
             SaveFinalCheckpoint();
 
+        Trainer()->WaitForCheckpoint();
+
         // Perform testing according to the test config.
         Test(computeDevice);
     }
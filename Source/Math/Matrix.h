@@ -25,6 +25,7 @@
 namespace CNTK
 {
     class Value;
+    class NDArrayView;
 }
 
 // This class is exported from the Math.dll
@@ -70,6 +71,7 @@ template <class ElemType>
 class MATH_API Matrix : public MatrixBase
 {
     friend class ::CNTK::Value;
+    friend class ::CNTK::NDArrayView;
 
     typedef MatrixBase Base;
 private:
@@ -1,4 +1,4 @@
-%module(directors="1") cntk_py
+%module(directors="1", threads="1") cntk_py
 //%feature("autodoc", "1");
 
 
@@ -53,6 +53,7 @@
 %ignore CNTK::Variable::operator FunctionPtr;
 %ignore CNTK::AddConfigString;
 %ignore CNTK::GetCorrespondingOutputVariableFromClone;
+%ignore CNTK::NDArrayView::SparseCSCDataBuffers;
 
 // The following operators are not supported in Python.
 %ignore operator<<;
@@ -68,6 +69,15 @@
 
 %ignore CNTK::GetCheckedMode;
 
+// The GIL is only released while the trainer runs a minibatch, so that
+// Python threads (e.g. cntk.io.StagingQueue) can prepare the next one,
+// and while it waits for a checkpoint written in the background.
+// Callbacks into Python (directors) acquire it again.
+%feature("nothreadallow");
+%feature("nothreadallow", "0") CNTK::Trainer::TrainMinibatch;
+%feature("nothreadallow", "0") CNTK::Evaluator::TestMinibatch;
+%feature("nothreadallow", "0") CNTK::Trainer::WaitForCheckpoint;
+
 // renaming overloads for TrainMinibatch and TestMinibatch that take a map 
 // of Variables and MinibatchData as their first parameter. If this is not done, 
 // the overloads that are legal in C++ will be shadowed and ignored by SWIG.
@@ -246,6 +256,63 @@ def dynamic_axes(self):
     }
 }
 
+%fragment("SparseCSCToNumPy", "header")
+{
+    template <typename ElementType>
+    PyObject* SparseCSCBuffersToNumPy(const CNTK::NDArrayView* view, NPY_TYPES numpy_type)
+    {
+        const ElementType* data;
+        const CNTK::SparseIndexType* colStarts;
+        const CNTK::SparseIndexType* rowIndices;
+        std::tie(data, colStarts, rowIndices) = view->SparseCSCDataBuffers<ElementType>();
+
+        // Every column of the CNTK view is a row of the NumPy/SciPy view
+        auto& shape = view->Shape();
+        npy_intp num_cols = static_cast<npy_intp>(shape.TotalSize() / shape[0]);
+        npy_intp num_col_starts = num_cols + 1;
+        npy_intp num_non_zero_values = colStarts[num_cols] - colStarts[0];
+
+        PyObject* py_data = PyArray_SimpleNew(1, &num_non_zero_values, numpy_type);
+        memcpy(PyArray_DATA((PyArrayObject*)py_data), data, sizeof(ElementType) * num_non_zero_values);
+
+        PyObject* py_row_indices = PyArray_SimpleNew(1, &num_non_zero_values, NPY_INT32);
+        memcpy(PyArray_DATA((PyArrayObject*)py_row_indices), rowIndices, sizeof(CNTK::SparseIndexType) * num_non_zero_values);
+
+        // The column starts of a slice view are rebased to 0
+        PyObject* py_col_starts = PyArray_SimpleNew(1, &num_col_starts, NPY_INT32);
+        auto col_starts = (CNTK::SparseIndexType*)PyArray_DATA((PyArrayObject*)py_col_starts);
+        for (npy_intp i = 0; i < num_col_starts; i++)
+            col_starts[i] = colStarts[i] - colStarts[0];
+
+        return Py_BuildValue("(NNN)", py_data, py_col_starts, py_row_indices);
+    }
+
+    PyObject* SparseCSCToNumPy(const CNTK::NDArrayView* self)
+    {
+        if ((*self).GetStorageFormat() != StorageFormat::SparseCSC)
+            throw std::invalid_argument("only SparseCSC supported at the moment");
+
+        // The buffers can only be accessed on the CPU
+        CNTK::NDArrayViewPtr cpuView;
+        const CNTK::NDArrayView* view = self;
+        if ((*self).Device() != DeviceDescriptor::CPUDevice())
+        {
+            cpuView = (*self).DeepClone(DeviceDescriptor::CPUDevice(), true);
+            view = cpuView.get();
+        }
+
+        CNTK::DataType cntk_type = (*self).GetDataType();
+        if (cntk_type == CNTK::DataType::Float)
+            return SparseCSCBuffersToNumPy<float>(view, NPY_FLOAT);
+        else if (cntk_type == CNTK::DataType::Double)
+            return SparseCSCBuffersToNumPy<double>(view, NPY_DOUBLE);
+        else
+            throw std::invalid_argument("unknown CNTK data type");
+    }
+}
+
+%fragment("SparseCSCToNumPy");
+
 %fragment("pydict_insert", "header")
 {
      template<typename T> bool pydict_insert(PyObject* dictionary, const T& key, swig_type_info *swig_type, PyObject* item) {
@@ -1780,6 +1847,60 @@ namespace CNTK
         PyObject *NDArrayViewToNumPy(const CNTK::NDArrayView*);
         return NDArrayViewToNumPy(self);
     }
+
+    // Returns the tuple (data, indptr, indices) of a scipy.sparse.csr_matrix
+    // with one row per column of the SparseCSC view.
+    PyObject* sparse_csc_data() {
+        PyObject *SparseCSCToNumPy(const CNTK::NDArrayView*);
+        return SparseCSCToNumPy(self);
+    }
+
+    // Returns a NumPy array that shares the memory of this dense view on the
+    // CPU instead of copying it like to_ndarray(). The array keeps the view
+    // alive and is read-only if the view is.
+    PyObject* as_numpy_view() {
+        if ((*self).GetStorageFormat() != StorageFormat::Dense)
+            throw std::invalid_argument("only dense views can be shared with NumPy");
+        if ((*self).Device() != DeviceDescriptor::CPUDevice())
+            throw std::invalid_argument("only views on the CPU can be shared with NumPy");
+
+        // CNTK uses column major, thus we reverse the shape
+        std::vector<size_t> dimensions_cntk = (*self).Shape().Dimensions();
+        std::vector<npy_intp> dimensions(dimensions_cntk.rbegin(), dimensions_cntk.rend());
+
+        NPY_TYPES numpy_type;
+        void* buffer;
+        if ((*self).GetDataType() == CNTK::DataType::Float)
+        {
+            numpy_type = NPY_FLOAT;
+            buffer = const_cast<float*>((*self).DataBuffer<float>());
+        }
+        else if ((*self).GetDataType() == CNTK::DataType::Double)
+        {
+            numpy_type = NPY_DOUBLE;
+            buffer = const_cast<double*>((*self).DataBuffer<double>());
+        }
+        else
+        {
+            throw std::invalid_argument("unknown CNTK data type");
+        }
+
+        PyObject* ndarray = PyArray_SimpleNewFromData(static_cast<int>(dimensions.size()), dimensions.data(), numpy_type, buffer);
+        if (ndarray == nullptr)
+            return nullptr;
+
+        if ((*self).IsReadOnly())
+            PyArray_CLEARFLAGS((PyArrayObject*)ndarray, NPY_ARRAY_WRITEABLE);
+
+        // the base object of the array holds a reference to the view
+        auto owner = new CNTK::NDArrayViewPtr((*self).shared_from_this());
+        PyObject* capsule = PyCapsule_New(owner, nullptr, [](PyObject* capsule) {
+            delete static_cast<CNTK::NDArrayViewPtr*>(PyCapsule_GetPointer(capsule, nullptr));
+        });
+        PyArray_SetBaseObject((PyArrayObject*)ndarray, capsule);
+
+        return ndarray;
+    }
 }
 
 // end of NDArrayView
@@ -1842,7 +1963,10 @@ namespace CNTK {
 
         virtual ~UserBackPropState()
         {
+            // the state may be released by a trainer running without the GIL
+            PyGILState_STATE gilState = PyGILState_Ensure();
             Py_DECREF(m_userData);
+            PyGILState_Release(gilState);
         }
 
     private:
@@ -3,6 +3,8 @@
 # for full license information.
 # ==============================================================================
 
+import collections as _collections
+import threading as _threading
 import warnings
 import numbers
 import numpy as np
@@ -11,9 +13,8 @@ from scipy import sparse
 from . import cntk_py
 from .device import use_default_device, cpu, DeviceKind
 from cntk.internal import typemap
-from cntk.internal.sanitize import sanitize_batch,\
-                                   _sparse_to_dense_network_cache,\
-                                   data_type_to_dtype
+from cntk.internal.cache import LRUCache as _LRUCache
+from cntk.internal.sanitize import sanitize_batch, data_type_to_dtype
 
 
 def _is_c_contiguous(data):
@@ -23,6 +24,146 @@ def _is_c_contiguous(data):
     return data.flags.c_contiguous
 
 
+def _sequence_mask(batch_size, max_length, lengths, seq_starts, device):
+    # Returns the NDMask for a batch of sequences padded to max_length, or
+    # None if all sequences have that length and start in this minibatch.
+    # Only the sequences that are shorter are masked one by one.
+    if lengths is None:
+        short = []
+    else:
+        lengths = np.asarray(lengths)
+        if lengths.shape != (batch_size,):
+            raise ValueError('expected %i sequence lengths, but got %s'
+                             % (batch_size, lengths.shape))
+        if (lengths < 1).any() or (lengths > max_length).any():
+            raise ValueError('sequence lengths must be between 1 and %i'
+                             % max_length)
+        short = np.flatnonzero(lengths < max_length).tolist()
+
+    if seq_starts is not None and len(seq_starts) != batch_size:
+        raise ValueError('expected %i seq_starts, but got %i'
+                         % (batch_size, len(seq_starts)))
+    continued = seq_starts is not None and not all(seq_starts)
+
+    if not short and not continued:
+        return None
+
+    # NDMask offsets are in CNTK's order (step, sequence), shapes in the
+    # Python order
+    mask = cntk_py.NDMask((batch_size, max_length), device)
+    for i in short:
+        length = int(lengths[i])
+        mask.invalidate_section([length, i], (1, max_length - length))
+    if continued:
+        for i in np.flatnonzero(seq_starts).tolist():
+            mask.mark_sequence_begin([0, i])
+    else:
+        mask.mark_sequence_begin([0, 0], (batch_size, 1))
+    return mask
+
+
+def _sparse_to_csr(ndav):
+    # Copies the buffers of a sparse NDArrayView into a CSR matrix with one
+    # row per column of the CNTK view, i.e. of shape
+    # (prod(shape[:-1]), shape[-1]), without creating a dense array.
+    shape = cntk_py.NDArrayView.shape(ndav).dimensions()
+    data, indptr, indices = cntk_py.NDArrayView.sparse_csc_data(ndav)
+    return sparse.csr_matrix((data, indices, indptr),
+                             shape=(len(indptr) - 1, shape[-1]))
+
+
+def _sparse_value_to_csr_sequences(value, sample_shape):
+    # Splits the sparse data of a Value into one CSR matrix per sequence
+    # without the masked samples. The matrices share the buffers of the
+    # extracted data.
+    csr = _sparse_to_csr(cntk_py.Value.data(value))
+    dynamic_shape = value.shape[:len(value.shape) - len(sample_shape)]
+    batch_size, max_length = (tuple(dynamic_shape) + (1, 1))[:2]
+
+    rows_per_sample = int(np.prod(sample_shape[:-1]))
+    if cntk_py.Value.mask(value) is not None:
+        lengths = (value.mask != cntk_py.MaskKind_Invalid).sum(axis=1)
+    else:
+        lengths = np.full(batch_size, max_length)
+
+    sequences = []
+    for i, length in enumerate(lengths.tolist()):
+        begin = i * max_length * rows_per_sample
+        end = begin + length * rows_per_sample
+        indptr = csr.indptr[begin:end + 1]
+        sequences.append(sparse.csr_matrix(
+            (csr.data[indptr[0]:indptr[-1]], csr.indices[indptr[0]:indptr[-1]],
+             indptr - indptr[0]), shape=(end - begin, csr.shape[1])))
+    return sequences
+
+
+_ConversionPlan = _collections.namedtuple('_ConversionPlan',
+                                          ['uid', 'dtype', 'shape',
+                                           'is_sparse', 'num_dynamic_axes'])
+
+_conversion_plans = _LRUCache(max_size=1024)
+
+
+def _conversion_plan(var):
+    # Returns the properties of var that the conversion of data needs. They
+    # are computed once per variable, unless its shape is not known yet, in
+    # which case the shape is not validated. The plans are cached by uid, so
+    # that the cache does not keep variables and their graphs alive.
+    plan = _conversion_plans.get(var.uid)
+    if plan is None:
+        shape = var.shape
+        known = all(dim >= 0 for dim in shape)
+        plan = _ConversionPlan(var.uid, var.dtype, shape if known else None,
+                               var.is_sparse, len(var.dynamic_axes))
+        if known:
+            _conversion_plans.put(var.uid, plan)
+    return plan
+
+
+_CONVERSION_WARNING_POLICIES = ('once', 'always', 'never')
+_conversion_warning_policy = 'once'
+_conversion_warnings_issued = set()
+_conversion_warnings_lock = _threading.Lock()
+
+
+def set_conversion_warning_policy(policy):
+    '''
+    Sets when a warning is issued if data has to be converted to the type of
+    the input variable it is passed to.
+
+    Args:
+        policy (str): 'once' to warn once per variable and type (the
+         default), 'always' to warn on every conversion, or 'never'
+
+    Returns:
+        str: the previous policy
+    '''
+    global _conversion_warning_policy
+    if policy not in _CONVERSION_WARNING_POLICIES:
+        raise ValueError('policy must be one of %s, but got "%s"'
+                         % (', '.join(_CONVERSION_WARNING_POLICIES), policy))
+    with _conversion_warnings_lock:
+        previous = _conversion_warning_policy
+        _conversion_warning_policy = policy
+        _conversion_warnings_issued.clear()
+    return previous
+
+
+def _warn_conversion(plan, dtype):
+    if _conversion_warning_policy == 'never':
+        return
+    if _conversion_warning_policy == 'once':
+        key = (plan.uid, np.dtype(dtype).str)
+        with _conversion_warnings_lock:
+            if key in _conversion_warnings_issued:
+                return
+            _conversion_warnings_issued.add(key)
+    warnings.warn('your data is of type "%s", but your input '
+                  'variable (uid "%s") expects "%s". Please convert '
+                  'your data beforehand to speed up training.' %
+                  (dtype, plan.uid, str(plan.dtype)))
+
+
 class NDArrayView(cntk_py.NDArrayView):
     '''
     Creates an empty dense internal data representation of a
@@ -270,6 +411,13 @@ class Value(cntk_py.Value):
         Convert a Value to a sequence of NumPy arrays that have their masked
         entries removed.
 
+        Sparse data is read directly from the sparse storage into one SciPy
+        CSR matrix per sequence, which has
+        ``sequence length * prod(variable.shape[:-1])`` rows.
+
+        For large batches, :meth:`as_padded` and :meth:`as_flat` return all
+        sequences in one array instead.
+
         Returns:
             If variable contains more dynamic axes than the batch axis, a list
             of NumPy arrays (if dense) or a SciPy CSR array (if sparse) will be
@@ -279,13 +427,7 @@ class Value(cntk_py.Value):
             if variable is None:
                 raise ValueError('cannot convert sparse value to sequences '
                                  'without the corresponding variable')
-            network = _sparse_to_dense_network_cache(variable.shape, True, self.device)
-
-            warnings.warn('converting Value object to CSR format might be slow')
-
-            # TODO: Add direct conversion, since creating an intermediate array might be slow
-            dense_data = network.eval(self, device=self.device)
-            return [sparse.csr_matrix(seq) for seq in dense_data]
+            return _sparse_value_to_csr_sequences(self, variable.shape)
 
         else:
             # Checking for mask without retrieving
@@ -308,13 +450,123 @@ class Value(cntk_py.Value):
                 else:
                     return list(arr)
 
+    def _valid_steps(self, variable):
+        # Returns a Boolean array of shape (batch size, maximum sequence
+        # length) that marks the valid steps, or None if all are valid.
+        if variable is not None and len(variable.dynamic_axes) < 2 or \
+                len(self.shape) < 2:
+            raise ValueError('value has no sequence axis')
+        if super(Value, self).mask() is None:
+            return None
+        return self.mask != cntk_py.MaskKind_Invalid
+
+    def as_padded(self, variable=None, pad_value=0):
+        '''
+        Converts a dense Value with a sequence axis into one NumPy array of
+        shape ``(batch size, maximum sequence length) + sample shape``, in
+        which the masked steps are set to ``pad_value``, and the lengths of
+        the sequences. It is the inverse of :meth:`from_padded` and does not
+        create objects per sequence like :meth:`as_sequences`.
+
+        Example:
+            >>> x = C.sequence.input_variable(2)
+            >>> data = np.arange(12, dtype=np.float32).reshape(2, 3, 2)
+            >>> value = C.Value.from_padded(x, data, lengths=[3, 1])
+            >>> padded, lengths = value.as_padded()
+            >>> lengths.tolist()
+            [3, 1]
+            >>> padded[1]
+            array([[ 6.,  7.],
+                   [ 0.,  0.],
+                   [ 0.,  0.]], dtype=float32)
+
+        Args:
+            variable (:class:`~cntk.variables.Variable`, optional): the
+             variable of the value. If given, it is checked to have a sequence
+             axis.
+            pad_value (scalar, default 0): value of the masked steps
+
+        Returns:
+            tuple of the padded NumPy array and a NumPy array of int with the
+            length of each sequence
+        '''
+        if self.is_sparse:
+            raise ValueError('sparse values cannot be converted to a padded '
+                             'array, use as_flat() instead')
+
+        valid = self._valid_steps(variable)
+        data = self.data.asarray()
+        if valid is None:
+            lengths = np.full(data.shape[0], data.shape[1], dtype=np.int64)
+        else:
+            lengths = valid.sum(axis=1)
+            data[~valid] = pad_value
+        return data, lengths
+
+    def as_flat(self, variable=None):
+        '''
+        Converts a Value with a sequence axis into the concatenated samples
+        of all sequences without the masked steps, and the offsets of the
+        sequences in them, like the ``indptr`` of a CSR matrix: sequence ``i``
+        is ``values[offsets[i]:offsets[i + 1]]``.
+
+        Dense values are returned as a NumPy array of shape
+        ``(number of samples,) + sample shape``. Sparse values are returned
+        as one SciPy CSR matrix with ``prod(sample shape[:-1])`` rows per
+        sample, and the offsets count rows.
+
+        Example:
+            >>> x = C.sequence.input_variable(2)
+            >>> data = np.arange(12, dtype=np.float32).reshape(2, 3, 2)
+            >>> value = C.Value.from_padded(x, data, lengths=[3, 1])
+            >>> values, offsets = value.as_flat()
+            >>> offsets.tolist()
+            [0, 3, 4]
+            >>> values[offsets[1]:offsets[2]]
+            array([[ 6.,  7.]], dtype=float32)
+
+        Args:
+            variable (:class:`~cntk.variables.Variable`, optional): the
+             variable of the value. If given, it is checked to have a sequence
+             axis.
+
+        Returns:
+            tuple of the values and a NumPy array of int with one offset more
+            than there are sequences
+        '''
+        valid = self._valid_steps(variable)
+        batch_size, max_length = self.shape[:2]
+        if valid is None:
+            lengths = np.full(batch_size, max_length, dtype=np.int64)
+        else:
+            lengths = valid.sum(axis=1)
+
+        if self.is_sparse:
+            values = _sparse_to_csr(self.data)
+            rows_per_sample = int(np.prod(self.shape[2:-1]))
+            if valid is not None:
+                rows = np.flatnonzero(valid)[:, np.newaxis] * rows_per_sample
+                values = values[(rows + np.arange(rows_per_sample)).ravel()]
+            lengths = lengths * rows_per_sample
+        else:
+            data = self.data.asarray()
+            if valid is None:
+                values = data.reshape((-1,) + data.shape[2:])
+            else:
+                values = data[valid]
+
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return values, offsets
+
     @staticmethod
     def _as_best_data_type(var, sample):
+        plan = _conversion_plan(var)
         convert_to_var_dtype = False
 
         if isinstance(sample, list):
             try:
-                sample = asarray(sample, dtype=var.dtype)
+                sample = asarray(sample, dtype=plan.dtype)
             except ValueError:
                 s = sample
                 while isinstance(s, list) and len(s) > 0:
@@ -327,12 +579,12 @@ class Value(cntk_py.Value):
                 else:
                     raise
 
-            if sample.dtype != var.dtype:
+            if sample.dtype != plan.dtype:
                 raise ValueError('could not convert sample data to '
                                     'NumPy array')
 
         elif sample.dtype in (np.float32, np.float64):
-            if sample.dtype != var.dtype:
+            if sample.dtype != plan.dtype:
                 convert_to_var_dtype = True
 
         elif np.issubdtype(sample.dtype, int):
@@ -343,14 +595,50 @@ class Value(cntk_py.Value):
                              'supported, you gave %s' % sample.dtype)
 
         if convert_to_var_dtype:
-            warnings.warn('your data is of type "%s", but your input '
-                          'variable (uid "%s") expects "%s". Please convert '
-                          'your data beforehand to speed up training.' %
-                          (sample.dtype, var.uid, str(var.dtype)))
-            sample = sample.astype(var.dtype)
+            _warn_conversion(plan, sample.dtype)
+            sample = sample.astype(plan.dtype)
 
         return sample
 
+    @staticmethod
+    def _as_best_data_type_batch(var, data):
+        # Validates and converts a list of sequences at once if they are all
+        # dense NumPy arrays of the same type, which is the common case.
+        # Otherwise, the sequences are converted one by one.
+        plan = _conversion_plan(var)
+        if not data or not all(type(s) is np.ndarray for s in data):
+            return [Value._as_best_data_type(var, s) for s in data]
+
+        dtypes = set(s.dtype for s in data)
+        if len(dtypes) != 1:
+            return [Value._as_best_data_type(var, s) for s in data]
+        dtype = dtypes.pop()
+
+        if plan.shape is not None:
+            rank = len(plan.shape) + 1
+            for s in data:
+                if s.ndim == rank and s.shape[1:] != plan.shape:
+                    raise ValueError('sequence of shape %s does not match '
+                                     'the shape %s of the variable (uid "%s") '
+                                     'plus sequence axis'
+                                     % (s.shape, plan.shape, plan.uid))
+
+        if dtype == plan.dtype:
+            return data
+        if dtype not in (np.float32, np.float64) and \
+                not np.issubdtype(dtype, int):
+            raise ValueError('only integer, float32 and float64 are '
+                             'supported, you gave %s' % dtype)
+
+        _warn_conversion(plan, dtype)
+        if len(set(s.shape[1:] for s in data)) != 1 or data[0].ndim == 0:
+            return [s.astype(plan.dtype) for s in data]
+
+        # one conversion for the whole batch; the sequences are views of it
+        lengths = [len(s) for s in data]
+        converted = np.concatenate(data).astype(plan.dtype)
+        return np.split(converted, np.cumsum(lengths[:-1]))
+
     @staticmethod
     @typemap
     def create(var, data, seq_starts=None, device=None, read_only=False):
@@ -381,7 +669,8 @@ class Value(cntk_py.Value):
         if not isinstance(var, cntk_py.Variable):
             raise TypeError('Variable expected, but got "%s"' % type(var))
 
-        if not var.dynamic_axes:
+        plan = _conversion_plan(var)
+        if not plan.num_dynamic_axes:
             # No dynamic axes -> we can pass everything in one go
             data = Value._as_best_data_type(var, data)
             # Since the core API's Value does not copy single NDArrayViews,
@@ -390,7 +679,7 @@ class Value(cntk_py.Value):
 
             return cntk_py.Value(ndav)
 
-        elif len(var.dynamic_axes) <= 1 and isinstance(data, list) and len(data) > 1:
+        elif plan.num_dynamic_axes <= 1 and isinstance(data, list) and len(data) > 1:
             warnings.warn('you provided the minibatch data as a list, but '
                           'your corresponding input variable (uid "%s") has '
                           'only one dynamic axis (batch axis). To speed up '
@@ -437,7 +726,7 @@ class Value(cntk_py.Value):
         # NDArrayView itself. Because of that, we need to keep around the
         # instances _as_best_data_type() until we have passed them to
         # Value_create() where it will be copied further.
-        data = [Value._as_best_data_type(var, sample) for sample in data]
+        data = Value._as_best_data_type_batch(var, data)
         borrow = device.type() == DeviceKind.CPU
         list_of_ndavs = [NDArrayView.from_data(sample, device=cpu(),
                                                borrow=borrow)
@@ -454,6 +743,85 @@ class Value(cntk_py.Value):
 
         return value
 
+    @staticmethod
+    @typemap
+    def from_padded(var, data, lengths=None, seq_starts=None, device=None,
+                    read_only=False):
+        '''
+        Creates a :class:`~cntk.core.Value` object from a batch of sequences
+        that is given as one NumPy array, padded to the length of the longest
+        sequence. In contrast to :meth:`create`, the sequences are not
+        converted one by one: the data is passed to the Value in one piece,
+        and only sequences shorter than the padded length are masked.
+
+        On the CPU, the Value borrows the memory of ``data`` (which it keeps
+        alive), so ``data`` must not be modified while the Value is in use.
+
+        Example:
+            >>> x = C.sequence.input_variable(2)
+            >>> data = np.arange(12, dtype=np.float32).reshape(2, 3, 2)
+            >>> value = C.Value.from_padded(x, data, lengths=[3, 1])
+            >>> value.mask.tolist()
+            [[2, 1, 1], [2, 0, 0]]
+
+        Args:
+            var (:class:`~cntk.variables.Variable`): variable with a sequence
+             axis into which ``data`` is passed
+            data (numpy.ndarray): array of shape ``(batch size, padded
+             length) + var.shape``
+            lengths (list or NumPy array of int, default None): length of each
+             sequence. If None, all sequences have the padded length.
+            seq_starts (list of `bool`\ s or None): if None, every sequence is
+             treated as a new sequence. Otherwise, it is interpreted as a list of
+             Booleans that tell whether a sequence is a new sequence (`True`) or a
+             continuation of the sequence in the same slot of the previous
+             minibatch (`False`)
+            device (:class:`~cntk.device.DeviceDescriptor`, default None): device
+             this value should be put on
+            read_only (bool, default False): whether the data is read only
+
+        Returns:
+            :class:`~cntk.core.Value` object.
+        '''
+        if not isinstance(var, cntk_py.Variable):
+            raise TypeError('Variable expected, but got "%s"' % type(var))
+
+        if len(var.dynamic_axes) != 2:
+            raise ValueError('from_padded() requires a variable with a '
+                             'sequence axis, but variable (uid "%s") has %i '
+                             'dynamic axes' % (var.uid, len(var.dynamic_axes)))
+
+        if not isinstance(data, np.ndarray):
+            raise TypeError('data must be of type numpy.ndarray and not %s'
+                            % type(data))
+
+        if data.shape[2:] != var.shape:
+            raise ValueError('data of shape %s does not match the shape %s '
+                             'of the variable (uid "%s") plus batch and '
+                             'sequence axis' % (data.shape, var.shape, var.uid))
+
+        data = np.ascontiguousarray(Value._as_best_data_type(var, data))
+        batch_size, max_length = data.shape[:2]
+
+        if device is None:
+            device = use_default_device()
+
+        mask = _sequence_mask(batch_size, max_length, lengths, seq_starts,
+                              device)
+
+        borrow = device.type() == DeviceKind.CPU
+        ndav = NDArrayView.from_dense(data, device=device,
+                                      read_only=read_only, borrow=borrow)
+        if mask is None:
+            value = cntk_py.Value(ndav)
+        else:
+            value = cntk_py.Value(ndav, mask)
+
+        if borrow:
+            value._borrowed_data = data
+
+        return value
+
     ONE_HOT_SKIP = cntk_py.Value.one_hot_skip
 
     @staticmethod
@@ -533,6 +901,123 @@ class Value(cntk_py.Value):
                 sample_shape, batch, device, False)
         return value
 
+    @staticmethod
+    @typemap
+    def one_hot_from_offsets(ids, offsets, num_classes, seq_starts=None,
+                             dtype=None, device=None, read_only=False):
+        '''
+        Like :meth:`one_hot`, but takes the indices of all sequences as one
+        flat integer array, together with the offsets at which the sequences
+        start in it (like the ``indptr`` of a CSR matrix). The sparse data is
+        built with NumPy operations on whole arrays and passed to the Value in
+        one piece, so no Python lists are created per sequence or per index.
+
+        On the CPU, the Value borrows the memory of the arrays it creates.
+
+        Example:
+            >>> num_classes = 6
+            >>> ids = np.asarray([1, -1, 5, 4], dtype=np.int32)
+            >>> i0 = C.sequence.input_variable(shape=num_classes, is_sparse=True)
+            >>> z = C.times(i0, np.eye(num_classes))
+            >>> value = C.Value.one_hot_from_offsets(ids, [0, 3, 4], num_classes)
+            >>> z.eval({i0: value})
+            [array([[ 0.,  1.,  0.,  0.,  0.,  0.],
+                    [ 0.,  0.,  0.,  0.,  0.,  0.],
+                    [ 0.,  0.,  0.,  0.,  0.,  1.]], dtype=float32),
+             array([[ 0.,  0.,  0.,  0.,  1.,  0.]], dtype=float32)]
+
+        Args:
+            ids (NumPy array of int): indices of the sequences, one after the
+             other. Use -1 for a zero vector, or Value.ONE_HOT_SKIP in
+             arrays of type ``np.uint64``.
+            offsets (list or NumPy array of int): ``offsets[i]`` is the
+             position of the first index of sequence ``i`` in ``ids``, and the
+             last entry is the end of the last sequence
+            num_classes (int or tuple): number of classes or shape of each
+             sample whose trailing axis is one_hot. For a shape, every sample
+             takes ``prod(shape[:-1])`` consecutive indices.
+            seq_starts (list of `bool`\ s or None): if None, every sequence is
+             treated as a new sequence. Otherwise, it is interpreted as a list of
+             Booleans that tell whether a sequence is a new sequence (`True`) or a
+             continuation of the sequence in the same slot of the previous
+             minibatch (`False`)
+            dtype (`np.float32`, `np.float64`, default None): data type
+            device (:class:`~cntk.device.DeviceDescriptor`, default None): device
+             this value should be put on
+            read_only (bool, default False): whether the data is read only
+
+        Returns:
+            :class:`~cntk.core.Value` object
+        '''
+        if device is None:
+            device = use_default_device()
+
+        if isinstance(num_classes, numbers.Integral):
+            sample_shape = (num_classes,)
+        else:
+            sample_shape = tuple(num_classes)
+        indices_per_sample = int(np.prod(sample_shape[:-1]))
+
+        ids = np.asarray(ids)
+        if not np.issubdtype(ids.dtype, np.integer):
+            raise ValueError('supplied data to one_hot_from_offsets() must be '
+                             'of type integer and not "%s" since it is index '
+                             'data.' % ids.dtype)
+
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if offsets.ndim != 1 or len(offsets) < 2 or \
+                (np.diff(offsets) <= 0).any() or offsets[0] < 0 or \
+                offsets[-1] > len(ids):
+            raise ValueError('offsets must be increasing positions in ids '
+                             'with one entry more than there are sequences')
+        ids = ids[offsets[0]:offsets[-1]]
+        counts = np.diff(offsets)
+        if (counts % indices_per_sample).any():
+            raise ValueError('every sequence needs a multiple of %i indices '
+                             'for samples of shape %s'
+                             % (indices_per_sample, sample_shape))
+
+        batch_size = len(counts)
+        lengths = counts // indices_per_sample
+        max_length = int(lengths.max())
+        mask = _sequence_mask(batch_size, max_length, lengths, seq_starts,
+                              device)
+
+        # One CSR row per index of the batch padded to max_length; padding
+        # and skipped indices are empty rows.
+        rows_per_sequence = max_length * indices_per_sample
+        rows = np.arange(len(ids), dtype=np.int64)
+        if mask is not None:
+            rows += np.repeat(np.arange(batch_size) * rows_per_sequence -
+                              (offsets[:-1] - offsets[0]), counts)
+        # -1 in a signed array is ONE_HOT_SKIP as an unsigned 64 bit integer
+        valid = ids.astype(np.uint64, copy=False) != Value.ONE_HOT_SKIP
+        row_nnz = np.zeros(batch_size * rows_per_sequence, dtype=np.int32)
+        row_nnz[rows[valid]] = 1
+        indptr = np.zeros(len(row_nnz) + 1, dtype=np.int32)
+        np.cumsum(row_nnz, out=indptr[1:])
+        # checked before the cast to int32, which would wrap large indices
+        indices = ids[valid]
+        if ((indices < 0) | (indices >= sample_shape[-1])).any():
+            raise ValueError('indices must be between 0 and %i'
+                             % (sample_shape[-1] - 1))
+        indices = np.ascontiguousarray(indices, dtype=np.int32)
+        data = np.ones(len(indices), dtype=dtype or np.float32)
+
+        borrow = device.type() == DeviceKind.CPU
+        ndav = cntk_py.NDArrayView((batch_size, max_length) + sample_shape,
+                                   data, indptr, indices, device, read_only,
+                                   borrow)
+        if mask is None:
+            value = cntk_py.Value(ndav)
+        else:
+            value = cntk_py.Value(ndav, mask)
+
+        if borrow:
+            value._borrowed_data = (data, indptr, indices)
+
+        return value
+
     @property
     def shape(self):
         '''
@@ -1,11 +1,13 @@
 from __future__ import print_function
 
 import numpy as np
+import pytest
 
 import cntk as C
 from cntk import Axis, NDArrayView
 from cntk.logging import ProgressPrinter
-from cntk.learners import UserLearner, sgd, learning_rate_schedule, UnitType
+from cntk.learners import UserLearner, FlatUserLearner, sgd, \
+    learning_rate_schedule, UnitType
 from cntk.layers import Dense, Sequential
 
 
@@ -77,6 +79,59 @@ class MySgdFast(UserLearner):
         return True
 
 
+class MySgdFlat(FlatUserLearner):
+
+    def update_flat(self, parameters, gradients, training_sample_count,
+                    sweep_end):
+        parameters -= self.learning_rate() / training_sample_count * gradients
+        return True
+
+
+class MyAdamNaive(UserLearner):
+
+    def __init__(self, parameters, lr_schedule, beta1=0.9, beta2=0.999,
+                 epsilon=1e-8):
+        super(MyAdamNaive, self).__init__(parameters, lr_schedule)
+        self.beta1, self.beta2, self.epsilon = beta1, beta2, epsilon
+        self.m = {p.uid: np.zeros(p.shape, dtype=p.dtype) for p in parameters}
+        self.v = {p.uid: np.zeros(p.shape, dtype=p.dtype) for p in parameters}
+        self.t = 0
+
+    def update(self, gradient_values, training_sample_count, sweep_end):
+        self.t += 1
+        lr = self.learning_rate() * np.sqrt(1 - self.beta2 ** self.t) / \
+            (1 - self.beta1 ** self.t)
+        for p, g in gradient_values.items():
+            m, v = self.m[p.uid], self.v[p.uid]
+            m[...] = self.beta1 * m + (1 - self.beta1) * g
+            v[...] = self.beta2 * v + (1 - self.beta2) * g * g
+            p.value = p.value - lr * m / (np.sqrt(v) + self.epsilon)
+        return True
+
+
+class MyAdamFlat(FlatUserLearner):
+
+    def __init__(self, parameters, lr_schedule, beta1=0.9, beta2=0.999,
+                 epsilon=1e-8):
+        super(MyAdamFlat, self).__init__(parameters, lr_schedule)
+        self.beta1, self.beta2, self.epsilon = beta1, beta2, epsilon
+        self.m = self.allocate_state()
+        self.v = self.allocate_state()
+        self.t = 0
+
+    def update_flat(self, parameters, gradients, training_sample_count,
+                    sweep_end):
+        self.t += 1
+        lr = self.learning_rate() * np.sqrt(1 - self.beta2 ** self.t) / \
+            (1 - self.beta1 ** self.t)
+        self.m *= self.beta1
+        self.m += (1 - self.beta1) * gradients
+        self.v *= self.beta2
+        self.v += (1 - self.beta2) * gradients * gradients
+        parameters -= lr * self.m / (np.sqrt(self.v) + self.epsilon)
+        return True
+
+
 def ffnet(optimizer, num_minibatches_to_train):
     inputs = 2
     outputs = 2
@@ -139,8 +194,97 @@ def test_user_learner():
         assert np.allclose(a, c)
 
 
+def test_flat_user_learner():
+    num_minibatches_to_train = 10
+
+    np.random.seed(SEED)
+    p1 = sorted([p.value for p in ffnet(sgd, num_minibatches_to_train)], key=lambda x: x.shape)
+
+    np.random.seed(SEED)
+    p2 = sorted([p.value for p in ffnet(MySgdFlat, num_minibatches_to_train)], key=lambda x: x.shape)
+
+    np.random.seed(SEED)
+    p3 = sorted([p.value for p in ffnet(MyAdamNaive, num_minibatches_to_train)], key=lambda x: x.shape)
+
+    np.random.seed(SEED)
+    p4 = sorted([p.value for p in ffnet(MyAdamFlat, num_minibatches_to_train)], key=lambda x: x.shape)
+
+    for a, b, c, d in zip(p1, p2, p3, p4):
+        assert np.allclose(a, b)
+        assert np.allclose(c, d, atol=1e-5)
+
+
+def test_flat_user_learner_buffers():
+    w = C.parameter((2, 3), init=np.arange(6, dtype=np.float32).reshape(2, 3))
+    b = C.parameter((3,), init=7)
+    learner = MySgdFlat([w, b], learning_rate_schedule(0.1, UnitType.sample))
+
+    assert learner.parameter_buffer.shape == (9,)
+    assert learner.gradient_buffer.dtype == np.float32
+    assert np.array_equal(learner.parameter_buffer, [0, 1, 2, 3, 4, 5, 7, 7, 7])
+
+    state = learner.allocate_state(1)
+    w_state, b_state = learner.views(state)
+    assert w_state.shape == (2, 3) and b_state.shape == (3,)
+    b_state[...] = 2
+    assert np.array_equal(state, [1] * 6 + [2] * 3)
+
+    with pytest.raises(ValueError):
+        learner.views(np.zeros(8, dtype=np.float32))
+
+    w64 = C.parameter((2,), dtype=np.float64)
+    with pytest.raises(ValueError):
+        MySgdFlat([w, w64], learning_rate_schedule(0.1, UnitType.sample))
+
+
+def sparse_embedding(optimizer, num_minibatches_to_train, vocab=10, dim=3):
+    # The gradient of an embedding of sparse input is sparse as well.
+    x = C.input_variable(vocab, is_sparse=True)
+    e = C.parameter((vocab, dim), init=C.glorot_uniform(seed=SEED))
+    z = C.reduce_sum(C.times(x, e))
+    lr = learning_rate_schedule(0.1, UnitType.sample)
+    trainer = C.Trainer(z, (z, None), [optimizer([e], lr)])
+    data = C.Value.one_hot([[1], [4], [4], [7]], vocab)
+    for i in range(num_minibatches_to_train):
+        trainer.train_minibatch({x: data})
+    return e.value
+
+
+def test_user_learner_sparse_gradient():
+    expected = sparse_embedding(sgd, 3)
+    assert np.allclose(expected, sparse_embedding(MySgdNaive, 3))
+    assert np.allclose(expected, sparse_embedding(MySgdFlat, 3))
+
+
+def many_parameters_model(num_parameters=500, dim=16):
+    x = C.input_variable(dim)
+    params = [C.parameter((dim,), init=C.glorot_uniform(seed=i))
+              for i in range(num_parameters)]
+    z = C.reduce_sum(C.splice(*[C.reduce_sum(x * p) for p in params]))
+    return x, z
+
+
+def train_many_parameters(optimizer, num_minibatches_to_train):
+    x, z = many_parameters_model()
+    lr = learning_rate_schedule(0.001, UnitType.minibatch)
+    trainer = C.Trainer(z, (z, None), [optimizer(z.parameters, lr)])
+    data = np.random.randn(25, 16).astype(np.float32)
+    for i in range(num_minibatches_to_train):
+        trainer.train_minibatch({x: data})
+
+
 if __name__ == '__main__':
     import timeit
+
+    # Adam in NumPy on a model with 500 parameters, updated parameter by
+    # parameter and at once.
+    t_naive = timeit.timeit(
+        lambda: train_many_parameters(MyAdamNaive, 100), number=3)
+    print('per-parameter Adam: %.3fs' % t_naive)
+    t_flat = timeit.timeit(
+        lambda: train_many_parameters(MyAdamFlat, 100), number=3)
+    print('flat Adam: %.3fs' % t_flat)
+
     t1 = timeit.timeit("userlearner_test.ffnet(sgd, 1000)",
                        setup="from cntk.debugging.tests import userlearner_test; from cntk.learner import sgd",
                        number=10)
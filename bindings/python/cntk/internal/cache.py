@@ -0,0 +1,176 @@
+# Copyright (c) Microsoft. All rights reserved.
+
+# Licensed under the MIT license. See LICENSE.md file in the project root
+# for full license information.
+# ==============================================================================
+
+'''
+Bounded caches for objects that are expensive to create, like helper networks.
+'''
+
+import collections
+import functools
+import threading
+
+CacheInfo = collections.namedtuple('CacheInfo',
+                                   ['hits', 'misses', 'evictions', 'size',
+                                    'bytes'])
+
+
+class LRUCache(object):
+    '''
+    Thread-safe mapping that evicts the least recently used entries once it
+    holds more than ``max_size`` entries or more than ``max_bytes`` bytes.
+
+    Example:
+        >>> cache = LRUCache(max_size=2)
+        >>> cache.put('a', 1)
+        >>> cache.put('b', 2)
+        >>> cache.get('a')
+        1
+        >>> cache.put('c', 3)
+        >>> 'b' in cache
+        False
+        >>> cache.info()
+        CacheInfo(hits=1, misses=0, evictions=1, size=2, bytes=2)
+
+    Args:
+        max_size (int or None, default 128): maximum number of entries. If
+         None, the number of entries is not limited.
+        max_bytes (int or None, default None): maximum total size of the
+         entries as computed by ``sizeof``. If None, the size is not limited.
+        sizeof (callable, default None): returns the size of a value in bytes.
+         If None, every entry has a size of 1.
+    '''
+
+    def __init__(self, max_size=128, max_bytes=None, sizeof=None):
+        if max_size is not None and max_size < 0:
+            raise ValueError('max_size must not be negative')
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError('max_bytes must not be negative')
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 1)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self._hits = self._misses = self._evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        '''
+        Returns the value of ``key`` and marks it as recently used, or
+        ``default`` if the key is not cached. Hits and misses are counted.
+        '''
+        with self._lock:
+            if key not in self._entries:
+                self._misses += 1
+                return default
+            self._hits += 1
+            return self._touch(key)[0]
+
+    def put(self, key, value):
+        '''
+        Adds or replaces the value of ``key`` and evicts the least recently
+        used entries that exceed the limits. A value that exceeds
+        ``max_bytes`` on its own is not cached.
+        '''
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self._evict()
+
+    def get_or_create(self, key, factory):
+        '''
+        Returns the value of ``key``, creating and caching it with
+        ``factory()`` on a miss. The factory is called without holding the
+        lock, so two threads missing the same key may both call it; the first
+        value stored is kept.
+        '''
+        with self._lock:
+            if key in self._entries:
+                self._hits += 1
+                return self._touch(key)[0]
+            self._misses += 1
+
+        value = factory()
+        with self._lock:
+            if key in self._entries:
+                return self._touch(key)[0]
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        '''
+        Removes all entries and resets the counters.
+        '''
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._hits = self._misses = self._evictions = 0
+
+    def info(self):
+        '''
+        Returns the counters of the cache for monitoring.
+
+        Returns:
+            :class:`CacheInfo` with the number of hits, misses and evictions,
+            and the current number of entries and bytes
+        '''
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions,
+                             len(self._entries), self._bytes)
+
+    def _touch(self, key):
+        # OrderedDict.move_to_end() does not exist on Python 2.7
+        entry = self._entries.pop(key)
+        self._entries[key] = entry
+        return entry
+
+    def _evict(self):
+        while self._entries and (
+                (self.max_size is not None and
+                 len(self._entries) > self.max_size) or
+                (self.max_bytes is not None and self._bytes > self.max_bytes)):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._evictions += 1
+
+
+def lru_cache(max_size=128, max_bytes=None, sizeof=None):
+    '''
+    Decorator that caches the results of a function of hashable positional
+    arguments in an :class:`LRUCache`, similar to ``functools.lru_cache``,
+    which does not exist on Python 2.7 and has no byte limit.
+
+    The decorated function has the attributes ``cache``, ``cache_info()``
+    and ``cache_clear()``.
+
+    Args:
+        max_size (int or None, default 128): maximum number of cached results
+        max_bytes (int or None, default None): maximum total size of the
+         cached results as computed by ``sizeof``
+        sizeof (callable, default None): returns the size of a result in bytes
+    '''
+    def decorator(func):
+        cache = LRUCache(max_size, max_bytes, sizeof)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            return cache.get_or_create(args, lambda: func(*args))
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache.info
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
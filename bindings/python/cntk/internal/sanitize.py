@@ -11,6 +11,7 @@ import cntk as C
 from .. import cntk_py
 from ..axis import Axis
 from cntk.internal import typemap
+from cntk.internal.cache import lru_cache
 
 
 def is_string(s):
@@ -553,19 +554,22 @@ def sanitize_permutation(perm):
         raise ValueError('duplicate item in permutation')
     return [n-i-1 for i in reversed(positive_perm)]
 
-# Workaround for Python 2.7 not having functools.lru_cache
 def memoize(func):
-    class memodict(dict):
-        def __init__(self, f):
-            self.f = f
-        def __call__(self, *args):
-            return self[args]
-        def __missing__(self, key):
-            self[key] = ret = func(*key)
-            return ret
-    return memodict(func)
-
-@memoize
+    '''
+    Caches all results of ``func``. Kept for compatibility; use
+    :func:`~cntk.internal.cache.lru_cache` to bound the cache.
+    '''
+    return lru_cache(max_size=None)(func)
+
+# The networks hold a dense identity matrix of the input dimension.
+_SPARSE_TO_DENSE_NETWORK_CACHE_BYTES = 256 * 1024 * 1024
+
+def _network_constants_bytes(network):
+    return sum(int(np.prod(c.shape)) * np.dtype(c.dtype).itemsize
+               for c in network.constants)
+
+@lru_cache(max_size=32, max_bytes=_SPARSE_TO_DENSE_NETWORK_CACHE_BYTES,
+           sizeof=_network_constants_bytes)
 def _sparse_to_dense_network_cache(input_shape, is_sequence, device):
     if is_sequence:
         temp_input = C.sequence.input_variable(input_shape, is_sparse=True)
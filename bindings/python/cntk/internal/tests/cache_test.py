@@ -0,0 +1,92 @@
+# Copyright (c) Microsoft. All rights reserved.
+
+# Licensed under the MIT license. See LICENSE.md file in the project root
+# for full license information.
+# ==============================================================================
+
+import threading
+import pytest
+
+from cntk.internal.cache import LRUCache, CacheInfo, lru_cache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert 'b' not in cache
+    assert cache.get('b', 'missing') == 'missing'
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.info() == CacheInfo(hits=3, misses=1, evictions=1, size=2,
+                                     bytes=2)
+
+
+def test_lru_cache_byte_limit():
+    cache = LRUCache(max_size=None, max_bytes=10, sizeof=len)
+    cache.put('a', 'x' * 4)
+    cache.put('b', 'x' * 4)
+    cache.put('c', 'x' * 4)
+    assert list(cache._entries) == ['b', 'c']
+    assert cache.info().bytes == 8
+
+    # values larger than the limit are not cached
+    cache.put('d', 'x' * 11)
+    assert 'd' not in cache and len(cache) == 2
+
+    # replacing a value updates the size
+    cache.put('c', 'x')
+    assert cache.info().bytes == 5
+
+    with pytest.raises(ValueError):
+        LRUCache(max_bytes=-1)
+
+
+def test_lru_cache_get_put_counters():
+    # callers that use get() and put() instead of get_or_create()
+    cache = LRUCache(max_size=4)
+    for key in ['a', 'b', 'a', 'a', 'b', 'c']:
+        if cache.get(key) is None:
+            cache.put(key, key.upper())
+    assert cache.info() == CacheInfo(hits=3, misses=3, evictions=0, size=3,
+                                     bytes=3)
+
+
+def test_lru_cache_decorator():
+    calls = []
+
+    @lru_cache(max_size=2)
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert [square(i) for i in [1, 2, 1, 3, 1, 2]] == [1, 4, 1, 9, 1, 4]
+    assert calls == [1, 2, 3, 2]
+    assert square.cache_info() == CacheInfo(hits=2, misses=4, evictions=2,
+                                            size=2, bytes=2)
+    assert square.__name__ == 'square'
+
+    square.cache_clear()
+    assert square.cache_info() == CacheInfo(0, 0, 0, 0, 0)
+
+
+def test_lru_cache_threads():
+    cache = LRUCache(max_size=8)
+
+    def work(offset):
+        for i in range(1000):
+            key = (offset + i) % 16
+            assert cache.get_or_create(key, lambda: key * 2) == key * 2
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    info = cache.info()
+    assert info.size == 8
+    assert info.hits + info.misses == 4000
+    assert info.evictions <= info.misses
@@ -807,3 +807,9 @@ def sequence_to_cntk_text_format(seq_idx, alias_tensor_map):
         lines.append('%i\t|' % seq_idx + ' |'.join(line))
 
     return '\n'.join(lines)
+
+
+from .cbf import CBFMinibatchSource
+from .ctf import CTFWriter, write_ctf_shards
+from .prefetch import PrefetchingMinibatchSource
+from .staging import StagingQueue, StagingStats
@@ -0,0 +1,386 @@
+# Copyright (c) Microsoft. All rights reserved.
+
+# Licensed under the MIT license. See LICENSE.md file in the project root
+# for full license information.
+# ==============================================================================
+
+'''
+Pure Python reader for the CNTK binary format (CBF), as written by
+``Scripts/ctf2bin.py``.
+'''
+
+import mmap
+import struct
+import numpy as np
+from scipy import sparse
+
+from cntk import cntk_py
+from cntk.core import NDArrayView
+from cntk.device import use_default_device, cpu
+from cntk.internal import sanitize_shape
+from . import UserMinibatchSource, StreamInformation, MinibatchData, \
+    INFINITELY_REPEAT
+
+_MAGIC_NUMBER = 0x636e746b5f62696e
+_CBF_VERSION = 1
+
+_DENSE = 0
+_SPARSE_CSC = 1
+
+_CHUNK_TABLE_TYPE = np.dtype([('offset', '<i8'), ('sequences', '<u4'),
+                              ('samples', '<u4')])
+
+
+class CBFMinibatchSource(UserMinibatchSource):
+    '''
+    Minibatch source that reads a file in the CNTK binary format, as written
+    by ``Scripts/ctf2bin.py``.
+
+    The file is memory-mapped, and chunks are located through the chunk table
+    without reading the data of other chunks. The data of every sequence is
+    passed to the :class:`~cntk.core.Value` of the minibatch as a NumPy view
+    (or a SciPy CSR matrix over such views) into the mapping, so the memory
+    used by the reader does not grow with the size of the file.
+
+    Randomization is done on chunk level: every sweep the chunks are shuffled
+    and then grouped into windows of ``randomization_window_in_chunks``
+    chunks, within which the sequences are shuffled.
+
+    In distributed training the chunks are distributed among the workers, so
+    the file must have at least as many chunks as there are workers.
+
+    The mapping is released by :meth:`close`, or at the end of a ``with``
+    block.
+
+    Example:
+        >>> with CBFMinibatchSource('train.bin') as mbs: # doctest: +SKIP
+        ...     mb = mbs.next_minibatch(64)
+
+    Args:
+        filename (str): path of the binary file
+        randomize (bool, defaults to True): whether to randomize the order of
+         the chunks and of the sequences within a randomization window
+        randomization_window_in_chunks (int, defaults to 4): number of chunks
+         whose sequences are shuffled together
+        randomization_seed (int, defaults to 0): seed of the randomization
+        max_sweeps (int, defaults to :const:`cntk.io.INFINITELY_REPEAT`):
+         number of sweeps after which empty minibatches are returned
+    '''
+
+    def __init__(self, filename, randomize=True,
+                 randomization_window_in_chunks=4, randomization_seed=0,
+                 max_sweeps=INFINITELY_REPEAT):
+        if randomization_window_in_chunks < 1:
+            raise ValueError('randomization_window_in_chunks must be positive')
+
+        self._filename = filename
+        self._randomize = randomize
+        self._window_size = randomization_window_in_chunks
+        self._seed = randomization_seed
+        self._max_sweeps = max_sweeps
+
+        with open(filename, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._read_header()
+
+        # current position: sweep, window within the sweep and sequence
+        # within the window
+        self._sweep = 0
+        self._window = 0
+        self._position = 0
+
+        # sequences of the current window as (chunk id, index in chunk)
+        self._window_key = None
+        self._window_sequences = None
+        self._parsed_chunks = {}
+
+        super(CBFMinibatchSource, self).__init__()
+
+    def _read_header(self):
+        data = self._data
+        if len(data) < 20 or \
+                struct.unpack_from('<QI', data, 0) != (_MAGIC_NUMBER, _CBF_VERSION):
+            raise ValueError('"%s" is not a CNTK binary format file of '
+                             'version %i' % (self._filename, _CBF_VERSION))
+
+        header_offset, = struct.unpack_from('<q', data, len(data) - 8)
+        magic, num_chunks, num_streams = struct.unpack_from('<QII', data,
+                                                            header_offset)
+        if magic != _MAGIC_NUMBER:
+            raise ValueError('"%s" has a corrupted header' % self._filename)
+
+        position = header_offset + 16
+        self._streams = []
+        self._infos = []
+        for stream_id in range(num_streams):
+            matrix_type, name_length = struct.unpack_from('<BI', data, position)
+            position += 5
+            name = data[position:position + name_length].decode('ascii')
+            position += name_length
+            element_type, sample_dim = struct.unpack_from('<BI', data, position)
+            position += 5
+
+            if matrix_type not in (_DENSE, _SPARSE_CSC):
+                raise ValueError('stream "%s" has an unknown matrix type %i'
+                                 % (name, matrix_type))
+            dtype = np.float32 if element_type == 0 else np.float64
+            self._streams.append((matrix_type == _SPARSE_CSC, dtype,
+                                  sample_dim))
+            self._infos.append(StreamInformation(
+                name, stream_id,
+                'sparse' if matrix_type == _SPARSE_CSC else 'dense',
+                dtype, (sample_dim,)))
+
+        self._chunks = np.frombuffer(self._data, dtype=_CHUNK_TABLE_TYPE,
+                                     count=num_chunks, offset=position)
+
+    def stream_infos(self):
+        '''
+        Returns the stream descriptions read from the file header.
+        '''
+        return self._infos
+
+    @property
+    def num_chunks(self):
+        '''
+        The number of chunks in the file.
+        '''
+        return len(self._chunks)
+
+    def _parse_chunk(self, chunk_id):
+        # Returns the number of samples of each sequence and, for every
+        # stream, a list of per sequence views into the mapping.
+        data = self._data
+        offset = int(self._chunks['offset'][chunk_id])
+        num_sequences = int(self._chunks['sequences'][chunk_id])
+        lengths = np.frombuffer(data, dtype=np.uint32, count=num_sequences,
+                                offset=offset)
+        position = offset + 4 * num_sequences
+
+        streams = []
+        for is_sparse, dtype, sample_dim in self._streams:
+            itemsize = np.dtype(dtype).itemsize
+            sequences = []
+            for _ in range(num_sequences):
+                num_samples, = struct.unpack_from('<I', data, position)
+                position += 4
+                if not is_sparse:
+                    values = np.frombuffer(data, dtype=dtype,
+                                           count=num_samples * sample_dim,
+                                           offset=position)
+                    sequences.append(values.reshape(num_samples, sample_dim))
+                    position += values.nbytes
+                else:
+                    nnz, = struct.unpack_from('<i', data, position)
+                    position += 4
+                    values = np.frombuffer(data, dtype=dtype, count=nnz,
+                                           offset=position)
+                    position += nnz * itemsize
+                    indices = np.frombuffer(data, dtype=np.int32, count=nnz,
+                                            offset=position)
+                    position += nnz * 4
+                    sizes = np.frombuffer(data, dtype=np.int32,
+                                          count=num_samples, offset=position)
+                    position += num_samples * 4
+                    sequences.append((values, indices, sizes))
+            streams.append(sequences)
+
+        return lengths, streams
+
+    def close(self):
+        '''
+        Releases the memory mapping of the file. The source cannot be read
+        afterwards.
+        '''
+        if self._data is None:
+            return
+        # the views into the mapping must be gone before it can be closed
+        self._chunks = self._chunks[:0].copy()
+        self._parsed_chunks = {}
+        self._window_key = None
+        self._window_sequences = None
+        self._data.close()
+        self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        if getattr(self, '_data', None) is not None:
+            try:
+                self.close()
+            except BufferError:
+                # views returned to the caller still use the mapping; it is
+                # closed when the last of them is gone
+                pass
+
+    def _sweep_chunks(self, sweep, number_of_workers, worker_rank):
+        # The chunks of a sweep, in reading order, that belong to a worker.
+        if self._randomize:
+            rng = np.random.RandomState((self._seed + sweep) % 2**32)
+            order = rng.permutation(self.num_chunks)
+        else:
+            order = np.arange(self.num_chunks)
+        return order[worker_rank::number_of_workers]
+
+    def _load_window(self, number_of_workers, worker_rank):
+        key = (self._sweep, self._window, number_of_workers, worker_rank)
+        if self._window_key == key:
+            return
+
+        chunks = self._sweep_chunks(self._sweep, number_of_workers,
+                                    worker_rank)
+        window_chunks = chunks[self._window * self._window_size:
+                               (self._window + 1) * self._window_size]
+
+        # only the chunks of the current window are kept parsed
+        self._parsed_chunks = dict(
+            (c, self._parsed_chunks.get(c) or self._parse_chunk(c))
+            for c in window_chunks)
+
+        sequences = [(c, i) for c in window_chunks
+                     for i in range(int(self._chunks['sequences'][c]))]
+        if self._randomize:
+            rng = np.random.RandomState(
+                (self._seed + 7919 * self._sweep + self._window) % 2**32)
+            sequences = [sequences[i] for i in rng.permutation(len(sequences))]
+
+        self._window_key = key
+        self._window_sequences = sequences
+
+    def _num_windows(self, number_of_workers, worker_rank):
+        num_chunks = len(range(worker_rank, self.num_chunks, number_of_workers))
+        return (num_chunks + self._window_size - 1) // self._window_size
+
+    def _current_sequence(self, number_of_workers, worker_rank):
+        # Moves on to the next sequence that has not been read yet, loading
+        # windows (and starting sweeps) as needed, and returns it as
+        # (chunk id, index in chunk) without consuming it. Returns None if
+        # max_sweeps have been read.
+        if self._data is None:
+            raise ValueError('the minibatch source has been closed')
+        if 0 < self.num_chunks < number_of_workers:
+            # a worker without chunks would look like the end of the data
+            raise ValueError('"%s" has %i chunks, which cannot be distributed '
+                             'to %i workers; write it with smaller chunks'
+                             % (self._filename, self.num_chunks,
+                                number_of_workers))
+
+        num_windows = self._num_windows(number_of_workers, worker_rank)
+        if num_windows == 0:
+            return None
+
+        while True:
+            if self._max_sweeps != INFINITELY_REPEAT and \
+                    self._sweep >= self._max_sweeps:
+                return None
+
+            self._load_window(number_of_workers, worker_rank)
+            if self._position < len(self._window_sequences):
+                return self._window_sequences[self._position]
+
+            self._position = 0
+            self._window += 1
+            if self._window >= num_windows:
+                self._window = 0
+                self._sweep += 1
+
+    def next_minibatch(self, num_samples, number_of_workers=1, worker_rank=0,
+                       device=None):
+        '''
+        Reads whole sequences until the next one would exceed
+        ``num_samples`` samples (but at least one sequence). Raises a
+        ``ValueError`` if the file has fewer chunks than there are workers.
+
+        Args:
+            num_samples (int): number of samples to return
+            number_of_workers (int): number of workers in total
+            worker_rank (int): worker for which the data is to be returned
+            device (:class:`~cntk.device.DeviceDescriptor`, default None):
+             device the data should be put on
+
+        Returns:
+            mapping of :class:`~cntk.io.StreamInformation` to
+            :class:`~cntk.io.MinibatchData`, empty if ``max_sweeps`` have
+            been read
+        '''
+        if device is None:
+            device = use_default_device()
+
+        selected = []
+        total_samples = 0
+        sweep_end = False
+        while True:
+            sequence = self._current_sequence(number_of_workers, worker_rank)
+            if sequence is None:
+                break
+            chunk_id, index = sequence
+            # keep a reference to the parsed chunk, the window may move on
+            parsed_chunk = self._parsed_chunks[chunk_id]
+            length = int(parsed_chunk[0][index])
+            if selected and total_samples + length > num_samples:
+                break
+
+            self._position += 1
+            selected.append((parsed_chunk, index))
+            total_samples += length
+            if self._position == len(self._window_sequences) and \
+                    self._window == self._num_windows(number_of_workers,
+                                                      worker_rank) - 1:
+                sweep_end = True
+
+        if not selected:
+            return {}
+
+        result = {}
+        for stream_id, info in enumerate(self._infos):
+            is_sparse, dtype, sample_dim = self._streams[stream_id]
+            ndavs = []
+            stream_samples = 0
+            for (_, streams), index in selected:
+                data = streams[stream_id][index]
+                if is_sparse:
+                    values, indices, sizes = data
+                    indptr = np.zeros(len(sizes) + 1, dtype=np.int32)
+                    np.cumsum(sizes, out=indptr[1:])
+                    data = sparse.csr_matrix((values, indices, indptr),
+                                             shape=(len(sizes), sample_dim),
+                                             copy=False)
+                    ndav = NDArrayView.from_csr(data, device=cpu(),
+                                                read_only=True, borrow=True)
+                else:
+                    ndav = NDArrayView.from_dense(data, device=cpu(),
+                                                  read_only=True, borrow=True)
+                stream_samples += data.shape[0]
+                ndavs.append(ndav)
+
+            # The views borrow the memory of the mapping, the Value copies
+            # them into one batch.
+            value = cntk_py.Value_create(sanitize_shape((sample_dim,)), ndavs,
+                                         [], device, False, True)
+            result[info] = MinibatchData(value, len(selected), stream_samples,
+                                         sweep_end)
+
+        return result
+
+    def get_checkpoint_state(self):
+        '''
+        Returns the current position as a dictionary.
+        '''
+        return {'sweep': self._sweep, 'window': self._window,
+                'position': self._position}
+
+    def restore_from_checkpoint(self, state):
+        '''
+        Restores the position from a dictionary returned by
+        :meth:`get_checkpoint_state`.
+
+        Args:
+            state (dict): dictionary containing the state
+        '''
+        self._sweep = int(state['sweep'])
+        self._window = int(state['window'])
+        self._position = int(state['position'])
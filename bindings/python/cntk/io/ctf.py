@@ -0,0 +1,273 @@
+# Copyright (c) Microsoft. All rights reserved.
+
+# Licensed under the MIT license. See LICENSE.md file in the project root
+# for full license information.
+# ==============================================================================
+
+'''
+Bulk writer for the :cntkwiki:`CNTK text format <BrainScript-CNTKTextFormat-Reader>`.
+'''
+
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import numpy as np
+from scipy import sparse
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+def _format_values(values, precision):
+    # Formats a 2D array into one string per row, with the values separated
+    # by spaces. Without precision this matches ndarray.astype(str), which
+    # sequence_to_cntk_text_format uses. With precision every row is
+    # formatted with a single format string, as np.savetxt does, instead of
+    # value by value.
+    if precision is None or not np.issubdtype(values.dtype, np.floating):
+        return [' '.join(row) for row in values.astype(str).tolist()]
+    row_format = ' '.join(['%%.%ig' % precision] * values.shape[1])
+    return [row_format % tuple(row) for row in values.tolist()]
+
+
+def _format_dense(sequences, precision):
+    # All sequences of an alias are formatted at once, unless they have
+    # different types, which would change their string representation.
+    # Empty sequences are reshaped with an explicit sample size, since -1 is
+    # ambiguous for them.
+    sequences = [np.asarray(s) for s in sequences]
+    sequences = [s.reshape(len(s), int(np.prod(s.shape[1:])))
+                 for s in sequences]
+    lengths = [len(s) for s in sequences]
+    if len(set(s.dtype for s in sequences)) == 1:
+        groups = [_format_values(np.concatenate(sequences), precision)]
+    else:
+        groups = [_format_values(s, precision) for s in sequences]
+
+    samples = [row for group in groups for row in group]
+    return lengths, samples
+
+
+def _format_csr(sequences, precision):
+    # As for dense data, sequences of the same type are stacked and formatted
+    # at once.
+    lengths = [s.shape[0] for s in sequences]
+    if len(set(s.dtype for s in sequences)) == 1:
+        groups = [sparse.vstack(sequences, format='csr')]
+    else:
+        groups = [s.tocsr() for s in sequences]
+
+    samples = []
+    for s in groups:
+        if not s.has_sorted_indices:
+            s = s.sorted_indices()
+        indices = s.indices.astype(str).tolist()
+        values = _format_values(s.data.reshape(1, -1), precision)[0].split(' ')
+        pairs = [i + ':' + v for i, v in zip(indices, values)]
+        indptr = s.indptr.tolist()
+        samples.extend(' '.join(pairs[indptr[i]:indptr[i + 1]])
+                       for i in range(len(indptr) - 1))
+    return lengths, samples
+
+
+def _format_sparse_sample(sample):
+    if isinstance(sample, dict):
+        return ' '.join('%s:%s' % (k, v) for k, v in sorted(sample.items()))
+    if isinstance(sample, (list, tuple, np.ndarray)):
+        return ' '.join('%i:1' % i for i in sorted(sample))
+    return '%i:1' % sample
+
+
+def _format_sparse(sequences):
+    lengths = [len(s) for s in sequences]
+    samples = [_format_sparse_sample(sample) for s in sequences
+               for sample in s]
+    return lengths, samples
+
+
+def _format_alias(sequences, precision):
+    # Returns the number of samples of every sequence and the formatted
+    # samples of all sequences.
+    first = next((s for s in sequences if sparse.issparse(s) or len(s) > 0),
+                 None)
+    if first is None:
+        return [0] * len(sequences), []
+    if sparse.issparse(first):
+        return _format_csr(sequences, precision)
+    if isinstance(first, np.ndarray):
+        return _format_dense(sequences, precision)
+    if isinstance(first, (list, tuple)):
+        return _format_sparse(sequences)
+
+    raise ValueError('expected a dense array, a CSR matrix or a list of '
+                     'indices, but got "%s"' % type(first))
+
+
+class CTFWriter(object):
+    '''
+    Writes batches of sequences in the
+    :cntkwiki:`CNTK text format <BrainScript-CNTKTextFormat-Reader>`.
+
+    The values of each input are formatted for the whole batch at once and
+    the lines are written through a buffer. Without ``precision`` every
+    sequence is written exactly as :func:`~cntk.io.sequence_to_cntk_text_format`
+    formats it, followed by a newline.
+
+    Lists are interpreted as indices; dense data has to be passed as arrays.
+
+    Example:
+        >>> import sys
+        >>> with CTFWriter(sys.stdout) as writer: # doctest: +NORMALIZE_WHITESPACE
+        ...     n = writer.write({'x': [np.array([[1, 2], [3, 4]])],
+        ...                       'y': [[3]]})
+        0 |x 1 2 |y 3:1
+        0 |x 3 4
+
+    Args:
+        output (str or file-like object): file name or text stream to write to
+        precision (int, optional): number of significant digits of floating
+         point values. If None, the shortest representation is written.
+        start_index (int, defaults to 0): sequence id of the first sequence
+        buffer_size (int, defaults to 1 MB): number of characters collected
+         before they are written
+    '''
+
+    def __init__(self, output, precision=None, start_index=0,
+                 buffer_size=DEFAULT_BUFFER_SIZE):
+        if isinstance(output, str):
+            self._stream = open(output, 'w')
+            self._owns_stream = True
+        else:
+            self._stream = output
+            self._owns_stream = False
+        self.precision = precision
+        self.next_index = start_index
+        self._buffer_size = buffer_size
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, alias_sequences_map, sequence_ids=None):
+        '''
+        Writes a batch of sequences.
+
+        Args:
+            alias_sequences_map (dict): maps an alias (str) to a list with
+             one entry per sequence, which is either a dense array of shape
+             ``(sequence length,) + sample shape``, a SciPy CSR matrix with one
+             row per sample, or a list with the indices (int or list of int) of
+             the non-zero entries of each sample, whose value is 1. Lists of
+             dicts mapping index to value are accepted as well.
+            sequence_ids (list of int, optional): the ids of the sequences. If
+             None, the sequences are numbered consecutively.
+
+        Returns:
+            int: number of sequences written
+        '''
+        aliases = sorted(alias_sequences_map)
+        if not aliases:
+            return 0
+
+        num_sequences = len(alias_sequences_map[aliases[0]])
+        if any(len(alias_sequences_map[a]) != num_sequences for a in aliases):
+            raise ValueError('all aliases need the same number of sequences')
+        if sequence_ids is None:
+            sequence_ids = range(self.next_index,
+                                 self.next_index + num_sequences)
+        elif len(sequence_ids) != num_sequences:
+            raise ValueError('expected %i sequence ids, but got %i'
+                             % (num_sequences, len(sequence_ids)))
+
+        formatted = []
+        for alias in aliases:
+            lengths, samples = _format_alias(alias_sequences_map[alias],
+                                             self.precision)
+            formatted.append((alias + ' ', samples,
+                              np.cumsum([0] + lengths).tolist()))
+
+        for i, seq_idx in enumerate(sequence_ids):
+            prefix = '%i\t|' % seq_idx
+            fields = [(alias, samples, offsets[i], offsets[i + 1] - offsets[i])
+                      for alias, samples, offsets in formatted]
+            max_length = max(length for _, _, _, length in fields)
+
+            for elem_idx in range(max_length):
+                line = ' |'.join(alias + samples[start + elem_idx]
+                                 for alias, samples, start, length in fields
+                                 if elem_idx < length)
+                self._append(prefix + line + '\n')
+
+        self.next_index = max(self.next_index, max(sequence_ids) + 1) \
+            if num_sequences else self.next_index
+        return num_sequences
+
+    def _append(self, line):
+        self._buffer.append(line)
+        self._buffered += len(line)
+        if self._buffered >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes the buffered lines to the output.
+        '''
+        if self._buffer:
+            self._stream.write(u''.join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+
+    def close(self):
+        '''
+        Flushes the buffer and closes the output if it was opened by the
+        writer.
+        '''
+        self.flush()
+        if self._owns_stream:
+            self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _write_shard(args):
+    filename, batches, precision = args
+    if callable(batches):
+        batches = batches()
+    num_sequences = 0
+    with CTFWriter(filename, precision=precision) as writer:
+        for batch in batches:
+            num_sequences += writer.write(batch)
+    return num_sequences
+
+
+def write_ctf_shards(shards, precision=None, num_workers=None,
+                     use_threads=False):
+    '''
+    Writes several files in the CNTK text format in parallel.
+
+    Args:
+        shards (list): list of ``(filename, batches)`` pairs, where
+         ``batches`` is an iterable of dictionaries as taken by
+         :meth:`CTFWriter.write`, or a callable without arguments that returns
+         one. If processes are used, they need to be picklable.
+        precision (int, optional): number of significant digits of floating
+         point values
+        num_workers (int, optional): number of workers, defaults to the
+         number of CPUs
+        use_threads (bool, defaults to False): whether to use a thread pool
+         instead of a process pool, e.g. if the batches cannot be pickled
+
+    Returns:
+        list of int: the number of sequences written to each file
+    '''
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    num_workers = max(1, min(num_workers, len(shards)))
+    pool = ThreadPool(num_workers) if use_threads \
+        else multiprocessing.Pool(num_workers)
+    try:
+        return pool.map(_write_shard, [(filename, batches, precision)
+                                       for filename, batches in shards])
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,405 @@
+# Copyright (c) Microsoft. All rights reserved.
+
+# Licensed under the MIT license. See LICENSE.md file in the project root
+# for full license information.
+# ==============================================================================
+
+'''
+Minibatch source that reads ahead from a :class:`~cntk.io.UserMinibatchSource`
+in worker processes.
+'''
+
+import ctypes
+import multiprocessing
+import traceback
+import numpy as np
+from scipy import sparse
+
+from cntk import cntk_py
+from cntk.core import NDArrayView
+from cntk.device import use_default_device, cpu
+from . import UserMinibatchSource, MinibatchData
+
+_WORKER_STATE_PREFIX = 'worker_%i_'
+_ALIGNMENT = 64
+
+
+def _checkpoint_state(source):
+    try:
+        return source.get_checkpoint_state()
+    except NotImplementedError:
+        return None
+
+
+def _has_mask(value):
+    return cntk_py.Value.mask(value) is not None
+
+
+def _minibatch_to_arrays(mb, stream_infos):
+    # Converts the MinibatchData of every stream into
+    # (num_sequences, num_samples, sweep_end, seq_starts, lengths, is_sparse,
+    # arrays), where arrays are NumPy arrays holding all sequences.
+    from cntk.core import _sparse_value_to_csr_sequences
+    streams = []
+    for si in stream_infos:
+        data = mb[si]
+        value = data.data
+        if _has_mask(value):
+            mask = value.mask
+            lengths = (mask != cntk_py.MaskKind_Invalid).sum(axis=1)
+            seq_starts = (mask[:, 0] == cntk_py.MaskKind_SequenceBegin).tolist()
+        else:
+            lengths = None
+            seq_starts = None
+
+        if value.is_sparse:
+            shape = value.shape[2:]
+            sequences = _sparse_value_to_csr_sequences(value, shape)
+            arrays = [np.asarray(shape, dtype=np.int64),
+                      np.asarray([s.nnz for s in sequences], dtype=np.int64),
+                      np.concatenate([s.data for s in sequences]),
+                      np.concatenate([s.indices for s in sequences]),
+                      np.concatenate([s.indptr for s in sequences])]
+            rows_per_sample = int(np.prod(shape[:-1]))
+            lengths = np.asarray([s.shape[0] // rows_per_sample
+                                  for s in sequences])
+        else:
+            arrays = [value.data.asarray()]
+            if lengths is None:
+                lengths = np.full(arrays[0].shape[0], arrays[0].shape[1],
+                                  dtype=np.int64)
+
+        streams.append((data.num_sequences, data.num_samples,
+                        data.end_of_sweep, seq_starts, lengths.tolist(),
+                        value.is_sparse, arrays))
+    return streams
+
+
+def _arrays_to_minibatch(streams, stream_infos, device):
+    from cntk.internal import sanitize_shape
+    result = {}
+    for si, stream in zip(stream_infos, streams):
+        num_sequences, num_samples, sweep_end, seq_starts, lengths, \
+            is_sparse, arrays = stream
+        ndavs = []
+        if is_sparse:
+            shape, nnz, values, indices, indptrs = arrays
+            sample_shape = tuple(shape.tolist())
+            rows_per_sample = int(np.prod(sample_shape[:-1]))
+            nnz_offset = indptr_offset = 0
+            for length, count in zip(lengths, nnz.tolist()):
+                rows = length * rows_per_sample
+                csr = sparse.csr_matrix(
+                    (values[nnz_offset:nnz_offset + count],
+                     indices[nnz_offset:nnz_offset + count],
+                     indptrs[indptr_offset:indptr_offset + rows + 1]),
+                    shape=(rows, sample_shape[-1]))
+                ndavs.append(NDArrayView.from_csr(
+                    csr, device=cpu(), read_only=True, borrow=True,
+                    shape=(length,) + sample_shape))
+                nnz_offset += count
+                indptr_offset += rows + 1
+        else:
+            padded, = arrays
+            sample_shape = padded.shape[2:]
+            for sequence, length in zip(padded, lengths):
+                ndavs.append(NDArrayView.from_dense(
+                    np.ascontiguousarray(sequence[:length]), device=cpu(),
+                    read_only=True, borrow=True))
+
+        # the views borrow the memory of the ring buffer, Value copies it
+        value = cntk_py.Value_create(sanitize_shape(sample_shape), ndavs,
+                                     seq_starts or [], device, False, True)
+        result[si] = MinibatchData(value, num_sequences, num_samples,
+                                   sweep_end)
+    return result
+
+
+class _RingBuffer(object):
+    # Fixed size slots of shared memory. Arrays that do not fit into their
+    # slot are passed through the result queue instead.
+
+    def __init__(self, num_slots, slot_size):
+        self.slot_size = slot_size
+        self.memory = multiprocessing.RawArray(ctypes.c_uint8,
+                                               num_slots * slot_size)
+        self._view = None
+
+    @property
+    def view(self):
+        if self._view is None:
+            self._view = np.frombuffer(self.memory, dtype=np.uint8)
+        return self._view
+
+    def __getstate__(self):
+        return {'slot_size': self.slot_size, 'memory': self.memory}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._view = None
+
+    def write(self, slot, arrays):
+        # Returns a descriptor per array: (offset, dtype, shape) if the array
+        # was copied into the slot, or the array itself.
+        descriptors = []
+        offset = slot * self.slot_size
+        end = offset + self.slot_size
+        for array in arrays:
+            array = np.ascontiguousarray(array)
+            if offset + array.nbytes > end:
+                descriptors.append(array)
+                continue
+            target = self.view[offset:offset + array.nbytes]
+            target[:] = array.view(np.uint8).ravel()
+            descriptors.append((offset, array.dtype.str, array.shape))
+            offset += (array.nbytes + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+        return descriptors
+
+    def read(self, descriptors):
+        arrays = []
+        for descriptor in descriptors:
+            if isinstance(descriptor, np.ndarray):
+                arrays.append(descriptor)
+                continue
+            offset, dtype, shape = descriptor
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape)) if shape else 1
+            array = self.view[offset:offset + count * dtype.itemsize]
+            arrays.append(array.view(dtype).reshape(shape))
+        return arrays
+
+
+def _prefetch_worker(source, worker_id, num_workers, requests, results,
+                     ring_buffer):
+    try:
+        if not isinstance(source, UserMinibatchSource):
+            source = source()
+        stream_infos = source.stream_infos()
+        results.put(('state', _checkpoint_state(source)))
+
+        while True:
+            command = requests.get()
+            if command is None:
+                break
+
+            if command[0] == 'restore':
+                source.restore_from_checkpoint(command[1])
+                continue
+
+            _, slot, num_samples, number_of_workers, worker_rank = command
+            # every process reads its own partition, as if it was one more
+            # distributed worker
+            mb = source.next_minibatch(num_samples,
+                                       number_of_workers * num_workers,
+                                       worker_rank * num_workers + worker_id,
+                                       cpu())
+            if mb:
+                streams = _minibatch_to_arrays(mb, stream_infos)
+                mb = None
+                streams = [s[:-1] + (ring_buffer.write(slot, s[-1]),)
+                           for s in streams]
+                # all streams share the slot
+                results.put(('minibatch', streams, _checkpoint_state(source)))
+            else:
+                results.put(('minibatch', None, _checkpoint_state(source)))
+    except Exception:
+        results.put(('error', traceback.format_exc()))
+
+
+class PrefetchingMinibatchSource(UserMinibatchSource):
+    '''
+    Reads minibatches ahead from a :class:`~cntk.io.UserMinibatchSource` in
+    ``num_workers`` processes, so that decoding the data in Python overlaps
+    with the computation on the training thread.
+
+    Every process has its own instance of the wrapped source and reads its
+    own partition of the data, as if it was an additional distributed worker:
+    for ``number_of_workers`` workers, process ``i`` of worker ``worker_rank``
+    reads with ``number_of_workers * num_workers`` workers and rank
+    ``worker_rank * num_workers + i``. Minibatches are returned from the
+    processes in round-robin order, so the order is deterministic.
+
+    The processes write the data into a bounded ring buffer of shared memory
+    with ``num_workers * prefetch_depth`` slots of ``slot_size_in_bytes``
+    bytes each; data that does not fit into a slot is passed through a queue.
+
+    If the wrapped source implements checkpointing, so does this source, and
+    minibatches that have been read ahead with a different minibatch size,
+    number of workers or rank are read again from the wrapped source.
+
+    Args:
+        source (:class:`~cntk.io.UserMinibatchSource` or callable): the
+         source to wrap, or a callable without arguments that creates it. A
+         callable is required if processes are not started by forking (e.g.
+         on Windows), and it needs to be picklable.
+        num_workers (int, defaults to 2): number of worker processes
+        prefetch_depth (int, defaults to 2): number of minibatches every
+         process reads ahead
+        slot_size_in_bytes (int, defaults to 16 MB): size of each slot of the
+         ring buffer
+    '''
+
+    def __init__(self, source, num_workers=2, prefetch_depth=2,
+                 slot_size_in_bytes=16 * 1024 * 1024):
+        if num_workers < 1 or prefetch_depth < 1:
+            raise ValueError('num_workers and prefetch_depth must be positive')
+
+        if isinstance(source, UserMinibatchSource):
+            self._infos = source.stream_infos()
+        else:
+            self._infos = source().stream_infos()
+
+        self._num_workers = num_workers
+        self._num_slots = num_workers * prefetch_depth
+        self._ring_buffer = _RingBuffer(self._num_slots, slot_size_in_bytes)
+
+        self._requests = [multiprocessing.Queue()
+                          for _ in range(num_workers)]
+        self._results = [multiprocessing.Queue()
+                         for _ in range(num_workers)]
+        self._processes = [multiprocessing.Process(
+            target=_prefetch_worker,
+            args=(source, i, num_workers, self._requests[i], self._results[i],
+                  self._ring_buffer))
+            for i in range(num_workers)]
+        for process in self._processes:
+            process.daemon = True
+            process.start()
+
+        # Minibatches are numbered globally; minibatch i is read by process
+        # i % num_workers into slot i % num_slots.
+        self._consumed = 0
+        self._issued = 0
+        self._request_key = None
+        # the state of every wrapped source before its next minibatch that
+        # has not been consumed yet
+        self._states = [self._receive(i)[1] for i in range(num_workers)]
+
+        super(PrefetchingMinibatchSource, self).__init__()
+
+    def stream_infos(self):
+        '''
+        Returns the stream descriptions of the wrapped source.
+        '''
+        return self._infos
+
+    def _receive(self, worker):
+        result = self._results[worker].get()
+        if result[0] == 'error':
+            raise RuntimeError('prefetching worker %i failed:\n%s'
+                               % (worker, result[1]))
+        return result
+
+    def _issue(self):
+        while self._issued < self._consumed + self._num_slots:
+            worker = self._issued % self._num_workers
+            self._requests[worker].put(('minibatch',
+                                        self._issued % self._num_slots)
+                                       + self._request_key)
+            self._issued += 1
+
+    def _cancel(self):
+        # Waits for all outstanding minibatches and rewinds the wrapped
+        # sources to the state before the first of them.
+        while self._issued > self._consumed:
+            self._issued -= 1
+            self._receive(self._issued % self._num_workers)
+
+        for worker, state in enumerate(self._states):
+            if state is None:
+                raise RuntimeError('the minibatch size, number of workers or '
+                                   'rank changed while minibatches were read '
+                                   'ahead, which requires the wrapped source '
+                                   'to implement get_checkpoint_state()')
+            self._requests[worker].put(('restore', state))
+
+    def next_minibatch(self, num_samples, number_of_workers=1, worker_rank=0,
+                       device=None):
+        '''
+        Returns the next minibatch read ahead by the worker processes.
+
+        Args:
+            num_samples (int): number of samples to return
+            number_of_workers (int): number of workers in total
+            worker_rank (int): worker for which the data is to be returned
+            device (:class:`~cntk.device.DeviceDescriptor`, default None):
+             device the data should be put on
+
+        Returns:
+            mapping of :class:`~cntk.io.StreamInformation` to
+            :class:`~cntk.io.MinibatchData`, empty if all processes have
+            reached the end of their data
+        '''
+        if device is None:
+            device = use_default_device()
+
+        key = (num_samples, number_of_workers, worker_rank)
+        if key != self._request_key:
+            if self._issued > self._consumed:
+                self._cancel()
+            self._request_key = key
+
+        for _ in range(self._num_workers):
+            self._issue()
+            worker = self._consumed % self._num_workers
+            _, streams, state = self._receive(worker)
+            self._states[worker] = state
+            self._consumed += 1
+            if streams is not None:
+                streams = [s[:-1] + (self._ring_buffer.read(s[-1]),)
+                           for s in streams]
+                return _arrays_to_minibatch(streams, self._infos,
+                                            device)
+
+        return {}
+
+    def get_checkpoint_state(self):
+        '''
+        Returns the states of the wrapped sources as a dictionary.
+        '''
+        if any(state is None for state in self._states):
+            raise NotImplementedError('checkpointing requires the wrapped '
+                                      'source to implement '
+                                      'get_checkpoint_state()')
+
+        checkpoint = {'next_worker': self._consumed % self._num_workers}
+        for worker, state in enumerate(self._states):
+            for key, value in state.items():
+                checkpoint[_WORKER_STATE_PREFIX % worker + key] = value
+        return checkpoint
+
+    def restore_from_checkpoint(self, state):
+        '''
+        Restores the wrapped sources from a dictionary returned by
+        :meth:`get_checkpoint_state`.
+
+        Args:
+            state (dict): dictionary containing the state
+        '''
+        while self._issued > self._consumed:
+            self._issued -= 1
+            self._receive(self._issued % self._num_workers)
+
+        for worker in range(self._num_workers):
+            prefix = _WORKER_STATE_PREFIX % worker
+            self._states[worker] = dict(
+                (key[len(prefix):], value) for key, value in state.items()
+                if key.startswith(prefix))
+            self._requests[worker].put(('restore', self._states[worker]))
+
+        self._consumed = self._issued = int(state['next_worker'])
+
+    def close(self):
+        '''
+        Stops the worker processes.
+        '''
+        for requests in self._requests:
+            requests.put(None)
+        for process in self._processes:
+            process.join()
+        self._processes = []
+
+    def __del__(self):
+        if getattr(self, '_processes', None):
+            for process in self._processes:
+                process.terminate()
@@ -0,0 +1,239 @@
+# Copyright (c) Microsoft. All rights reserved.
+
+# Licensed under the MIT license. See LICENSE.md file in the project root
+# for full license information.
+# ==============================================================================
+
+'''
+Queue that converts NumPy batches to :class:`~cntk.core.Value` objects on a
+background thread while the trainer works on the previous batch.
+'''
+
+import collections
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from cntk.device import use_default_device
+from cntk.internal import sanitize_var_map
+
+StagingStats = collections.namedtuple('StagingStats',
+                                      ['batches', 'occupancy',
+                                       'mean_occupancy', 'stall_time',
+                                       'producer_stall_time'])
+
+_END = object()
+
+
+class _Failure(object):
+    # Carries an exception of the worker thread to the consumer.
+
+    def __init__(self, error):
+        self.error = error
+
+
+class StagingQueue(object):
+    '''
+    Converts batches of NumPy data into :class:`~cntk.core.Value` objects on a
+    background thread and keeps up to ``capacity`` converted batches ready,
+    so that the conversion of the next batch overlaps with
+    :meth:`~cntk.train.trainer.Trainer.train_minibatch` on the current one.
+    The default capacity of 2 is double buffering.
+
+    The trainer releases the GIL while it runs a minibatch, so the
+    conversion runs in parallel to it, also on CPU-only machines.
+
+    Batches are either taken from an iterable ``batches``, or added with
+    :meth:`put` and finished with :meth:`end`. Iterating over the queue
+    returns the converted batches, which can be passed to
+    :meth:`~cntk.train.trainer.Trainer.train_minibatch` as they are.
+    Exceptions raised during the conversion are raised by the iteration.
+
+    Example:
+        >>> x = C.input_variable(2)
+        >>> batches = [{x: np.ones((3, 2), dtype=np.float32)}] * 2
+        >>> with StagingQueue([x], batches) as staged:
+        ...     for arguments in staged:
+        ...         print(arguments[x].shape)
+        (3, 1, 2)
+        (3, 1, 2)
+
+    Args:
+        variables (list): the input variables the batches are for, e.g. the
+         arguments of the loss function. The batches may refer to them by
+         name.
+        batches (iterable, optional): the batches, each mapping variables or
+         their names to data as accepted by
+         :meth:`~cntk.train.trainer.Trainer.train_minibatch`. If None, the
+         batches are added with :meth:`put`.
+        capacity (int, defaults to 2): maximum number of converted batches
+         that are kept ready
+        device (:class:`~cntk.device.DeviceDescriptor`, default None): device
+         the values are created on
+    '''
+
+    def __init__(self, variables, batches=None, capacity=2, device=None):
+        if capacity < 1:
+            raise ValueError('capacity must be positive')
+        if device is None:
+            device = use_default_device()
+
+        self.variables = tuple(variables)
+        self.capacity = capacity
+        self.device = device
+        self._ready = queue.Queue(maxsize=capacity)
+        if batches is None:
+            self._pending = queue.Queue(maxsize=capacity)
+            batches = iter(self._pending.get, _END)
+        else:
+            self._pending = None
+
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._occupancy_sum = 0
+        self._stall_time = 0.0
+        self._producer_stall_time = 0.0
+        self._stopped = False
+        self._done = False
+
+        self._thread = threading.Thread(target=self._run, args=(batches,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _offer(self, item):
+        # Waits until there is room for the item, unless the queue is closed.
+        start = time.time()
+        while not self._stopped:
+            try:
+                self._ready.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        with self._lock:
+            self._producer_stall_time += time.time() - start
+
+    def _run(self, batches):
+        try:
+            for batch in batches:
+                if self._stopped:
+                    break
+                self._offer(sanitize_var_map(self.variables, batch,
+                                             device=self.device))
+        except Exception as e:
+            self._offer(_Failure(e))
+        self._offer(_END)
+
+    def put(self, batch, timeout=None):
+        '''
+        Adds a batch to be converted. Blocks while ``capacity`` batches are
+        waiting for the conversion.
+
+        Args:
+            batch (dict): maps variables or their names to their data
+            timeout (float, optional): maximum number of seconds to wait. If
+             the batch could not be added in time, ``queue.Full`` is raised.
+        '''
+        if self._pending is None:
+            raise ValueError('batches cannot be added to a queue that reads '
+                             'from an iterable')
+        self._pending.put(batch, timeout=timeout)
+
+    def end(self):
+        '''
+        Marks the end of the batches added with :meth:`put`. The iteration
+        stops after the last of them.
+        '''
+        if self._pending is None:
+            raise ValueError('the end of an iterable is detected '
+                             'automatically')
+        self._pending.put(_END)
+
+    def get(self, timeout=None):
+        '''
+        Returns the next converted batch.
+
+        Args:
+            timeout (float, optional): maximum number of seconds to wait. If
+             no batch is ready in time, ``queue.Empty`` is raised.
+
+        Returns:
+            dict mapping the variables to :class:`~cntk.core.Value` objects,
+            or None after the last batch
+        '''
+        if self._done:
+            return None
+
+        occupancy = self._ready.qsize()
+        start = time.time()
+        item = self._ready.get(timeout=timeout)
+        with self._lock:
+            self._stall_time += time.time() - start
+
+        if item is _END:
+            self._done = True
+            return None
+        if isinstance(item, _Failure):
+            raise item.error
+
+        with self._lock:
+            self._batches += 1
+            self._occupancy_sum += occupancy
+        return item
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        batch = self.get()
+        if batch is None:
+            raise StopIteration
+        return batch
+
+    next = __next__
+
+    def stats(self):
+        '''
+        Returns how well the conversion keeps up with the consumer. A mean
+        occupancy close to 0 and a growing stall time mean that the trainer
+        waits for data; an occupancy close to ``capacity`` means that the
+        conversion is ahead.
+
+        Returns:
+            :class:`StagingStats` with the number of batches returned, the
+            number of batches ready now, the mean number of batches ready
+            when one was requested, the seconds the consumer waited for
+            batches, and the seconds the conversion waited for free space
+        '''
+        with self._lock:
+            mean = self._occupancy_sum / float(self._batches) \
+                if self._batches else 0.0
+            return StagingStats(self._batches, self._ready.qsize(), mean,
+                                self._stall_time, self._producer_stall_time)
+
+    def close(self):
+        '''
+        Stops the conversion and discards the batches that have not been
+        returned yet.
+        '''
+        self._stopped = True
+        if self._pending is not None:
+            try:
+                self._pending.put_nowait(_END)
+            except queue.Full:
+                pass
+        while self._thread.is_alive():
+            try:
+                self._ready.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._done = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -544,6 +544,88 @@ def test_sequence_conversion_dense(idx, alias_tensor_map, expected):
     assert sequence_to_cntk_text_format(idx, alias_tensor_map) == expected
 
 
+def test_ctf_writer_matches_sequence_conversion(tmpdir):
+    from cntk.io import CTFWriter
+    np.random.seed(0)
+    features = [np.random.rand(np.random.randint(1, 5), 2, 3).astype(np.float32)
+                for _ in range(20)]
+    labels = [np.random.randint(0, 5, size=(np.random.randint(1, 3), 1))
+              for _ in range(20)]
+
+    expected = ''.join(sequence_to_cntk_text_format(
+        i, {'features': f, 'labels': l}) + '\n'
+        for i, (f, l) in enumerate(zip(features, labels)))
+
+    tmpfile = str(tmpdir / 'out.ctf')
+    with CTFWriter(tmpfile, buffer_size=100) as writer:
+        assert writer.write({'features': features[:7],
+                             'labels': labels[:7]}) == 7
+        writer.write({'features': features[7:], 'labels': labels[7:]})
+
+    with open(tmpfile) as f:
+        assert f.read() == expected
+
+
+def test_ctf_writer_sparse_and_precision():
+    import sys
+    from scipy import sparse
+    from cntk.io import CTFWriter
+    if sys.version_info.major == 2:
+        from StringIO import StringIO
+    else:
+        from io import StringIO
+
+    output = StringIO()
+    writer = CTFWriter(output, precision=3, start_index=5)
+    writer.write({
+        'csr': [sparse.csr_matrix(AA([[0, 0.5, 0], [0.12345, 0, 2]])),
+                sparse.csr_matrix((1, 3))],
+        'ids': [[1, [2, 0]], [[]]],
+        'dense': [AA([[1 / 3.]]), AA([[2.]])],
+    })
+    writer.write({'ids': [[{3: 0.25}]]}, sequence_ids=[42])
+    writer.close()
+
+    assert output.getvalue() == (
+        '5\t|csr 1:0.5 |dense 0.333 |ids 1:1\n'
+        '5\t|csr 0:0.123 2:2 |ids 0:1 2:1\n'
+        '6\t|csr  |dense 2 |ids \n'
+        '42\t|ids 3:0.25\n')
+    assert writer.next_index == 43
+
+
+def test_ctf_writer_empty_sequence():
+    import sys
+    from cntk.io import CTFWriter
+    if sys.version_info.major == 2:
+        from StringIO import StringIO
+    else:
+        from io import StringIO
+
+    for precision, x in [(None, '1.0 2.0'), (3, '1 2')]:
+        output = StringIO()
+        with CTFWriter(output, precision=precision) as writer:
+            writer.write({'x': [AA([[1., 2.]]), np.zeros((0, 2))],
+                          'y': [[1], [2]]})
+        assert output.getvalue() == '0\t|x %s |y 1:1\n1\t|y 2:1\n' % x
+
+
+def test_write_ctf_shards(tmpdir):
+    from cntk.io import write_ctf_shards
+    batches = [{'x': [AA([[1], [2]]), AA([[3]])]}, {'x': [AA([[4]])]}]
+    filenames = [str(tmpdir / ('shard%i.ctf' % i)) for i in range(2)]
+
+    counts = write_ctf_shards([(filenames[0], batches),
+                               (filenames[1], batches[1:])],
+                              num_workers=2, use_threads=True)
+    assert counts == [3, 1]
+
+    with open(filenames[0]) as f:
+        assert f.read() == '0\t|x 1\n0\t|x 2\n1\t|x 3\n2\t|x 4\n'
+    with open(filenames[1]) as f:
+        assert f.read() == '0\t|x 4\n'
+
+
 @pytest.mark.parametrize("data, expected", [
     ([1], True),
     ([[1, 2]], True),
@@ -911,3 +993,105 @@ def test_minibatch_defined_by_labels(tmpdir):
 
     assert_data(combined_mb_source)
 
+
+
+def _write_cbf(tmpdir, sequences, filename='mbdata.bin'):
+    # Writes the sequences as one chunk in the CNTK binary format, with a
+    # sparse stream 'features' (one-hot indices, dimension 1000) and a
+    # dense stream 'labels' (dimension 5).
+    import struct
+    tmpfile = str(tmpdir / filename)
+    with open(tmpfile, 'wb') as f:
+        f.write(struct.pack('<QI', 0x636e746b5f62696e, 1))
+        lengths = [max(len(x), len(y)) for x, y in sequences]
+        f.write(struct.pack('<%iI' % len(lengths), *lengths))
+        for x, _ in sequences:
+            f.write(struct.pack('<Ii', len(x), len(x)))
+            f.write(struct.pack('<%if' % len(x), *([1.0] * len(x))))
+            f.write(struct.pack('<%ii' % len(x), *x))
+            f.write(struct.pack('<%ii' % len(x), *([1] * len(x))))
+        for _, y in sequences:
+            f.write(struct.pack('<I', len(y)))
+            f.write(np.asarray(y, dtype=np.float32).tobytes())
+        header_offset = f.tell()
+        f.write(struct.pack('<QII', 0x636e746b5f62696e, 1, 2))
+        for matrix_type, name, dim in [(1, b'features', 1000), (0, b'labels', 5)]:
+            f.write(struct.pack('<BI', matrix_type, len(name)) + name)
+            f.write(struct.pack('<BI', 0, dim))
+        f.write(struct.pack('<qII', 12, len(sequences), sum(lengths)))
+        f.write(struct.pack('<q', header_offset))
+
+    return tmpfile
+
+# The sequences of MBDATA_SPARSE
+CBF_SEQUENCES = [([560, 0, 0], [[1, 0, 0, 0, 0]]),
+                 ([560, 0, 0, 424], [[0, 1, 0, 0, 0]])]
+
+def test_cbf_mbsource(tmpdir):
+    from cntk.io.cbf import CBFMinibatchSource
+
+    n_mb_source = MinibatchSource(CTFDeserializer(
+        _write_data(tmpdir, MBDATA_SPARSE), StreamDefs(
+            features=StreamDef(field='x', shape=1000, is_sparse=True),
+            labels=StreamDef(field='y', shape=5, is_sparse=False))),
+        randomize=False)
+    u_mb_source = CBFMinibatchSource(_write_cbf(tmpdir, CBF_SEQUENCES),
+                                     randomize=False)
+    assert u_mb_source.num_chunks == 1
+
+    for mb_size in [2, 10]:
+        n_mb = n_mb_source.next_minibatch(mb_size)
+        u_mb = u_mb_source.next_minibatch(mb_size)
+
+        for name in ['features', 'labels']:
+            n_data = n_mb[n_mb_source[name]]
+            u_data = u_mb[u_mb_source[name]]
+            assert u_data.shape == n_data.shape
+            assert u_data.end_of_sweep == n_data.end_of_sweep
+            assert u_data.num_sequences == n_data.num_sequences
+            assert u_data.num_samples == n_data.num_samples
+            assert u_data.is_sparse == n_data.is_sparse
+
+        assert np.allclose(u_mb[u_mb_source['labels']].asarray(),
+                           n_mb[n_mb_source['labels']].asarray())
+
+def test_cbf_mbsource_checkpoint(tmpdir):
+    from cntk.io.cbf import CBFMinibatchSource
+
+    sequences = [([i], [[i, 0, 0, 0, 0]]) for i in range(20)]
+    mb_source = CBFMinibatchSource(_write_cbf(tmpdir, sequences),
+                                   randomization_seed=3, max_sweeps=2)
+    labels_si = mb_source['labels']
+
+    def next_labels():
+        mb = mb_source.next_minibatch(3)
+        return mb[labels_si].asarray()[:, 0, 0].tolist() if mb else []
+
+    first_sweep = next_labels() + next_labels()
+    state = mb_source.get_checkpoint_state()
+    expected = [next_labels() for _ in range(6)]
+    mb_source.restore_from_checkpoint(state)
+    assert [next_labels() for _ in range(6)] == expected
+
+    # two sweeps over all sequences in randomized order, then the end
+    labels = first_sweep + sum(expected, [])
+    assert len(labels) == 24
+    assert sorted(labels[:20]) == list(range(20))
+    assert labels[:20] != list(range(20))
+    remaining = [next_labels() for _ in range(6)]
+    assert sorted(labels[20:] + sum(remaining, [])) == list(range(20))
+    assert mb_source.next_minibatch(3) == {}
+
+def test_cbf_mbsource_workers_and_close(tmpdir):
+    from cntk.io.cbf import CBFMinibatchSource
+
+    with CBFMinibatchSource(_write_cbf(tmpdir, CBF_SEQUENCES)) as mb_source:
+        assert mb_source.next_minibatch(10, number_of_workers=1)
+        # a single chunk cannot be distributed to two workers
+        with pytest.raises(ValueError):
+            mb_source.next_minibatch(10, number_of_workers=2, worker_rank=1)
+
+    assert mb_source._data is None
+    with pytest.raises(ValueError):
+        mb_source.next_minibatch(10)
+    mb_source.close()
@@ -0,0 +1,194 @@
+# Copyright (c) Microsoft. All rights reserved.
+
+# Licensed under the MIT license. See LICENSE.md file in the project root
+# for full license information.
+# ==============================================================================
+
+import time
+import numpy as np
+import pytest
+
+from cntk.io import UserMinibatchSource, StreamInformation, MinibatchData, \
+    PrefetchingMinibatchSource
+from cntk import sequence
+from cntk.core import Value
+
+NUM_SEQUENCES = 40
+FEATURE_DIM = 7
+
+
+class CountingSource(UserMinibatchSource):
+    '''
+    Reads the sequence ids ``worker_rank, worker_rank + number_of_workers, ...``
+    below NUM_SEQUENCES. Sequence ``i`` has ``i % 3 + 1`` samples; the dense
+    labels are ``i``, the sparse features are one-hot ``i % FEATURE_DIM``.
+    '''
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.fsi = StreamInformation('features', 0, 'sparse', np.float32,
+                                     (FEATURE_DIM,))
+        self.lsi = StreamInformation('labels', 1, 'dense', np.float32, (1,))
+        self.next_index = 0
+        super(CountingSource, self).__init__()
+
+    def stream_infos(self):
+        return [self.fsi, self.lsi]
+
+    def next_minibatch(self, num_samples, number_of_workers=1, worker_rank=0,
+                       device=None):
+        time.sleep(self.delay)
+        features, labels = [], []
+        num_read = 0
+        while True:
+            seq_id = worker_rank + self.next_index * number_of_workers
+            if seq_id >= NUM_SEQUENCES:
+                break
+            length = seq_id % 3 + 1
+            if labels and num_read + length > num_samples:
+                break
+            features.append([seq_id % FEATURE_DIM] * length)
+            labels.append(np.full((length, 1), seq_id, dtype=np.float32))
+            num_read += length
+            self.next_index += 1
+
+        if not labels:
+            return {}
+
+        return {
+            self.fsi: MinibatchData(
+                Value.one_hot(features, FEATURE_DIM, device=device),
+                len(labels), num_read, False),
+            self.lsi: MinibatchData(
+                Value.create(sequence.input_variable((1,)), labels,
+                             device=device),
+                len(labels), num_read, False)}
+
+    def get_checkpoint_state(self):
+        return {'next_index': self.next_index}
+
+    def restore_from_checkpoint(self, state):
+        self.next_index = int(state['next_index'])
+
+
+def _read_ids(mb_source, num_samples, count=None):
+    result = []
+    while count is None or len(result) < count:
+        mb = mb_source.next_minibatch(num_samples)
+        if not mb:
+            break
+        labels = mb[mb_source['labels']].data.asarray()
+        # sparse sequences are converted with the variable they are for
+        features = mb[mb_source['features']].as_sequences(
+            sequence.input_variable(FEATURE_DIM, is_sparse=True))
+        ids = []
+        for label, feature in zip(labels, features):
+            seq_id = int(label[0, 0])
+            assert feature.shape == (seq_id % 3 + 1, FEATURE_DIM)
+            assert (feature.toarray().argmax(axis=-1) ==
+                    seq_id % FEATURE_DIM).all()
+            ids.append(seq_id)
+        result.append(ids)
+    return result
+
+
+@pytest.mark.parametrize('num_workers', [1, 3])
+def test_prefetch_order(num_workers):
+    mb_source = PrefetchingMinibatchSource(CountingSource(),
+                                           num_workers=num_workers)
+    try:
+        minibatches = _read_ids(mb_source, 4)
+    finally:
+        mb_source.close()
+
+    # minibatches come round-robin from the sub-partitions of the processes
+    expected = []
+    sources = [CountingSource() for _ in range(num_workers)]
+    while True:
+        mbs = [s.next_minibatch(4, num_workers, i) for i, s in
+               enumerate(sources)]
+        if not any(mbs):
+            break
+        for mb, source in zip(mbs, sources):
+            if mb:
+                expected.append(
+                    [int(s[0, 0]) for s in mb[source.lsi].data.asarray()])
+
+    assert minibatches == expected
+    assert sorted(i for ids in minibatches for i in ids) == \
+        list(range(NUM_SEQUENCES))
+
+
+def test_prefetch_stream_infos():
+    mb_source = PrefetchingMinibatchSource(CountingSource(), num_workers=1)
+    try:
+        # indexing by name goes through the C++ StreamInfos()
+        assert mb_source['labels'].m_name == 'labels'
+        assert mb_source.stream_info('features').m_name == 'features'
+        assert [si.m_name for si in mb_source.stream_infos()] == \
+            ['features', 'labels']
+    finally:
+        mb_source.close()
+
+
+def test_prefetch_checkpoint():
+    mb_source = PrefetchingMinibatchSource(CountingSource(), num_workers=2)
+    try:
+        _read_ids(mb_source, 4, count=3)
+        state = mb_source.get_checkpoint_state()
+        expected = _read_ids(mb_source, 4)
+
+        mb_source.restore_from_checkpoint(state)
+        assert _read_ids(mb_source, 4) == expected
+    finally:
+        mb_source.close()
+
+
+def test_prefetch_minibatch_size_change():
+    mb_source = PrefetchingMinibatchSource(CountingSource(), num_workers=2)
+    try:
+        # the minibatches read ahead with 4 samples are read again
+        minibatches = _read_ids(mb_source, 4, count=2)
+        minibatches += _read_ids(mb_source, 8)
+    finally:
+        mb_source.close()
+
+    assert sorted(i for ids in minibatches for i in ids) == \
+        list(range(NUM_SEQUENCES))
+
+
+def test_prefetch_small_slots():
+    # data that does not fit into the shared memory is passed through queues
+    mb_source = PrefetchingMinibatchSource(CountingSource(), num_workers=2,
+                                           slot_size_in_bytes=16)
+    try:
+        minibatches = _read_ids(mb_source, 4)
+    finally:
+        mb_source.close()
+
+    assert sorted(i for ids in minibatches for i in ids) == \
+        list(range(NUM_SEQUENCES))
+
+
+if __name__ == '__main__':
+    # Compares reading from a source that takes 20ms per minibatch with and
+    # without prefetching, while the consumer spends 20ms per minibatch.
+    import timeit
+
+    def consume(mb_source):
+        while mb_source.next_minibatch(4):
+            time.sleep(0.02)
+
+    def direct():
+        consume(CountingSource(delay=0.02))
+
+    def prefetched(num_workers):
+        mb_source = PrefetchingMinibatchSource(CountingSource(delay=0.02),
+                                               num_workers=num_workers)
+        consume(mb_source)
+        mb_source.close()
+
+    print('direct:         %.3fs' % timeit.timeit(direct, number=3))
+    for num_workers in [1, 2, 4]:
+        print('prefetched (%i): %.3fs' % (num_workers, timeit.timeit(
+            lambda: prefetched(num_workers), number=3)))
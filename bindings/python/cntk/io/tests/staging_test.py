@@ -0,0 +1,126 @@
+# Copyright (c) Microsoft. All rights reserved.
+
+# Licensed under the MIT license. See LICENSE.md file in the project root
+# for full license information.
+# ==============================================================================
+
+import threading
+import numpy as np
+import pytest
+
+import cntk as C
+from cntk.io import StagingQueue, StagingStats
+
+INPUT_DIM = 3
+NUM_CLASSES = 2
+
+
+def _batches(count, batch_size=4):
+    for i in range(count):
+        features = np.full((batch_size, INPUT_DIM), i, dtype=np.float32)
+        labels = np.zeros((batch_size, NUM_CLASSES), dtype=np.float32)
+        labels[:, i % NUM_CLASSES] = 1
+        yield {'features': features, 'labels': labels}
+
+
+def _model():
+    features = C.input_variable(INPUT_DIM, name='features')
+    labels = C.input_variable(NUM_CLASSES, name='labels')
+    z = C.layers.Dense(NUM_CLASSES)(features)
+    ce = C.cross_entropy_with_softmax(z, labels)
+    learner = C.sgd(z.parameters, C.learning_rate_schedule(
+        0.1, C.UnitType.minibatch))
+    return features, labels, C.Trainer(z, (ce, None), [learner])
+
+
+def test_staging_queue_iterable():
+    features, labels, trainer = _model()
+    with StagingQueue(trainer.loss_function.arguments, _batches(5)) as staged:
+        seen = []
+        for arguments in staged:
+            assert set(arguments) == set([features, labels])
+            assert isinstance(arguments[features], C.Value)
+            seen.append(arguments[features].asarray()[0, 0, 0])
+            trainer.train_minibatch(arguments)
+
+        assert seen == [0, 1, 2, 3, 4]
+        assert staged.get() is None
+
+        stats = staged.stats()
+        assert isinstance(stats, StagingStats)
+        assert stats.batches == 5 and stats.occupancy == 0
+        assert 0 <= stats.mean_occupancy <= staged.capacity
+        assert stats.stall_time >= 0 and stats.producer_stall_time >= 0
+
+    assert trainer.total_number_of_samples_seen == 20
+
+
+def test_staging_queue_put():
+    features, labels, _ = _model()
+    staged = StagingQueue([features, labels], capacity=1)
+
+    def produce():
+        for batch in _batches(3):
+            staged.put(batch)
+        staged.end()
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    values = [arguments[labels].asarray() for arguments in staged]
+    producer.join()
+    staged.close()
+
+    assert len(values) == 3
+    assert [v[0, 0].argmax() for v in values] == [0, 1, 0]
+
+
+def test_staging_queue_errors():
+    features, labels, _ = _model()
+
+    with pytest.raises(ValueError):
+        StagingQueue([features], capacity=0)
+
+    with StagingQueue([features, labels], _batches(1)) as staged:
+        with pytest.raises(ValueError):
+            staged.put({})
+        with pytest.raises(ValueError):
+            staged.end()
+
+    # conversion errors are raised by the consumer
+    bad = [{'features': np.zeros((2, INPUT_DIM + 1), dtype=np.float32),
+            'labels': np.zeros((2, NUM_CLASSES), dtype=np.float32)}]
+    with StagingQueue([features, labels], bad) as staged:
+        with pytest.raises(Exception):
+            staged.get(timeout=10)
+
+
+def test_staging_queue_close_discards():
+    features, labels, _ = _model()
+    staged = StagingQueue([features, labels], _batches(100), capacity=2)
+    assert staged.get(timeout=10) is not None
+    staged.close()
+    assert not staged._thread.is_alive()
+    assert staged.get() is None
+
+
+if __name__ == '__main__':
+    # Compares training with conversion on the training thread to training
+    # with a staging queue.
+    import timeit
+
+    features, labels, trainer = _model()
+    data = list(_batches(20, batch_size=20000))
+
+    def direct():
+        for batch in data:
+            trainer.train_minibatch(batch)
+
+    def staged():
+        with StagingQueue([features, labels], data) as queue:
+            for arguments in queue:
+                trainer.train_minibatch(arguments)
+            return queue.stats()
+
+    print('direct: %.3fs' % timeit.timeit(direct, number=3))
+    print('staged: %.3fs' % timeit.timeit(staged, number=3))
+    print(staged())
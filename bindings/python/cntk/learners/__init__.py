@@ -4,11 +4,14 @@
 # ==============================================================================
 
 from enum import Enum, unique
+import collections
+import time
 import warnings
 import numpy as np
 import cntk.internal.utils as utils
 
-from .. import cntk_py, NDArrayView, asarray
+from .. import cntk_py, NDArrayView
+from cntk.device import DeviceKind, cpu
 from cntk.internal import typemap
 from ..internal.swig_helper import map_if_possible
 
@@ -171,6 +174,9 @@ class UserLearner(cntk_py.Learner):
 
     Certain optimizers (such as AdaGrad) require additional storage.
     This can be allocated and initialized during construction.
+
+    To update all parameters with one vectorized NumPy operation, derive from
+    :class:`FlatUserLearner` instead.
     '''
 
     def __init__(self, parameters, lr_schedule, as_numpy=True):
@@ -197,12 +203,12 @@ class UserLearner(cntk_py.Learner):
         map_if_possible(gradient_values)
 
         if self.as_numpy:
-            var_nd_map = {var: asarray(gradient_values[var]) \
+            var_nd_map = {var: _to_dense_ndarray(val)
                           for var, val in gradient_values.items()}
         else:
             var_nd_map = gradient_values
 
-        return self.update(gradient_values, training_sample_count, sweep_end)
+        return self.update(var_nd_map, training_sample_count, sweep_end)
 
     def update(self, gradient_values, training_sample_count, sweep_end):
         '''
@@ -223,6 +229,170 @@ class UserLearner(cntk_py.Learner):
         raise NotImplementedError('UserLearner.update must be overriden')
 
 
+def _to_dense_ndarray(ndav):
+    # Copies the data of an NDArrayView into a NumPy array. Sparse views, like
+    # the gradient of an embedding of sparse input, are densified on the CPU
+    # first. The unbound methods accept both cntk_py and cntk NDArrayViews.
+    if cntk_py.NDArrayView.is_sparse(ndav):
+        dense = cntk_py.NDArrayView(cntk_py.NDArrayView.get_data_type(ndav),
+                                    cntk_py.StorageFormat_Dense,
+                                    cntk_py.NDArrayView.shape(ndav), cpu())
+        dense.copy_from(ndav)
+        ndav = dense
+    return cntk_py.NDArrayView.to_ndarray(ndav)
+
+
+def _copy_to_buffer(buffer, ndav):
+    # Copies the data of an NDArrayView into a NumPy buffer, reading dense
+    # views on the CPU in place.
+    if not cntk_py.NDArrayView.is_sparse(ndav) and \
+            cntk_py.NDArrayView.device(ndav).type() == DeviceKind.CPU:
+        buffer[...] = cntk_py.NDArrayView.as_numpy_view(ndav)
+    else:
+        buffer[...] = _to_dense_ndarray(ndav)
+
+
+class FlatUserLearner(UserLearner):
+
+    '''
+    Base class of user-defined learners that update all of their parameters
+    at once. The values and the gradients of the parameters are kept in the
+    two contiguous NumPy buffers :attr:`parameter_buffer` and
+    :attr:`gradient_buffer`, in which every parameter occupies the same
+    slice. Instead of :meth:`~UserLearner.update`, derive from this class and
+    override :meth:`update_flat`, which can then update every parameter with
+    one vectorized NumPy operation.
+
+    Optimizer state, like the moments of Adam, is allocated once with
+    :meth:`allocate_state` during construction. :meth:`views` splits any of
+    the buffers into the per-parameter arrays, e.g. for per-parameter norms.
+
+    Before every update, the buffers are refreshed from the parameters, so
+    that changes made elsewhere, e.g. by restoring a checkpoint, are seen.
+    After it, the parameter buffer is written back to the parameters.
+
+    Example:
+        >>> class MySgd(FlatUserLearner):
+        ...     def update_flat(self, parameters, gradients,
+        ...                     training_sample_count, sweep_end):
+        ...         eta = self.learning_rate() / training_sample_count
+        ...         parameters -= eta * gradients
+        ...         return True
+        >>> w = C.parameter((2, 3), init=1)
+        >>> learner = MySgd([w], C.learning_rate_schedule(0.1, C.UnitType.sample))
+        >>> learner.parameter_buffer.shape
+        (6,)
+
+    Args:
+        parameters (list of parameters): the parameters updated by the
+         learner. They must all have the same data type.
+        lr_schedule (output of :func:`learning_rate_schedule`): learning rate
+         schedule
+    '''
+
+    def __init__(self, parameters, lr_schedule):
+        parameters = list(parameters)
+        dtypes = set(p.dtype for p in parameters)
+        if len(dtypes) > 1:
+            raise ValueError('all parameters of a FlatUserLearner must have '
+                             'the same data type, but got %s' %
+                             ', '.join(sorted(np.dtype(d).name for d in dtypes)))
+
+        super(FlatUserLearner, self).__init__(parameters, lr_schedule,
+                                              as_numpy=True)
+
+        self.parameter_list = parameters
+        self.dtype = dtypes.pop() if dtypes else np.float32
+        self._slices = []
+        offset = 0
+        for p in parameters:
+            size = int(np.prod(p.shape, dtype=np.int64))
+            self._slices.append((slice(offset, offset + size), p.shape))
+            offset += size
+
+        self.parameter_buffer = np.empty(offset, dtype=self.dtype)
+        self.gradient_buffer = np.zeros(offset, dtype=self.dtype)
+        self._parameter_views = self.views(self.parameter_buffer)
+        self._gradient_views = self.views(self.gradient_buffer)
+        for p, view in zip(self.parameter_list, self._parameter_views):
+            _copy_to_buffer(view, cntk_py.Parameter.value(p))
+
+    def views(self, buffer):
+        '''
+        Splits a flat buffer into arrays in the shapes of the parameters. The
+        arrays share the memory of the buffer.
+
+        Args:
+            buffer (NumPy array): one-dimensional array with as many elements
+             as :attr:`parameter_buffer`
+
+        Returns:
+            list of NumPy arrays in the order of :attr:`parameter_list`
+        '''
+        if buffer.shape != self.parameter_buffer.shape:
+            raise ValueError('buffer has shape %s, but the parameters need %s'
+                             % (buffer.shape, self.parameter_buffer.shape))
+        return [buffer[s].reshape(shape) for s, shape in self._slices]
+
+    def allocate_state(self, fill_value=0):
+        '''
+        Allocates a buffer for optimizer state with one element per parameter
+        element.
+
+        Args:
+            fill_value (float, default 0): initial value of the elements
+
+        Returns:
+            one-dimensional NumPy array like :attr:`parameter_buffer`
+        '''
+        return np.full(self.parameter_buffer.shape, fill_value,
+                       dtype=self.dtype)
+
+    def _update(self, gradient_values, training_sample_count, sweep_end):
+        map_if_possible(gradient_values)
+
+        for p, param_view, grad_view in zip(self.parameter_list,
+                                            self._parameter_views,
+                                            self._gradient_views):
+            _copy_to_buffer(param_view, cntk_py.Parameter.value(p))
+            if p in gradient_values:
+                _copy_to_buffer(grad_view, gradient_values[p])
+            else:
+                grad_view[...] = 0
+
+        result = self.update_flat(self.parameter_buffer, self.gradient_buffer,
+                                  training_sample_count, sweep_end)
+
+        for p, param_view in zip(self.parameter_list, self._parameter_views):
+            device = cntk_py.Parameter.value(p).device()
+            borrow = device.type() == DeviceKind.CPU
+            cntk_py.Parameter.set_value(p, NDArrayView.from_dense(
+                param_view, device=device, borrow=borrow))
+
+        return result
+
+    def update_flat(self, parameters, gradients, training_sample_count,
+                    sweep_end):
+        '''
+        Updates the parameters in place.
+
+        Args:
+            parameters (NumPy array): :attr:`parameter_buffer` with the
+             current values of all parameters, to be updated in place
+            gradients (NumPy array): :attr:`gradient_buffer` with the
+             gradients of all parameters w.r.t. the training objective
+            training_sample_count (int): number of samples in the minibatch
+            sweep_end (bool): if the data is fed by a conforming reader, this
+             indicates whether a full pass over the dataset has just occurred.
+
+        Returns:
+            bool: `False` to indicate that learning has stopped for all of the
+            parameters associated with this learner
+        '''
+        raise NotImplementedError('FlatUserLearner.update_flat must be '
+                                  'overriden')
+
+
 @typemap
 def training_parameter_schedule(schedule, unit, epoch_size=None):
     '''
@@ -851,11 +1021,112 @@ def rmsprop(parameters, lr,
                                    need_ave_multiplier, additional_options)
 
 
+def _size(variable):
+    return int(np.prod(variable.shape, dtype=np.int64))
+
+
+UpdateTiming = collections.namedtuple('UpdateTiming',
+                                      ['updates', 'total_time', 'last_time'])
+
+
+class _FusedUniversalLearner(UserLearner):
+    # Runs an update function of universal() once per data type on all
+    # parameters of that type, which are concatenated into one flat
+    # parameter. Every update runs three graphs per group: one copying the
+    # parameters into the flat parameter, the update itself, and one copying
+    # the slices of the updated flat parameter back. They cannot be combined
+    # into one graph, since the order of the assignments to the flat
+    # parameter within a graph is not defined.
+
+    def __init__(self, update_func, parameters):
+        from .. import ops
+
+        super(_FusedUniversalLearner, self).__init__(
+            parameters, learning_rate_schedule(1.0, UnitType.sample),
+            as_numpy=False)
+
+        groups = collections.OrderedDict()
+        for p in parameters:
+            groups.setdefault(np.dtype(p.dtype), []).append(p)
+
+        def flat(variables):
+            flattened = [ops.reshape(v, (_size(v),)) for v in variables]
+            if len(flattened) == 1:
+                return flattened[0]
+            return ops.splice(*flattened, axis=0)
+
+        self._gradients = []
+        self._groups = []
+        for dtype, params in groups.items():
+            gradients = [ops.constant(0, shape=p.shape, dtype=dtype,
+                                      name='grad') for p in params]
+            self._gradients.extend(zip(params, gradients))
+
+            size = sum(_size(p) for p in params)
+            device = cntk_py.Parameter.value(params[0]).device()
+            flat_parameter = ops.parameter((size,), init=0, dtype=dtype,
+                                           device=device,
+                                           name='fused_parameters')
+
+            load = ops.assign(flat_parameter, flat(params))
+            update = update_func(flat_parameter, flat(gradients))
+            stores = []
+            offset = 0
+            for p in params:
+                end = offset + _size(p)
+                stores.append(ops.assign(p, ops.reshape(
+                    ops.slice(flat_parameter, 0, offset, end), p.shape)))
+                offset = end
+            store = ops.combine(stores)
+            self._groups.append((load, update, store))
+
+        self._updates = 0
+        self._total_time = 0.0
+        self._last_time = 0.0
+
+    def _update(self, gradient_values, training_sample_count, sweep_end):
+        start = time.time()
+        map_if_possible(gradient_values)
+        for p, g in self._gradients:
+            g.value = gradient_values[p]
+        for graphs in self._groups:
+            for f in graphs:
+                f.eval(as_numpy=False)
+
+        self._last_time = time.time() - start
+        self._total_time += self._last_time
+        self._updates += 1
+        return True
+
+    def timing(self):
+        return UpdateTiming(self._updates, self._total_time, self._last_time)
+
+
 @typemap
-def universal(update_func, parameters):
+def universal(update_func, parameters, fuse=False):
     '''
     Creates a learner which uses a CNTK function to update the parameters.
 
+    By default, ``update_func`` is called once per parameter, and every step
+    runs one small update graph per parameter. With ``fuse=True``, the
+    parameters of each data type are concatenated into one flat parameter
+    and their gradients into one flat gradient, so that ``update_func`` is
+    called once per data type and builds a single update graph for all of
+    them. Every step then runs three graphs per data type: one copying the
+    parameters into the flat parameter, the update, and one copying the
+    updated values back into the parameters. The fused mode thus costs two
+    extra copies of every parameter per step, and the gradients are copied
+    into per-parameter constants before they are concatenated. It is still
+    considerably faster for models with many small parameter tensors, where
+    the number of graphs dominates, but not for models with a few large
+    ones. ``update_func`` sees one-dimensional tensors, so it has to update
+    every element independently of the shape of its parameter, as SGD,
+    momentum, AdaGrad or Adam do.
+
+    A fused learner has a method ``timing()``, which returns an
+    :class:`UpdateTiming` with the number of updates and the seconds spent in
+    all of them and in the last one.
+
     Args:
         update_func: function that takes a parameter and a gradient as arguments and
          returns a :class:`~cntk.ops.functions.Function` that performs the
@@ -865,6 +1136,9 @@ def universal(update_func, parameters):
          the parameters will not be updated.
         parameters (list): list of network parameters to tune.
          These can be obtained by the root operator's `parameters`.
+        fuse (bool, default False): whether to update all parameters of the
+         same data type with one flat update graph, at the cost of copying
+         them into and out of a flat parameter every step
 
     Returns:
         :class:`~cntk.learners.Learner`: learner instance that can be passed to
@@ -884,16 +1158,27 @@ def universal(update_func, parameters):
         >>> trainer = C.Trainer(z, loss, learner)
         >>> # now trainer can be used as any other Trainer
 
+        >>> learner = C.universal(my_adagrad, z.parameters, fuse=True)
+        >>> trainer = C.Trainer(z, loss, learner)
+        >>> learner.timing().updates
+        0
+
     '''
 
     from .. import constant
     args, _ = utils.get_python_function_arguments(update_func)
     if len(args) != 2:
         raise ValueError('update_func must be a function that accepts two arguments (parameter, gradient)')
-    updates = []
+    parameters = list(parameters)
     for p in parameters:
         if any(dim<0 for dim in p.shape):
             raise ValueError('parameter %s has inferred dimensions. Please create the learner after all parameter shapes have been determined'%str(p))
+
+    if fuse:
+        return _FusedUniversalLearner(update_func, parameters)
+
+    updates = []
+    for p in parameters:
         g = constant(0, shape=p.shape, dtype=p.dtype, name='grad')
         result = update_func(p, g)
         updates.append((g, result))
@@ -365,6 +365,41 @@ def test_universal():
     assert np.allclose(my_last_avg_error, builtin_last_avg_error)
     assert np.allclose(my_avg_error, builtin_avg_error)
 
+def test_universal_fused():
+    np.random.seed(98052)
+    builtin_sgd = lambda params: sgd(params, lr=learning_rate_schedule(0.125, UnitType.minibatch))
+    builtin_last_avg_error, builtin_avg_error = ffnet(builtin_sgd)
+    np.random.seed(98052)
+    my_sgd = lambda p, g: C.assign(p, p - 0.125/25 * g)
+    learners = []
+    def fused_sgd(params):
+        learners.append(universal(my_sgd, params, fuse=True))
+        return learners[-1]
+    my_last_avg_error, my_avg_error = ffnet(fused_sgd)
+    assert np.allclose(my_last_avg_error, builtin_last_avg_error)
+    assert np.allclose(my_avg_error, builtin_avg_error)
+
+    timing = learners[0].timing()
+    assert timing.updates == 100
+    assert 0 < timing.last_time <= timing.total_time
+
+def test_universal_fused_mixed_dtypes():
+    p32 = C.parameter((2, 3), init=1, dtype=np.float32)
+    p64 = C.parameter((4,), init=1, dtype=np.float64)
+    signatures = []
+    def my_sgd(p, g):
+        signatures.append((p.shape, p.dtype))
+        return C.assign(p, p - 0.5 * g)
+    learner = universal(my_sgd, [p32, p64], fuse=True)
+    assert sorted(signatures) == [((4,), np.float64), ((6,), np.float32)]
+
+    gradients = {
+        p32: C.NDArrayView.from_dense(np.arange(6, dtype=np.float32).reshape(2, 3)),
+        p64: C.NDArrayView.from_dense(np.ones(4, dtype=np.float64))}
+    assert learner._update(gradients, 1, False)
+    assert np.allclose(p32.value, 1 - 0.5 * np.arange(6).reshape(2, 3))
+    assert np.allclose(p64.value, 0.5)
+
 def test_0d_1d_parameter_set_value():
     x = C.input_variable(2)
     w_0d = C.parameter(())
@@ -378,3 +413,32 @@ def test_0d_1d_parameter_set_value():
     w_1d_grad = op.grad({x : np.asarray([1, 2], dtype=np.float32)}, wrt=[w_1d], as_numpy=False)
     w_1d.value = w_1d_grad.data
     assert np.array_equal(w_1d.value, [1., 1.])
+
+
+if __name__ == '__main__':
+    # Compares the per-step time of universal learners that update a model
+    # with 500 parameter tensors one by one and fused.
+    import timeit
+
+    def my_adagrad(p, g):
+        accumulator = C.constant(0, shape=p.shape, dtype=p.dtype)
+        accum_new = C.assign(accumulator, accumulator + g * g)
+        return C.assign(p, p - 0.01 * g / C.sqrt(accum_new + 1e-6))
+
+    x = C.input_variable(16)
+    params = [C.parameter((16,), init=C.glorot_uniform(seed=i))
+              for i in range(500)]
+    z = C.reduce_sum(C.splice(*[C.reduce_sum(x * p) for p in params]))
+    data = {x: np.random.randn(25, 16).astype(np.float32)}
+    steps = 100
+
+    for fuse in [False, True]:
+        learner = universal(my_adagrad, params, fuse=fuse)
+        trainer = C.Trainer(z, (z, None), [learner])
+        trainer.train_minibatch(data)
+        t = timeit.timeit(lambda: trainer.train_minibatch(data), number=steps)
+        print('fuse=%s: %.2f ms per step' % (fuse, 1000 * t / steps))
+        if fuse:
+            timing = learner.timing()
+            print('  of which update: %.2f ms' %
+                  (1000 * timing.total_time / timing.updates))
@@ -4,6 +4,9 @@
 # for full license information.
 # ==============================================================================
 
+import collections
+import io
+import json
 import os
 import sys
 from cntk.variables import Variable
@@ -27,12 +30,13 @@ def depth_first_search(root, visitor, depth=0):
     if depth == -1:
         depth = sys.maxsize
 
-    stack = [(root.root_function, depth)] # node
+    # the front of the deque is the top of the stack
+    stack = collections.deque([(root.root_function, depth)]) # node
     accum = []         # final result (list of all unique nodes)
     visited = set()    # [node.uid]
     
     while stack:
-        node, depth = stack.pop(0)
+        node, depth = stack.popleft()
         if node.uid in visited:
             continue
         from cntk import cntk_py
@@ -52,12 +56,12 @@ def depth_first_search(root, visitor, depth=0):
             # BlockFunctions are short-circuited, and not added to accum[]
         try:
             # Function node
-            stack = list((i, depth) for i in node.root_function.inputs) + stack
+            stack.extendleft(reversed([(i, depth) for i in node.root_function.inputs]))
         except AttributeError:
             # OutputVariable node
             try:
                 if node.is_output:
-                    stack.insert(0, (node.owner, depth))
+                    stack.appendleft((node.owner, depth))
                     visited.add(node.uid)
                     continue
             except AttributeError:
@@ -76,6 +80,147 @@ def depth_first_search(root, visitor, depth=0):
 
     return accum
 
+class GraphIndex(object):
+    '''
+    Index of the nodes of the graph starting at ``root``, built with one
+    :func:`depth_first_search`. Nodes are looked up by uid, name or
+    operation name in constant time, and the topological order is computed
+    once when it is first requested.
+
+    The index reflects the graph at the time it was built. Use
+    :func:`graph_index` to get a cached index that is rebuilt after
+    placeholders were replaced.
+
+    Args:
+        root (:class:`~cntk.ops.functions.Function` or :class:`~cntk.variables.Variable`): the root to start the journey from
+        depth (int, default 0): how deep into the block hierarchy the DFS
+         algorithm should go into. Set to -1 for infinite depth.
+    '''
+
+    def __init__(self, root, depth=0):
+        self.nodes = depth_first_search(root, lambda x: True, depth)
+        self._by_uid = {}
+        self._by_name = collections.defaultdict(list)
+        self._by_op_name = collections.defaultdict(list)
+        for node in self.nodes:
+            self._by_uid[node.uid] = node
+            self._by_name[node.name].append(node)
+            op_name = getattr(node, 'op_name', None)
+            if op_name is not None:
+                self._by_op_name[op_name].append(node)
+        self._topological_order = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, uid):
+        return uid in self._by_uid
+
+    def find_by_uid(self, uid):
+        '''
+        Returns the node with ``uid``, or None if it is not in the graph.
+        '''
+        return self._by_uid.get(uid)
+
+    def find_all_with_name(self, name):
+        '''
+        Returns the list of nodes with ``name`` in depth-first order.
+        '''
+        return list(self._by_name.get(name, ()))
+
+    def find_all_with_op_name(self, op_name):
+        '''
+        Returns the list of functions with the operation ``op_name`` (e.g.
+        ``'Times'``) in depth-first order.
+        '''
+        return list(self._by_op_name.get(op_name, ()))
+
+    def _dependencies(self, node):
+        # The nodes of the index that node takes as inputs. Outputs are
+        # represented by the functions owning them.
+        try:
+            inputs = node.inputs
+        except AttributeError:
+            return []
+        dependencies = []
+        for i in inputs:
+            uid = i.owner.uid if i.is_output else i.uid
+            if uid in self._by_uid:
+                dependencies.append(self._by_uid[uid])
+        return dependencies
+
+    def topological_order(self):
+        '''
+        Returns the nodes ordered such that every node comes after its
+        inputs. Edges that close a recurrent loop are ignored.
+        '''
+        if self._topological_order is None:
+            order = []
+            done = set()
+            in_progress = set()
+            for start in self.nodes:
+                stack = [(start, False)]
+                while stack:
+                    node, expanded = stack.pop()
+                    if node.uid in done:
+                        continue
+                    if expanded:
+                        in_progress.discard(node.uid)
+                        done.add(node.uid)
+                        order.append(node)
+                        continue
+                    if node.uid in in_progress:
+                        continue
+                    in_progress.add(node.uid)
+                    stack.append((node, True))
+                    stack.extend((dependency, False) for dependency in
+                                 reversed(self._dependencies(node))
+                                 if dependency.uid not in done)
+            self._topological_order = order
+        return list(self._topological_order)
+
+
+# Incremented whenever a graph is modified in place, which invalidates the
+# values cached on the graph objects.
+_graph_generation = [0]
+
+
+def graph_index(root, depth=0):
+    '''
+    Returns the :class:`GraphIndex` of the graph starting at ``root``. The
+    index is cached on the ``root`` object per depth and rebuilt after
+    placeholders in any graph were replaced.
+
+    Args:
+        root (:class:`~cntk.ops.functions.Function` or :class:`~cntk.variables.Variable`): the root to start the journey from
+        depth (int, default 0): how deep into the block hierarchy the DFS
+         algorithm should go into. Set to -1 for infinite depth.
+
+    Returns:
+        :class:`GraphIndex`
+    '''
+    return _cached_on_graph(root, ('graph_index', depth),
+                            lambda: GraphIndex(root, depth))
+
+
+def _cached_on_graph(owner, key, factory):
+    # Caches factory() on the Python object owner until a graph is modified
+    # in place. Unlike a cache keyed by uid, this keeps apart two graphs
+    # loaded from the same model, which have the same uids, and does not
+    # keep graphs alive.
+    cache = getattr(owner, '_graph_cache', None)
+    if cache is None or cache[0] != _graph_generation[0]:
+        cache = (_graph_generation[0], {})
+        owner._graph_cache = cache
+    if key not in cache[1]:
+        cache[1][key] = factory()
+    return cache[1][key]
+
+
+def _clear_graph_indices():
+    # Called when a graph is modified in place.
+    _graph_generation[0] += 1
+
 def find_all_with_name(node, node_name, depth=0):
     '''
     Finds functions in the graph starting from ``node`` and doing a depth-first
@@ -94,8 +239,7 @@ def find_all_with_name(node, node_name, depth=0):
         :func:`~cntk.ops.functions.Function.find_all_with_name` in class
         :class:`~cntk.ops.functions.Function`.
     '''
-    return depth_first_search(node, lambda x: x.name == node_name,
-                              depth)
+    return graph_index(node, depth).find_all_with_name(node_name)
 
 def find_by_name(node, node_name, depth=0):
     '''
@@ -120,8 +264,7 @@ def find_by_name(node, node_name, depth=0):
         raise ValueError('node name has to be a string. You gave '
                          'a %s' % type(node_name))
 
-    result = depth_first_search(node, lambda x: x.name == node_name,
-                                depth)
+    result = graph_index(node, depth).find_all_with_name(node_name)
 
     if len(result) > 1:
         raise ValueError('found multiple functions matching "%s". '
@@ -181,7 +324,7 @@ def plot(root, filename=None):
 
     root = root.root_function
     root_uid = root.uid
-    stack = [root]
+    stack = collections.deque([root])
     visited = set() # [uid] instead of node object itself, as this gives us duplicate entries for nodes with multiple outputs
 
     primitive_op_map = {
@@ -212,7 +355,7 @@ def plot(root, filename=None):
         return '"#dyn: %i\nstatic: %s"'%(num_dyn_axes, static_shape)
 
     while stack:
-        node = stack.pop(0)
+        node = stack.popleft()
 
         if node.uid in visited:
             continue
@@ -221,7 +364,7 @@ def plot(root, filename=None):
             # Function node
             node = node.root_function
 
-            stack = list(node.root_function.inputs) + stack
+            stack.extendleft(reversed(node.root_function.inputs))
 
             # add current Function node
             def lazy_create_node(node):
@@ -323,7 +466,7 @@ def plot(root, filename=None):
             # OutputVariable node
             try:
                 if node.is_output:
-                    stack.insert(0, node.owner)
+                    stack.appendleft(node.owner)
             except AttributeError:
                 pass
 
@@ -344,6 +487,282 @@ def plot(root, filename=None):
     return model
 
 
+_ExportNode = collections.namedtuple('_ExportNode',
+                                     ['id', 'label', 'kind', 'inputs',
+                                      'signature'])
+
+
+def _leaf_kind(var):
+    if var.is_input:
+        return 'input'
+    if var.is_placeholder:
+        return 'placeholder'
+    if var.is_parameter:
+        return 'parameter'
+    if var.is_constant:
+        return 'constant'
+    return 'output'
+
+
+def _export_nodes(root, depth):
+    # Walks the graph like depth_first_search and returns the functions to
+    # draw, the leaf variables by uid and (id, label, producer id) of the
+    # outputs. Blocks within ``depth`` are
+    # replaced by their content: their arguments are redirected to the
+    # variables they are bound to, and their outputs to the outputs of their
+    # composite. Inputs are (id, is_state) pairs, where state inputs are
+    # parameters and constants.
+    from cntk import cntk_py
+    if depth == -1:
+        depth = sys.maxsize
+    root_depth = depth
+
+    bound = {}  # argument uid -> (variable bound to it, its depth)
+
+    def producer(var, depth):
+        # the id of the node drawn for what produces var
+        while True:
+            if var.uid in bound:
+                var, depth = bound[var.uid]
+            elif var.is_output:
+                owner = var.owner
+                if not (owner.is_block and depth > 0):
+                    return owner.uid
+                index = [o.uid for o in owner.outputs].index(var.uid)
+                var = owner.block_root.outputs[index]
+                depth -= 1
+            else:
+                return var.uid
+
+    functions = []
+    leaves = {}
+    visited = set()
+    stack = collections.deque([(root.root_function, depth)])
+    while stack:
+        node, depth = stack.popleft()
+        if node.uid in visited:
+            continue
+        visited.add(node.uid)
+
+        if not isinstance(node, cntk_py.Function):
+            if node.is_output:
+                stack.appendleft((node.owner, depth))
+            elif node.uid not in bound:
+                kind = _leaf_kind(node)
+                label = '%s%s\n%s' % (kind.capitalize(),
+                                      ' ' + node.name if node.name else '',
+                                      node.shape)
+                leaves[node.uid] = (label, kind)
+            continue
+
+        if node.is_block and depth > 0:
+            for argument, variable in node.block_arguments_mapping:
+                bound[argument.uid] = (variable, depth)
+                stack.append((variable, depth))
+            stack.append((node.block_root.root_function, depth - 1))
+            continue
+
+        inputs = []
+        state_shapes = []
+        for i in node.inputs:
+            # constants inside blocks are private to them, as in plot()
+            if node.is_block and i.is_constant:
+                continue
+            is_state = i.is_parameter or i.is_constant
+            if is_state:
+                state_shapes.append(i.shape)
+            inputs.append((producer(i, depth), is_state))
+        stack.extendleft(reversed([(i, depth) for i in node.inputs]))
+
+        label = node.op_name + ('\n' + node.name if node.name else '')
+        # repeated blocks are recognized by their operation and the shapes
+        # of their parameters
+        signature = (node.op_name, tuple(state_shapes),
+                     tuple(o.shape for o in node.outputs)) \
+            if node.is_block else None
+        functions.append(_ExportNode(node.uid, label, 'function', inputs,
+                                     signature))
+
+    outputs = root.outputs if isinstance(root, cntk_py.Function) else [root]
+    return functions, leaves, [
+        (o.uid, 'Output%s\n%s' % (' ' + o.name if o.name else '', o.shape),
+         producer(o, root_depth)) for o in outputs]
+
+
+def _collapse_repeats(functions, outputs, min_repeats):
+    # Replaces chains of at least min_repeats blocks with the same signature,
+    # each feeding only the next one, by a single node. The node has the id
+    # of the last block of the chain and the data inputs of the first one.
+    # Outputs of the graph count as consumers, so that a block they refer to
+    # is only collapsed if it is the last of its chain.
+    by_id = dict((f.id, f) for f in functions)
+    consumers = collections.Counter(i for f in functions
+                                    for i in set(i for i, _ in f.inputs))
+    consumers.update(producer for _, _, producer in outputs)
+    previous = {}
+    for f in functions:
+        data = [i for i, is_state in f.inputs if not is_state]
+        if f.signature is None or len(data) != 1 or data[0] not in by_id:
+            continue
+        p = by_id[data[0]]
+        if p.signature == f.signature and consumers[p.id] == 1:
+            previous[f.id] = p.id
+
+    has_next = set(previous.values())
+    chains = {}
+    collapsed = set()
+    for last in previous:
+        if last in has_next:
+            continue
+        chain = [last]
+        while chain[-1] in previous:
+            chain.append(previous[chain[-1]])
+        if len(chain) >= max(min_repeats, 2):
+            chains[last] = chain
+            collapsed.update(chain)
+
+    result = []
+    for f in functions:
+        if f.id in chains:
+            chain = chains[f.id]
+            first = by_id[chain[-1]]
+            result.append(_ExportNode(
+                f.id, '%s x %i' % (f.signature[0], len(chain)), 'repeated',
+                [i for i in first.inputs if not i[1]], f.signature))
+        elif f.id not in collapsed:
+            result.append(f)
+    return result
+
+
+class _DotWriter(object):
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    @staticmethod
+    def _quote(text):
+        return json.dumps(text, ensure_ascii=False)
+
+    def begin(self):
+        self.stream.write('digraph network_graph {\n'
+                          '  rankdir=TB;\n'
+                          '  node [shape=box, style=filled, '
+                          'fillcolor=lightgray, fontsize=12];\n')
+
+    def node(self, node_id, label, kind, inputs):
+        attributes = {'function': '', 'repeated': ', penwidth=4',
+                      'input': ', shape=egg', 'placeholder': ', shape=egg',
+                      'output': ', shape=egg', 'parameter': ', fillcolor=green',
+                      'constant': ', fillcolor=lightblue'}[kind]
+        lines = ['  %s [label=%s%s];\n' % (self._quote(node_id),
+                                           self._quote(label), attributes)]
+        lines.extend('  %s -> %s;\n' % (self._quote(i), self._quote(node_id))
+                     for i in inputs)
+        self.stream.write(''.join(lines))
+
+    def end(self):
+        self.stream.write('}\n')
+
+
+class _JsonWriter(object):
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.separator = '\n'
+
+    def begin(self):
+        self.stream.write('{"nodes": [')
+
+    def node(self, node_id, label, kind, inputs):
+        self.stream.write(self.separator + json.dumps(
+            {'id': node_id, 'label': label, 'kind': kind, 'inputs': inputs}))
+        self.separator = ',\n'
+
+    def end(self):
+        self.stream.write('\n]}\n')
+
+
+def export_graph(root, output, format=None, depth=0, min_repeats=2):
+    '''
+    Writes the graph starting at ``root`` in the DOT format of
+    `graphviz <http://graphviz.org>`_ or as JSON. In contrast to
+    :func:`plot`, the output is written node by node without pydot, so that
+    it scales to very large models.
+
+    Blocks (e.g. layers) deeper than ``depth`` are drawn as one node. Chains
+    of at least ``min_repeats`` blocks with the same operation and parameter
+    shapes, each feeding only the next one (e.g. built with
+    :func:`~cntk.layers.For` or :func:`~cntk.layers.Sequential`), are drawn as
+    one node labeled with the number of blocks. Parameters and constants of
+    those blocks are omitted.
+
+    The JSON output is an object with the list ``nodes``. Every node has an
+    ``id``, a ``label``, a ``kind`` (``'function'``, ``'repeated'``,
+    ``'input'``, ``'parameter'``, ...) and the list of the ids of its
+    ``inputs``.
+
+    Example:
+        >>> import io
+        >>> x = C.input_variable(3, name='x')
+        >>> z = C.layers.For(range(10), lambda: C.layers.Dense(3))(x)
+        >>> stream = io.StringIO()
+        >>> export_graph(z, stream)
+        3
+        >>> 'Dense x 10' in stream.getvalue()
+        True
+
+    Args:
+        root (:class:`~cntk.ops.functions.Function` or :class:`~cntk.variables.Variable`): the root of the graph
+        output (str or file-like object): file name or text stream to write
+         to
+        format (str, default None): ``'dot'`` or ``'json'``. If None, it is
+         derived from the suffix of the file name, and streams get DOT.
+        depth (int, default 0): how deep into the block hierarchy the graph
+         is drawn. Set to -1 for infinite depth.
+        min_repeats (int or None, default 2): minimum number of repeated
+         blocks that are collapsed into one node. If None, no blocks are
+         collapsed.
+
+    Returns:
+        int: the number of nodes written
+    '''
+    if format is None:
+        format = 'json' if isinstance(output, str) and \
+            os.path.splitext(output)[1].lower() == '.json' else 'dot'
+    if format not in ('dot', 'json'):
+        raise ValueError('format must be "dot" or "json", but got "%s"'
+                         % format)
+
+    functions, leaves, outputs = _export_nodes(root, depth)
+    if min_repeats is not None:
+        functions = _collapse_repeats(functions, outputs, min_repeats)
+
+    if isinstance(output, str):
+        stream = io.open(output, 'w', encoding='utf-8')
+    else:
+        stream = output
+    try:
+        writer = (_DotWriter if format == 'dot' else _JsonWriter)(stream)
+        writer.begin()
+        written = set()
+        for f in functions:
+            inputs = [i for i, _ in f.inputs]
+            for i in inputs:
+                # leaves are written when they are first used
+                if i in leaves and i not in written:
+                    written.add(i)
+                    writer.node(i, leaves[i][0], leaves[i][1], [])
+            writer.node(f.id, f.label, f.kind, inputs)
+        for output_id, label, producer_id in outputs:
+            writer.node(output_id, label, 'output', [producer_id])
+        writer.end()
+    finally:
+        if stream is not output:
+            stream.close()
+
+    return len(functions) + len(written) + len(outputs)
+
+
 def get_node_outputs(node, depth=0):
     '''
     Walks through every node of the graph starting at ``node``
@@ -355,9 +774,8 @@ def get_node_outputs(node, depth=0):
     Returns:
         A list of all node outputs
     '''
-    node_list = depth_first_search(node, lambda x: True, depth)
     node_outputs = []
-    for node in node_list:
+    for node in graph_index(node, depth).nodes:
         try:
             for out in node.outputs:
                 node_outputs.append(out)
@@ -199,3 +199,205 @@ def test_depth_first_search_blocks(depth, prefix_count):
     assert len(found) == sum(prefix_count.values())
     for prefix, count in prefix_count.items():
         assert sum(f.startswith(prefix) for f in found_str) == count
+
+
+def test_graph_index():
+    d = _simple_dict()
+    index = C.logging.graph.graph_index(d['all'])
+    assert index is C.logging.graph.graph_index(d['all'])
+
+    assert [v.name for v in index.nodes] == ['all', 'op2', 'op1', 'i1', 'c1',
+                                              'p1', 'minus', 'label', 'c2']
+    assert index.find_by_uid(d['p1'].uid).name == 'p1'
+    assert d['i1'].uid in index
+    assert index.find_by_uid('unknown') is None
+    assert [v.name for v in index.find_all_with_name('c2')] == ['c2']
+    assert index.find_all_with_name('none') == []
+
+    order = [v.uid for v in index.topological_order()]
+    assert len(order) == len(index)
+    for node in index.nodes:
+        try:
+            inputs = node.inputs
+        except AttributeError:
+            continue
+        for i in inputs:
+            uid = i.owner.uid if i.is_output else i.uid
+            assert order.index(uid) < order.index(node.uid)
+    assert order[-1] == d['all'].uid
+
+
+def test_graph_index_of_loaded_models(tmpdir):
+    filename = str(tmpdir / 'model.dnn')
+    x = C.input_variable(2, name='x')
+    C.layers.Dense(2, name='dense')(x).save(filename)
+
+    # loaded models keep their uids, but their indices are separate
+    z1 = C.load_model(filename)
+    z2 = C.load_model(filename)
+    assert z1.uid == z2.uid
+    assert C.logging.graph.graph_index(z1) is \
+        C.logging.graph.graph_index(z1)
+    assert C.logging.graph.graph_index(z1) is not \
+        C.logging.graph.graph_index(z2)
+
+    w1 = C.logging.graph.find_by_name(z1, 'W')
+    w2 = C.logging.graph.find_by_name(z2, 'W')
+    w2.value = np.ones(w2.shape, dtype=np.float32)
+    assert np.array_equal(C.logging.graph.find_by_name(z2, 'W').value,
+                          np.ones(w2.shape))
+    assert not np.array_equal(w1.value, np.ones(w1.shape))
+
+
+def test_graph_index_recurrence():
+    x = C.sequence.input_variable(2, name='x')
+    p = C.placeholder()
+    h = C.plus(x, C.sequence.past_value(p), name='h')
+    index = C.logging.graph.graph_index(h)
+    assert index.find_all_with_name('x')
+
+    h.replace_placeholders({p: h.output})
+    index = C.logging.graph.graph_index(h)
+    order = index.topological_order()
+    assert sorted(v.uid for v in order) == sorted(v.uid for v in index.nodes)
+    assert [v.name for v in order].index('x') < \
+        [v.name for v in order].index('h')
+
+
+def test_export_graph_json(tmpdir):
+    import json
+    d = _simple_dict()
+    filename = str(tmpdir / 'graph.json')
+    count = C.logging.graph.export_graph(d['all'], filename)
+
+    with open(filename) as f:
+        nodes = json.load(f)['nodes']
+    assert len(nodes) == count
+    by_id = dict((n['id'], n) for n in nodes)
+    op1 = by_id[d['op1'].root_function.uid]
+    assert op1['kind'] == 'function' and op1['label'] == 'Plus\nop1'
+    assert sorted(by_id[i]['kind'] for i in op1['inputs']) == \
+        ['constant', 'input']
+    assert sum(n['kind'] == 'output' for n in nodes) == 2
+
+
+def test_export_graph_collapses_repeats():
+    import io
+    import json
+    x = C.input_variable(4, name='x')
+    dense = C.layers.For(range(5), lambda: C.layers.Dense(4))(x)
+    z = C.layers.Dense(2)(dense)
+
+    def export(**kwargs):
+        stream = io.StringIO()
+        C.logging.graph.export_graph(z, stream, format='json', **kwargs)
+        return json.loads(stream.getvalue())['nodes']
+
+    labels = [n['label'] for n in export() if n['kind'] == 'repeated']
+    assert labels == ['Dense x 5']
+    # only the parameters of the last layer are drawn
+    assert sum(n['kind'] == 'parameter' for n in export()) == 2
+
+    labels = [n['label'] for n in export(min_repeats=None)]
+    assert labels.count('Dense') == 6
+
+    # expanded blocks show the functions inside them
+    labels = [n['label'] for n in export(depth=1, min_repeats=None)]
+    assert 'Dense' not in labels and labels.count('Times') == 6
+
+    stream = io.StringIO()
+    C.logging.graph.export_graph(z, stream)
+    dot = stream.getvalue()
+    assert dot.startswith('digraph') and 'Dense x 5' in dot
+
+    with pytest.raises(ValueError):
+        C.logging.graph.export_graph(z, stream, format='svg')
+
+
+def test_export_graph_keeps_repeated_outputs():
+    import io
+    import json
+    x = C.input_variable(4, name='x')
+    h = x
+    layers = []
+    for _ in range(5):
+        h = C.layers.Dense(4)(h)
+        layers.append(h)
+    # the third layer is an output as well as the input of the fourth one
+    root = C.combine([layers[2], layers[4]])
+
+    stream = io.StringIO()
+    C.logging.graph.export_graph(root, stream, format='json')
+    nodes = json.loads(stream.getvalue())['nodes']
+    ids = set(n['id'] for n in nodes)
+    for n in nodes:
+        assert all(i in ids for i in n['inputs'])
+    labels = sorted(n['label'] for n in nodes if n['kind'] == 'repeated')
+    assert labels == ['Dense x 2', 'Dense x 3']
+
+
+if __name__ == '__main__':
+    # Compares a depth-first search and repeated lookups by name on a chain
+    # of 25k operations (50k nodes with their constants) with and without
+    # the cached index. Then times exporting a ResNet.
+    import sys
+    import timeit
+    sys.setrecursionlimit(100000)
+
+    x = C.input_variable(1, name='x')
+    z = x
+    for i in range(25000):
+        z = C.plus(z, C.constant(1, name='c%i' % i), name='op%i' % i)
+    names = ['op%i' % i for i in range(0, 25000, 2500)]
+
+    def search():
+        C.logging.graph.depth_first_search(z, lambda n: True)
+
+    def find_uncached():
+        for name in names:
+            C.logging.graph.depth_first_search(z, lambda n: n.name == name)
+
+    def find_cached():
+        for name in names:
+            C.logging.graph.find_by_name(z, name)
+
+    print('depth_first_search:    %.3fs' % min(timeit.repeat(
+        search, number=1, repeat=3)))
+    print('10 lookups, uncached:  %.3fs' % min(timeit.repeat(
+        find_uncached, number=1, repeat=3)))
+    print('10 lookups, cached:    %.3fs' % min(timeit.repeat(
+        find_cached, number=1, repeat=3)))
+    print('topological_order:     %.3fs' % timeit.timeit(
+        lambda: C.logging.graph.GraphIndex(z).topological_order(), number=1))
+
+    # Times exporting a ResNet with 100 convolutions, with its residual
+    # units collapsed and fully expanded, and plot() if pydot is installed.
+    import io
+    from cntk.layers import Convolution, BatchNormalization, For, \
+        BlockFunction
+
+    def residual_unit():
+        conv1 = Convolution((3, 3), 16, pad=True, activation=C.relu)
+        conv2 = Convolution((3, 3), 16, pad=True)
+        bn1, bn2 = BatchNormalization(), BatchNormalization()
+
+        @BlockFunction('ResidualUnit', 'residual_unit')
+        def unit(x):
+            return C.relu(x + bn2(conv2(bn1(conv1(x)))))
+        return unit
+
+    image = C.input_variable((16, 32, 32), name='image')
+    resnet = For(range(50), residual_unit)(image)
+
+    for name, export in [
+            ('export_graph', lambda: C.logging.graph.export_graph(
+                resnet, io.StringIO())),
+            ('export_graph (depth=-1)', lambda: C.logging.graph.export_graph(
+                resnet, io.StringIO(), depth=-1, min_repeats=None))]:
+        print('%-24s %.3fs' % (name, timeit.timeit(export, number=1)))
+    try:
+        print('%-24s %.3fs' % ('plot', timeit.timeit(
+            lambda: C.logging.graph.plot(resnet, 'resnet.dot'), number=1)))
+    except ImportError:
+        # plot() requires pydot_ng
+        pass
@@ -2,10 +2,11 @@ from os import path
 from enum import Enum, unique
 import warnings
 import collections
+import numpy as np
 
 import cntk
 from cntk import cntk_py, Value
-from cntk.device import DeviceDescriptor, cpu
+from cntk.device import DeviceDescriptor, DeviceKind, cpu
 from cntk.internal import map_if_possible, typemap, sanitize_var_map,\
                           sanitize_batch, sanitize_dtype_cntk, _as_tuple,\
                           sanitize_variable_value_dict,\
@@ -16,7 +17,7 @@ from cntk.internal.utils import get_python_function_arguments, \
                                 map_function_arguments, _py_dict_to_cntk_dict, \
                                 _to_cntk_dict_value
 from cntk.internal import _UDFDeserializeCallbackWrapper, _serialize
-from cntk.internal.sanitize import is_byte_buffer
+from cntk.internal.sanitize import is_byte_buffer, is_string
 from ..variables import Record, Variable
 
 
@@ -560,9 +561,12 @@ class Function(cntk_py.Function):
     @typemap
     def constants(self):
         '''
-        List of all `Constant` variables of this :class:`~cntk.ops.functions.Function`
+        List of all `Constant` variables of this :class:`~cntk.ops.functions.Function`.
+        The list is cached until placeholders are replaced.
         '''
-        return super(Function, self).constants()
+        from cntk.logging.graph import _cached_on_graph
+        return list(_cached_on_graph(
+            self, 'constants', lambda: super(Function, self).constants()))
 
     def eval(self, arguments=None, outputs=None, device=None, as_numpy=True):
         '''
@@ -626,6 +630,84 @@ class Function(cntk_py.Function):
         _, output_map = self.forward(arguments, outputs, device=device, as_numpy=as_numpy)
         return sanitize_variable_value_dict(output_map)
 
+    def bind(self, inputs=None, outputs=None, device=None, as_numpy=True):
+        '''
+        Resolves the inputs, outputs and device of repeated evaluations once
+        and returns a :class:`BoundFunction`, which takes the input data as
+        positional arguments and evaluates the Function with less Python
+        overhead per call than :meth:`eval`. This matters for small batches,
+        e.g. when serving single samples.
+
+        Example:
+            >>> x = C.input_variable(2, name='x')
+            >>> y = C.input_variable(2, name='y')
+            >>> f = C.plus(x, 10 * y)
+            >>> evaluate = f.bind(['y', 'x'])
+            >>> evaluate(np.asarray([[1, 2]], dtype=np.float32),
+            ...          np.asarray([[3, 4]], dtype=np.float32))
+            array([[ 13.,  24.]], dtype=float32)
+
+        Args:
+            inputs (list, optional): the argument variables of the Function or
+             their names, in the order in which the data is passed. If not
+             set, the order of :attr:`arguments` is used. Every argument has to
+             be given exactly once.
+            outputs (iterable, optional): outputs to fetch values for. If not
+             set, all outputs of the function will be fetched.
+            device (:class:`~cntk.device.DeviceDescriptor`, default `None`): the
+             device on which the computation is performed. If `None`, the
+             default device at the time of binding is used.
+            as_numpy (bool): whether to return the results as NumPy arrays. If
+             False, temporary Value objects are returned as in :meth:`eval`.
+
+        Returns:
+            :class:`BoundFunction`
+        '''
+        return BoundFunction(self, inputs, outputs, device, as_numpy)
+
+    def bind_buffers(self, max_batch_size, inputs=None, outputs=None,
+                     sequence_length=None, output_buffers=None, device=None):
+        '''
+        Like :meth:`bind`, but additionally allocates NumPy buffers for the
+        inputs and outputs of batches up to ``max_batch_size`` once. The
+        returned :class:`BufferedFunction` evaluates the data written into
+        its input buffers and writes the results into its output buffers,
+        without allocating new Values or arrays once every batch size has
+        been used.
+
+        Example:
+            >>> x = C.input_variable(2)
+            >>> f = C.plus(x, 1)
+            >>> evaluate = f.bind_buffers(max_batch_size=4)
+            >>> evaluate.input_buffers[0][:2] = [[1, 2], [3, 4]]
+            >>> evaluate.run(2)
+            array([[ 2.,  3.],
+                   [ 4.,  5.]], dtype=float32)
+
+        Args:
+            max_batch_size (int): maximum number of samples or sequences of a
+             batch
+            inputs (list, optional): the argument variables of the Function or
+             their names, in the order of the input buffers
+            outputs (iterable, optional): outputs to fetch values for. If not
+             set, all outputs of the function will be fetched.
+            sequence_length (int, optional): length of all sequences of the
+             inputs and outputs with a sequence axis. It is required if there
+             are such variables.
+            output_buffers (list of NumPy arrays, optional): arrays of shape
+             ``(max_batch_size,) + output.shape`` (with the sequence length
+             after the batch axis for sequence outputs) and the data type of
+             the respective output to write the results to. If not set, they
+             are allocated.
+            device (:class:`~cntk.device.DeviceDescriptor`, default `None`): the
+             device on which the computation is performed
+
+        Returns:
+            :class:`BufferedFunction`
+        '''
+        return BufferedFunction(self, max_batch_size, inputs, outputs,
+                                sequence_length, output_buffers, device)
+
     @typemap
     def forward(self, arguments, outputs=None, keep_for_backward=None, device=None, as_numpy=True):
         '''
@@ -955,9 +1037,12 @@ class Function(cntk_py.Function):
     @typemap
     def parameters(self):
         '''
-        List of all parameter variables of this function.
+        List of all parameter variables of this function. The list is cached
+        until placeholders are replaced.
         '''
-        return super(Function, self).parameters()
+        from cntk.logging.graph import _cached_on_graph
+        return list(_cached_on_graph(
+            self, 'parameters', lambda: super(Function, self).parameters()))
 
     @property
     @typemap
@@ -1044,6 +1129,8 @@ class Function(cntk_py.Function):
         substitutions = substitutions or {}
         if not isinstance(substitutions, dict):
             raise TypeError("Variable substitution map must be a dictionary")
+        from cntk.logging.graph import _clear_graph_indices
+        _clear_graph_indices()
         return super(Function, self).replace_placeholders(substitutions)
 
     @typemap
@@ -1061,6 +1148,8 @@ class Function(cntk_py.Function):
 
         :raises Exception: when the function has multiple placeholders.
         '''
+        from cntk.logging.graph import _clear_graph_indices
+        _clear_graph_indices()
         return super(Function, self).replace_placeholder(substitution)
 
     @typemap
@@ -1133,6 +1222,47 @@ class Function(cntk_py.Function):
         from cntk.logging import graph
         return graph.find_by_name(self, name, depth)
 
+    @typemap
+    def find_all_with_op_name(self, op_name, depth=0):
+        '''
+        Returns a list of primitive functions with the operation ``op_name``
+        in the graph starting from this node.
+
+        Example:
+            >>> a = C.input_variable(shape=1)
+            >>> c = C.plus(C.plus(a, 1), 2)
+            >>> len(c.find_all_with_op_name('Plus'))
+            2
+
+        Args:
+            op_name (str): operation name to look for, e.g. ``'Times'``
+            depth (int, default 0): how deep into the block hierarchy the DFS
+             algorithm should go into. Set to -1 for infinite depth.
+
+        Returns:
+            list of :class:`Function` objects with operation ``op_name``
+        '''
+        from cntk.logging import graph
+        return graph.graph_index(self, depth).find_all_with_op_name(op_name)
+
+    @typemap
+    def find_by_uid(self, uid, depth=0):
+        '''
+        Returns the function or variable with ``uid`` in the graph starting
+        from this node, or None if there is none.
+
+        Args:
+            uid (str): uid to look for
+            depth (int, default 0): how deep into the block hierarchy the DFS
+             algorithm should go into. Set to -1 for infinite depth.
+
+        Returns:
+            :class:`Function` or :class:`~cntk.variables.Variable` with
+            ``uid``
+        '''
+        from cntk.logging import graph
+        return graph.graph_index(self, depth).find_by_uid(uid)
+
     @typemap
     def save(self, filename):
         '''
@@ -1221,6 +1351,230 @@ class Function(cntk_py.Function):
         
         raise ValueError('Cannot load a model that is neither a file nor a byte buffer.')
 
+class BoundFunction(object):
+    '''
+    Callable returned by :meth:`Function.bind`, which evaluates a Function
+    with pre-resolved input variables, outputs and device.
+
+    Calling it with one batch per input returns the value of the single
+    output, or a tuple with the values of all outputs in the bound order.
+    The batches can be given in any form that :meth:`Function.eval` accepts
+    for a single input, except with sequence start flags. NumPy arrays of
+    the input's data type are copied into a Value directly, without further
+    checks.
+    '''
+
+    def __init__(self, function, inputs=None, outputs=None, device=None,
+                 as_numpy=True):
+        arguments = function.arguments
+        if inputs is None:
+            inputs = arguments
+
+        names = collections.Counter(arg.name for arg in arguments)
+        resolved = []
+        for var in inputs:
+            if is_string(var):
+                if names[var] == 0:
+                    raise ValueError('variable with name "%s" does not exist '
+                                     'in the network. Available variable '
+                                     'names: %s' % (var, ", ".join(names)))
+                if names[var] > 1:
+                    raise ValueError('node name "%s" is not unique' % var)
+                var = next(arg for arg in arguments if arg.name == var)
+            resolved.append(var)
+
+        if len(resolved) != len(arguments) or \
+                set(resolved) != set(arguments):
+            raise ValueError('every argument of the function has to be bound '
+                             'exactly once, expected %s' %
+                             ', '.join(str(arg) for arg in arguments))
+
+        if outputs is None:
+            outputs = function.outputs
+        else:
+            outputs = sanitize_variables_or_functions(outputs)
+
+        self.function = function
+        self.inputs = tuple(resolved)
+        self.outputs = tuple(outputs)
+        self.device = device or DeviceDescriptor.use_default_device()
+        self.as_numpy = as_numpy
+        self._dtypes = tuple(var.dtype for var in self.inputs)
+
+    def __call__(self, *batches):
+        from cntk.io import MinibatchData
+        if len(batches) != len(self.inputs):
+            raise ValueError('expected %i batches, but got %i'
+                             % (len(self.inputs), len(batches)))
+
+        device = self.device
+        in_var_map = {}
+        for var, dtype, batch in zip(self.inputs, self._dtypes, batches):
+            if isinstance(batch, np.ndarray) and batch.dtype == dtype and \
+                    batch.flags.c_contiguous:
+                batch = cntk_py.Value(
+                    cntk_py.NDArrayView(batch, device, False, False))
+            elif isinstance(batch, MinibatchData):
+                batch = batch.data
+            elif not isinstance(batch, cntk_py.Value):
+                batch = sanitize_batch(var, batch, None, device)
+            in_var_map[var] = batch
+
+        output_map = dict.fromkeys(self.outputs)
+        cntk_py.Function._forward(self.function, in_var_map, output_map,
+                                  device, set())
+
+        results = [output_map[var] for var in self.outputs]
+        if self.as_numpy:
+            results = [_value_as_sequence_or_array(value, var)
+                       for value, var in zip(results, self.outputs)]
+        return results[0] if len(results) == 1 else tuple(results)
+
+
+# The Values of one batch size of a BufferedFunction. views keeps the
+# NumPy views alive that the NDArrayViews borrow.
+_BufferBinding = collections.namedtuple(
+    '_BufferBinding', ['in_var_map', 'output_map', 'copies_in', 'copies_out',
+                       'results', 'views'])
+
+
+class BufferedFunction(BoundFunction):
+    '''
+    Callable returned by :meth:`Function.bind_buffers`, which evaluates a
+    Function on persistent input and output buffers.
+
+    Write the data of a batch of ``n`` samples or sequences into
+    ``input_buffers[i][:n]`` and call :meth:`run`, or pass the batches to the
+    instance like to a :class:`BoundFunction`, which copies them into the
+    buffers first. The results are views of the first ``n`` entries of
+    ``output_buffers`` and are overwritten by the next evaluation.
+
+    The Values that wrap the buffers are created once per batch size; the
+    number of created Values and NDArrayViews is counted in
+    :attr:`allocations`, so steady state serving can be checked for being
+    free of allocations.
+    '''
+
+    def __init__(self, function, max_batch_size, inputs=None, outputs=None,
+                 sequence_length=None, output_buffers=None, device=None):
+        super(BufferedFunction, self).__init__(function, inputs, outputs,
+                                               device, as_numpy=True)
+        if max_batch_size < 1:
+            raise ValueError('max_batch_size must be positive')
+
+        self.max_batch_size = max_batch_size
+        self.sequence_length = sequence_length
+        self.input_buffers = tuple(
+            np.zeros(self._buffer_shape(var), dtype=var.dtype)
+            for var in self.inputs)
+
+        output_vars = [o.output if isinstance(o, cntk_py.Function) else o
+                       for o in self.outputs]
+        if output_buffers is None:
+            output_buffers = [np.zeros(self._buffer_shape(var),
+                                       dtype=var.dtype)
+                              for var in output_vars]
+        elif len(output_buffers) != len(output_vars):
+            raise ValueError('expected %i output buffers, but got %i'
+                             % (len(output_vars), len(output_buffers)))
+        for var, buf in zip(output_vars, output_buffers):
+            if not isinstance(buf, np.ndarray) or \
+                    buf.shape != self._buffer_shape(var) or \
+                    buf.dtype != var.dtype or not buf.flags.c_contiguous:
+                raise ValueError('the output buffer of %s must be a C '
+                                 'contiguous array of shape %s and type %s'
+                                 % (var, self._buffer_shape(var),
+                                    np.dtype(var.dtype).name))
+        self.output_buffers = tuple(output_buffers)
+
+        self.allocations = 0
+        self._bindings = {}
+
+    def _buffer_shape(self, var):
+        num_dynamic_axes = len(var.dynamic_axes)
+        if num_dynamic_axes == 1:
+            return (self.max_batch_size,) + var.shape
+        if num_dynamic_axes == 2 and self.sequence_length is not None:
+            return (self.max_batch_size, self.sequence_length) + var.shape
+        raise ValueError('%s needs a batch axis and, if it has a sequence '
+                         'axis, the sequence_length' % var)
+
+    def _view(self, buf, batch_size):
+        # Returns (view of the buffer, NDArrayView on the device, NDArrayView
+        # borrowing the buffer if the device is not the CPU)
+        view = buf[:batch_size]
+        host = cntk_py.NDArrayView(view, cpu(), False, True)
+        self.allocations += 1
+        if self.device.type() == DeviceKind.CPU:
+            return view, host, None
+
+        data = cntk_py.NDArrayView(view, self.device, False, False)
+        self.allocations += 1
+        return view, data, host
+
+    def _binding(self, batch_size):
+        binding = self._bindings.get(batch_size)
+        if binding is not None:
+            return binding
+
+        if not 0 < batch_size <= self.max_batch_size:
+            raise ValueError('batch size must be between 1 and %i'
+                             % self.max_batch_size)
+
+        inputs = [self._view(buf, batch_size) for buf in self.input_buffers]
+        outputs = [self._view(buf, batch_size) for buf in self.output_buffers]
+        in_var_map = dict((var, cntk_py.Value(data))
+                          for var, (_, data, _) in zip(self.inputs, inputs))
+        output_map = dict((var, cntk_py.Value(data))
+                          for var, (_, data, _) in zip(self.outputs, outputs))
+        self.allocations += len(in_var_map) + len(output_map)
+
+        # NDArrayViews that copy the buffers from and to the device
+        copies_in = [(data, host) for _, data, host in inputs
+                     if host is not None]
+        copies_out = [(host, data) for _, data, host in outputs
+                      if host is not None]
+        results = [view for view, _, _ in outputs]
+        results = results[0] if len(results) == 1 else tuple(results)
+        binding = _BufferBinding(in_var_map, output_map, copies_in,
+                                 copies_out, results, inputs + outputs)
+        self._bindings[batch_size] = binding
+        return binding
+
+    def run(self, batch_size):
+        '''
+        Evaluates the first ``batch_size`` entries of the input buffers.
+
+        Args:
+            batch_size (int): number of samples or sequences of the batch
+
+        Returns:
+            views of the first ``batch_size`` entries of the output buffers,
+            a single one if there is only one output and a tuple otherwise
+        '''
+        binding = self._binding(batch_size)
+        for target, source in binding.copies_in:
+            target.copy_from(source)
+        # forward copies the results into the given output Values
+        cntk_py.Function._forward(self.function, binding.in_var_map,
+                                  binding.output_map, self.device, set())
+        for target, source in binding.copies_out:
+            target.copy_from(source)
+        return binding.results
+
+    def __call__(self, *batches):
+        if len(batches) != len(self.inputs):
+            raise ValueError('expected %i batches, but got %i'
+                             % (len(self.inputs), len(batches)))
+
+        batch_size = len(batches[0]) if batches else 1
+        for buf, batch in zip(self.input_buffers, batches):
+            if len(batch) != batch_size:
+                raise ValueError('all batches must have the same size')
+            buf[:batch_size] = batch
+        return self.run(batch_size)
+
+
 @typemap
 def register_native_user_function(op_id, module_name, factory_method_name):
     '''
@@ -1271,6 +1625,29 @@ def load_model(model, device=None):
     '''
     return Function.load(model, device)
 
+def _value_as_view(value, var):
+    # Returns the padded data of a dense Value on the CPU as a read-only NumPy
+    # array that shares its memory. Other Values are copied.
+    data = cntk_py.Value.data(value)
+    if data.is_sparse():
+        return _value_as_sequence_or_array(value, var)
+    if data.device().type() != DeviceKind.CPU:
+        return data.to_ndarray()
+    view = data.as_numpy_view()
+    view.flags.writeable = False
+    return view
+
+
+def _buffer_as_value(buffer, mask, device):
+    # Returns a Value of the NumPy buffer, which it borrows on the CPU.
+    from cntk.core import NDArrayView
+    borrow = device.type() == DeviceKind.CPU
+    ndav = NDArrayView.from_dense(buffer, device=device, borrow=borrow)
+    if mask is None:
+        return cntk_py.Value(ndav)
+    return cntk_py.Value(ndav, mask)
+
+
 class UserFunction(Function):
     '''
     Base class of all user extension functions.
@@ -1278,18 +1655,49 @@ class UserFunction(Function):
     If it has only one output, one can invoke Variable methods on it, which it
     will relay to its only output.
 
+    With ``zero_copy=True``, dense data on the CPU is not copied between
+    CNTK and NumPy:
+
+     * :meth:`forward` is always called as ``forward(arguments, outputs,
+       device, outputs_to_retain)``. The arguments are read-only NumPy views
+       of the input Values, padded to the longest sequence, i.e. of shape
+       ``(batch size, sequence length) + input shape`` for inputs with a
+       sequence axis. ``outputs`` maps every output to a NumPy array of the
+       same layout, which :meth:`forward` writes its results into. It
+       returns only the state.
+     * :meth:`backward` is always called as ``backward(state,
+       root_gradients, variables)``. ``root_gradients`` are read-only views,
+       and ``variables`` maps every input to a zeroed NumPy array for its
+       gradient.
+
+    The output arrays take their batch and sequence axes, as well as the
+    mask, from the first input with the same dynamic axes, so sequence
+    starts are preserved. The masks of the arguments of the current call
+    are available as :attr:`argument_masks`. The arrays are reused between
+    calls, and the views are only valid during the call. Other devices and
+    sparse data are copied.
+
     Args:
         inputs (list): inputs to this function
         as_numpy (bool, optional): whether the data should be automatically
          converted from and to NumPy. Defaults to True. Specifying this as
          `False` passes the data as CNTK Value objects.
         name (str): name of this function
+        zero_copy (bool, optional): whether NumPy arrays sharing the memory
+         of the Values are passed instead of copies, as described above.
+         Defaults to False.
     '''
 
-    def __init__(self, inputs, as_numpy=True, name=''):
+    def __init__(self, inputs, as_numpy=True, name='', zero_copy=False):
+        if zero_copy and not as_numpy:
+            raise ValueError('zero_copy requires as_numpy')
         super(UserFunction, self).__init__(inputs, name)
         self.set_native(False)
         self.as_numpy = as_numpy
+        self.zero_copy = zero_copy
+        self._buffers = {}
+        self._layout_sources = {}
+        self._argument_values = ()
 
         # Since the state will frequently not be used, we cache the None-state
         # to speed up.
@@ -1325,21 +1733,25 @@ class UserFunction(Function):
         Returns:
              A BackPropState instance, which is used by :func:`backward`.
         '''
-        if self.as_numpy:
-            inputs = self.inputs
-            arguments = tuple(_value_as_sequence_or_array(v, inputs[i]) for i, v in enumerate(arguments))
+        if self.zero_copy:
+            state = self._forward_zero_copy(arguments, outputs, device,
+                                            outputs_to_retain)
+        else:
+            if self.as_numpy:
+                inputs = self.inputs
+                arguments = tuple(_value_as_sequence_or_array(v, inputs[i]) for i, v in enumerate(arguments))
 
-        map_if_possible(outputs)
-        map_if_possible(outputs_to_retain)
+            map_if_possible(outputs)
+            map_if_possible(outputs_to_retain)
 
-        args = arguments if len(arguments)>1 else arguments[0]
+            args = arguments if len(arguments)>1 else arguments[0]
 
-        if len(outputs) <= 1:
-            state, result = self.forward(args, device, outputs_to_retain)
-            for k in outputs:
-                outputs[k] = result
-        else:
-            state = self.forward(args, outputs, device, outputs_to_retain)
+            if len(outputs) <= 1:
+                state, result = self.forward(args, device, outputs_to_retain)
+                for k in outputs:
+                    outputs[k] = result
+            else:
+                state = self.forward(args, outputs, device, outputs_to_retain)
 
         if isinstance(state, cntk_py.BackPropState):
             self._state_wrapped = False
@@ -1350,7 +1762,7 @@ class UserFunction(Function):
             else:
                 state = cntk_py.UserBackPropState.create(self, device, state)
 
-        if self.as_numpy:
+        if self.as_numpy and not self.zero_copy:
             for k,v in outputs.items():
                 if v is None:
                     raise ValueError('not all outputs have been provided')
@@ -1360,6 +1772,106 @@ class UserFunction(Function):
 
         return state, outputs
 
+    @property
+    def argument_masks(self):
+        '''
+        The masks of the arguments of the current :meth:`forward` call in
+        zero-copy mode, as described in :attr:`~cntk.core.Value.mask`, or
+        None for arguments without a mask.
+        '''
+        masks = []
+        for value in self._argument_values:
+            mask = cntk_py.Value.mask(value)
+            masks.append(None if mask is None else mask.to_ndarray())
+        return tuple(masks)
+
+    def _buffer(self, var, kind, shape):
+        # Returns an array for the outputs or gradients of var, which is
+        # reused by the following calls with the same shape.
+        key = (var.uid, kind)
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.zeros(shape, dtype=var.dtype)
+            self._buffers[key] = buffer
+        elif kind == 'gradient':
+            buffer.fill(0)
+        return buffer
+
+    def _layout_source(self, var):
+        # The index of the first input with the dynamic axes of var
+        if var.uid not in self._layout_sources:
+            dynamic_axes = var.dynamic_axes
+            source = next((i for i, input in enumerate(self.inputs)
+                           if input.dynamic_axes == dynamic_axes), None)
+            if source is None and dynamic_axes:
+                raise ValueError('zero_copy requires an input with the '
+                                 'dynamic axes of output (uid "%s")' % var.uid)
+            self._layout_sources[var.uid] = source
+        return self._layout_sources[var.uid]
+
+    def _forward_zero_copy(self, arguments, outputs, device,
+                           outputs_to_retain):
+        self._argument_values = arguments
+        inputs = self.inputs
+        views = tuple(_value_as_view(v, inputs[i])
+                      for i, v in enumerate(arguments))
+
+        map_if_possible(outputs)
+        map_if_possible(outputs_to_retain)
+
+        buffers = {}
+        masks = {}
+        for k in outputs:
+            i = self._layout_source(k)
+            if i is None:
+                dynamic_shape, masks[k] = (), None
+            else:
+                shape = cntk_py.Value.shape(arguments[i]).dimensions()
+                dynamic_shape = shape[:len(k.dynamic_axes)]
+                masks[k] = cntk_py.Value.mask(arguments[i])
+            buffers[k] = self._buffer(k, 'output', tuple(dynamic_shape) +
+                                      k.shape)
+
+        args = views if len(views) > 1 else views[0]
+        state = self.forward(args, buffers, device, outputs_to_retain)
+
+        for k, buffer in buffers.items():
+            outputs[k] = _buffer_as_value(buffer, masks[k], device)
+
+        # The shapes and masks of the arguments are kept in the state, since
+        # other calls may happen before the backward pass of this one.
+        layouts = []
+        for value in arguments:
+            mask = cntk_py.Value.mask(value)
+            layouts.append((tuple(cntk_py.Value.shape(value).dimensions()),
+                            None if mask is None else mask.deep_clone()))
+        return state, tuple(layouts)
+
+    def _backward_zero_copy(self, state, root_gradients, variables, device):
+        state, layouts = state
+        map_if_possible(root_gradients)
+        for v, gradient in root_gradients.items():
+            if gradient is not None:
+                root_gradients[v] = _value_as_view(gradient, v)
+
+        if len(root_gradients) == 1:
+            for rg in root_gradients.values():
+                break
+            root_gradients = rg
+
+        map_if_possible(variables)
+        index = dict((var.uid, i) for i, var in enumerate(self.inputs))
+        buffers = {}
+        for k in variables:
+            shape, _ = layouts[index[k.uid]]
+            buffers[k] = self._buffer(k, 'gradient', shape)
+
+        self.backward(state, root_gradients, buffers)
+
+        for k, buffer in buffers.items():
+            _, mask = layouts[index[k.uid]]
+            variables[k] = _buffer_as_value(buffer, mask, device)
+
     def _backward(self, state, root_gradients, variables):
         '''
         Backpropagates supplied ``root_gradients`` for one or more of the output
@@ -1384,7 +1896,7 @@ class UserFunction(Function):
         '''
         device = state.device()
 
-        if self.as_numpy:
+        if self.as_numpy and not self.zero_copy:
             map_if_possible(root_gradients)
             for v in root_gradients:
                 if v.needs_gradient:
@@ -1396,6 +1908,10 @@ class UserFunction(Function):
         if self._state_wrapped:
             state = cntk_py.UserBackPropState.data(state)
 
+        if self.zero_copy:
+            self._backward_zero_copy(state, root_gradients, variables, device)
+            return
+
         map_if_possible(variables)
 
         if len(root_gradients) == 1:
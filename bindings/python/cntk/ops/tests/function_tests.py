@@ -540,3 +540,178 @@ def test_clone_with_different_dynamic_axes():
 
     rnn = C.layers.Recurrence(C.layers.LSTM(5))(question_input)
     rnn_cloned = rnn.clone(C.CloneMethod.share, {question_input:answer_input})
+
+
+def test_bind(device_id):
+    dev = cntk_device(device_id)
+    x = C.input_variable(2, name='x')
+    s = C.sequence.input_variable(2, name='s')
+    f = C.combine([C.plus(x, 10 * C.sequence.first(s)), C.sequence.last(s)])
+    evaluate = f.bind(['s', x], device=dev)
+
+    x_data = AA([[1, 2], [3, 4]], dtype=np.float32)
+    s_data = [AA([[1, 1], [2, 2]], dtype=np.float32),
+              AA([[3, 3]], dtype=np.float32)]
+    result = evaluate(s_data, x_data)
+    expected = f.eval({x: x_data, s: s_data}, device=dev)
+
+    assert len(result) == 2
+    for value, output in zip(result, f.outputs):
+        assert np.array_equal(value, expected[output])
+
+    # the same bound function can be called again with other data
+    result = evaluate(s_data[::-1], x_data[::-1])
+    assert np.array_equal(result[0], [[33, 34], [11, 12]])
+
+    single = f.bind([x, s], outputs=f.outputs[1], device=dev)
+    assert np.array_equal(single(x_data, s_data), expected[f.outputs[1]])
+
+
+def test_bind_errors():
+    x = C.input_variable(2, name='x')
+    y = C.input_variable(2, name='x')
+    z = C.input_variable(2, name='z')
+    f = C.plus(x, y) + z
+
+    with pytest.raises(ValueError):
+        f.bind(['x', y, z])
+    with pytest.raises(ValueError):
+        f.bind(['a', y, z])
+    with pytest.raises(ValueError):
+        f.bind([x, y])
+    with pytest.raises(ValueError):
+        f.bind([x, y, y])
+
+    evaluate = f.bind([z, x, y])
+    with pytest.raises(ValueError):
+        evaluate(AA([[1, 2]], dtype=np.float32))
+
+
+def test_bind_buffers(device_id):
+    dev = cntk_device(device_id)
+    x = C.input_variable(2)
+    s = C.sequence.input_variable(3)
+    f = C.combine([C.plus(x, 1), C.sequence.reduce_sum(s) * 2, s + 1])
+    out = [np.zeros((4, 2), dtype=np.float32), None, None]
+    with pytest.raises(ValueError):
+        f.bind_buffers(4, [x, s], device=dev)
+    with pytest.raises(ValueError):
+        f.bind_buffers(4, [x, s], sequence_length=2, output_buffers=out,
+                       device=dev)
+
+    out[1] = np.zeros((4, 3), dtype=np.float32)
+    out[2] = np.zeros((4, 2, 3), dtype=np.float32)
+    evaluate = f.bind_buffers(4, [x, s], sequence_length=2,
+                              output_buffers=out, device=dev)
+    assert evaluate.input_buffers[0].shape == (4, 2)
+    assert evaluate.input_buffers[1].shape == (4, 2, 3)
+
+    x_data = np.arange(6, dtype=np.float32).reshape(3, 2)
+    s_data = np.arange(18, dtype=np.float32).reshape(3, 2, 3)
+    evaluate.input_buffers[0][:3] = x_data
+    evaluate.input_buffers[1][:3] = s_data
+    result = evaluate.run(3)
+    assert result[0].base is out[0]
+    assert np.array_equal(out[0][:3], x_data + 1)
+    assert np.array_equal(out[1][:3], s_data.sum(axis=1) * 2)
+    assert np.array_equal(out[2][:3], s_data + 1)
+
+    # after every batch size has been seen once, nothing is allocated
+    for batch_size in [1, 3, 1]:
+        result = evaluate(x_data[:batch_size], s_data[:batch_size])
+        assert np.array_equal(result[0], x_data[:batch_size] + 1)
+    allocations = evaluate.allocations
+    for batch_size in [3, 1, 3]:
+        evaluate(x_data[:batch_size], s_data[:batch_size])
+    assert evaluate.allocations == allocations
+
+    with pytest.raises(ValueError):
+        evaluate.run(5)
+
+
+def test_find_by_op_name_and_uid():
+    x = C.input_variable(2, name='x')
+    h = C.layers.Dense(3, name='h')(x)
+    z = C.times(h, C.parameter((3, 2), name='W'), name='z')
+
+    assert [f.name for f in z.find_all_with_op_name('Times')] == ['z']
+    assert len(z.find_all_with_op_name('Times', depth=-1)) == 2
+    assert z.find_all_with_op_name('Convolution') == []
+    assert z.find_by_uid(x.uid).name == 'x'
+    assert z.find_by_uid(h.uid, depth=-1) is not None
+    assert z.find_by_uid('unknown') is None
+
+
+def test_cached_graph_queries_after_replace_placeholders():
+    p = C.placeholder()
+    z = C.times(p, C.parameter((2, 2), name='W1'), name='z')
+    assert [w.name for w in z.parameters] == ['W1']
+    assert z.find_by_name('x') is None
+
+    x = C.input_variable(2, name='x')
+    y = C.times(x, C.parameter((2, 2), name='W2'))
+    z.replace_placeholders({p: y.output})
+    assert sorted(w.name for w in z.parameters) == ['W1', 'W2']
+    assert z.find_by_name('x').name == 'x'
+
+    # the cached lists are not shared with the caller
+    z.parameters.pop()
+    assert len(z.parameters) == 2
+
+
+def test_parameters_of_loaded_models(tmpdir):
+    model_file = str(tmpdir / 'dense.model')
+    C.layers.Dense(2, name='dense')(C.input_variable(3)).save(model_file)
+    z1 = C.load_model(model_file)
+    z2 = C.load_model(model_file)
+    assert z1.uid == z2.uid
+
+    assert [p.uid for p in z1.parameters] == [p.uid for p in z2.parameters]
+    z2.parameters[0].value = np.ones(z2.parameters[0].shape, np.float32)
+    z2.parameters[1].value = np.ones(z2.parameters[1].shape, np.float32)
+    assert not np.all(z1.parameters[0].value == 1)
+    assert not np.all(z1.parameters[1].value == 1)
+
+
+if __name__ == '__main__':
+    # Compares the latency of evaluating a small network for single samples
+    # with eval(), a bound function and a bound function with buffers. Then
+    # compares repeated graph queries with and without the cached index.
+    import timeit
+    x = C.input_variable(16, name='x')
+    f = C.layers.Sequential([C.layers.Dense(32, activation=C.relu),
+                             C.layers.Dense(4)])(x)
+    sample = np.random.rand(1, 16).astype(np.float32)
+    evaluate = f.bind()
+    buffered = f.bind_buffers(max_batch_size=1)
+    buffered.input_buffers[0][:] = sample
+
+    for name, call in [('eval (dict)', lambda: f.eval({x: sample})),
+                       ('eval (by name)', lambda: f.eval({'x': sample})),
+                       ('bind', lambda: evaluate(sample)),
+                       ('bind_buffers', lambda: buffered.run(1))]:
+        print('%-16s %.1f us' % (name, 1e6 *
+              min(timeit.repeat(call, number=1000, repeat=3)) / 1000))
+
+    # Compares looking up parameters and named layers of a deep model in a
+    # loop, as fine-tuning code does, with an empty and a warm cache.
+    from cntk.logging.graph import _clear_graph_indices
+    deep = C.layers.For(range(200), lambda i: C.layers.Dense(
+        16, activation=C.relu, name='layer%i' % i))(x)
+
+    def lookups():
+        for i in range(0, 200, 20):
+            deep.find_by_name('layer%i' % i)
+            len(deep.parameters)
+
+    def uncached_lookups():
+        for i in range(0, 200, 20):
+            _clear_graph_indices()
+            deep.find_by_name('layer%i' % i)
+            _clear_graph_indices()
+            len(deep.parameters)
+
+    for name, call in [('lookups (uncached)', uncached_lookups),
+                       ('lookups (cached)', lookups)]:
+        print('%-20s %.3f ms' % (name, 1e3 *
+              min(timeit.repeat(call, number=10, repeat=3)) / 10))
@@ -5,7 +5,6 @@
 # ==============================================================================
 
 import warnings
-from scipy import sparse
 
 class TensorOpsMixin(object):
     '''
@@ -209,28 +208,16 @@ class ArrayMixin(object):
                               'conversion.')
 
         if is_sparse:
-            from cntk.internal.sanitize import _sparse_to_dense_network_cache
+            from cntk.core import _sparse_to_csr
 
-            device = ndav.device
-            if callable(device):
-                device = device()
+            shape = ndav.shape
+            if callable(shape):
+                shape = shape().dimensions()
+            if len(shape) > 2:
+                raise ValueError('Cannot convert a sparse NDArrayView or Value object '
+                                 'with shape %s of rank > 2 to a scipy.csr matrix.' % str(shape))
 
-            network = _sparse_to_dense_network_cache(ndav.shape[1:], False,
-                                                     device)
-            warnings.warn('converting Value object to CSR format might be slow')
-
-            dense_data = network.eval(self, device=device)
-
-            def to_csr(dense_data):
-                if len(dense_data.shape) > 2:
-                    raise ValueError('Cannot convert a sparse NDArrayView or Value object '
-                                     'with shape %s of rank > 2 to a scipy.csr matrix.' % str(dense_data.shape))
-                return sparse.csr_matrix(dense_data)
-
-            if isinstance(dense_data, list):
-                result = [to_csr(d) for d in dense_data]
-            else:
-                result = to_csr(dense_data)
+            result = _sparse_to_csr(ndav)
 
         else:
             result = ndav.to_ndarray()
@@ -3,6 +3,7 @@
 # for full license information.
 # ==============================================================================
 
+import warnings
 import pytest
 import numpy as np
 import scipy.sparse as sparse
@@ -257,3 +258,273 @@ def test_is_valid(device_id):
     g2 = b.grad({a:a0}, as_numpy=False)
     assert (g.is_valid == False)
     assert (g2.is_valid == True)
+
+
+@pytest.mark.parametrize("lengths, seq_starts", [
+    (None, None),
+    ([3, 1, 2], None),
+    (None, [True, False, True]),
+    ([2, 3, 3], [False, True, True]),
+])
+def test_value_from_padded(device_id, lengths, seq_starts):
+    dev = cntk_device(device_id)
+    x = C.sequence.input_variable((2,))
+    data = np.arange(18, dtype=np.float32).reshape(3, 3, 2)
+
+    value = C.Value.from_padded(x, data, lengths, seq_starts, device=dev)
+    sequences = [data[i, :length] for i, length in
+                 enumerate(lengths if lengths is not None else [3] * 3)]
+    expected = C.Value.create(x, sequences, seq_starts, device=dev)
+
+    assert np.array_equal(value.mask, expected.mask)
+    result = value.as_sequences(x)
+    for seq, expected_seq in zip(result, sequences):
+        assert np.array_equal(seq, expected_seq)
+
+
+def test_value_from_padded_errors():
+    x = C.sequence.input_variable((2,))
+    data = np.zeros((2, 3, 2), dtype=np.float32)
+    with pytest.raises(ValueError):
+        C.Value.from_padded(C.input_variable((2,)), data[:, 0])
+    with pytest.raises(ValueError):
+        C.Value.from_padded(x, np.zeros((2, 3, 4), dtype=np.float32))
+    with pytest.raises(ValueError):
+        C.Value.from_padded(x, data, lengths=[1, 4])
+
+
+@pytest.mark.parametrize("num_classes, sequences, seq_starts", [
+    (5, [[1, 4, 0], [2], [3, 3]], None),
+    (5, [[1, C.Value.ONE_HOT_SKIP], [2, 0]], [True, False]),
+    ((2, 5), [[1, 4, 0, 2], [3, 3]], None),
+])
+def test_value_one_hot_from_offsets(device_id, num_classes, sequences,
+                                    seq_starts):
+    dev = cntk_device(device_id)
+    flat = [i for s in sequences for i in s]
+    offsets = np.cumsum([0] + [len(s) for s in sequences])
+    expected = C.Value.one_hot(sequences, num_classes, seq_starts, device=dev)
+
+    # skipped indices are -1 in signed arrays and ONE_HOT_SKIP in unsigned ones
+    signed_ids = np.asarray([-1 if i == C.Value.ONE_HOT_SKIP else i
+                             for i in flat], dtype=np.int32)
+    for ids in [signed_ids, np.asarray(flat, dtype=np.uint64)]:
+        value = C.Value.one_hot_from_offsets(ids, offsets, num_classes,
+                                             seq_starts, device=dev)
+
+        assert value.shape == expected.shape
+        assert np.array_equal(value.mask, expected.mask)
+        for seq, expected_seq in zip(_to_dense(value, True),
+                                     _to_dense(expected, True)):
+            assert np.array_equal(seq, expected_seq)
+
+
+def test_value_one_hot_from_offsets_errors():
+    ids = np.asarray([1, 2, 3], dtype=np.int32)
+    with pytest.raises(ValueError):
+        C.Value.one_hot_from_offsets(ids.astype(np.float32), [0, 3], 5)
+    with pytest.raises(ValueError):
+        C.Value.one_hot_from_offsets(ids, [0, 0, 3], 5)
+    with pytest.raises(ValueError):
+        C.Value.one_hot_from_offsets(ids, [0, 3], (2, 5))
+    with pytest.raises(ValueError):
+        C.Value.one_hot_from_offsets(ids, [0, 3], 3)
+    with pytest.raises(ValueError):
+        C.Value.one_hot_from_offsets(-ids, [0, 3], 5)
+    # indices that an int32 cannot hold are not wrapped around
+    for dtype in [np.int64, np.uint64]:
+        with pytest.raises(ValueError):
+            C.Value.one_hot_from_offsets(
+                np.asarray([1, 2**32 + 2, 3], dtype=dtype), [0, 3], 5)
+
+
+@pytest.mark.parametrize("sample_shape", [(5,), (2, 5)])
+def test_sparse_value_as_sequences(device_id, sample_shape):
+    dev = cntk_device(device_id)
+    ids = np.asarray([1, 4, 0, 2, 3, 3], dtype=np.int32)
+    offsets = [0, 4, 6]
+    value = C.Value.one_hot_from_offsets(ids, offsets, sample_shape,
+                                         device=dev)
+    x = C.sequence.input_variable(sample_shape, is_sparse=True)
+
+    result = value.as_sequences(x)
+    assert len(result) == 2
+    for seq, begin, end in zip(result, offsets[:-1], offsets[1:]):
+        assert sparse.isspmatrix_csr(seq)
+        assert np.array_equal(seq.toarray(), np.eye(5)[ids[begin:end]])
+
+
+def test_sparse_ndarrayview_asarray():
+    data = csr([[1, 0, 2], [0, 0, 0], [5, 0, 1]], dtype=np.float64)
+    ndav = C.NDArrayView.from_csr(data, device=C.cpu())
+    result = ndav.asarray()
+    assert sparse.isspmatrix_csr(result)
+    assert result.dtype == np.float64
+    assert np.array_equal(result.toarray(), data.toarray())
+
+
+@pytest.mark.parametrize("lengths", [None, [3, 1, 2]])
+def test_value_as_padded_and_flat(device_id, lengths):
+    dev = cntk_device(device_id)
+    x = C.sequence.input_variable((2,))
+    data = np.arange(1, 19, dtype=np.float32).reshape(3, 3, 2)
+    value = C.Value.from_padded(x, data, lengths, device=dev)
+    expected = value.as_sequences(x)
+
+    padded, seq_lengths = value.as_padded(x, pad_value=-1)
+    assert seq_lengths.tolist() == [len(seq) for seq in expected]
+    for seq, length, expected_seq in zip(padded, seq_lengths, expected):
+        assert np.array_equal(seq[:length], expected_seq)
+        assert (seq[length:] == -1).all()
+
+    values, offsets = value.as_flat(x)
+    assert offsets.tolist() == [0] + np.cumsum(seq_lengths).tolist()
+    assert np.array_equal(values, np.concatenate(expected))
+
+    with pytest.raises(ValueError):
+        value.as_flat(C.input_variable((2,)))
+
+
+def test_sparse_value_as_flat(device_id):
+    dev = cntk_device(device_id)
+    ids = np.asarray([1, 4, 0, 2, 3, 3], dtype=np.int32)
+    value = C.Value.one_hot_from_offsets(ids, [0, 4, 6], (2, 5), device=dev)
+
+    values, offsets = value.as_flat()
+    assert sparse.isspmatrix_csr(values)
+    assert offsets.tolist() == [0, 4, 6]
+    assert np.array_equal(values.toarray(), np.eye(5)[ids])
+    with pytest.raises(ValueError):
+        value.as_padded()
+
+
+def test_value_create_converts_batch(device_id):
+    dev = cntk_device(device_id)
+    x = C.sequence.input_variable((2,))
+    sequences = [np.arange(6, dtype=np.float64).reshape(3, 2),
+                 np.arange(2, dtype=np.float64).reshape(1, 2)]
+
+    previous = C.set_conversion_warning_policy('never')
+    try:
+        value = C.Value.create(x, sequences, device=dev)
+    finally:
+        C.set_conversion_warning_policy(previous)
+    converted = value.as_sequences(x)
+    assert all(s.dtype == np.float32 for s in converted)
+    assert [s.tolist() for s in converted] == [s.tolist() for s in sequences]
+
+    with pytest.raises(ValueError):
+        C.Value.create(x, [np.zeros((3, 4), dtype=np.float32)], device=dev)
+
+
+def test_conversion_plans_are_cached_by_uid():
+    from cntk.core import _conversion_plans
+    x = C.sequence.input_variable((2,))
+    C.Value.create(x, [np.zeros((2, 2), dtype=np.float32)])
+    # the cache does not keep the variables alive
+    assert x.uid in _conversion_plans
+    assert not any(isinstance(key, C.Variable)
+                   for key in _conversion_plans._entries)
+    # helpers of cntk.core are not exported by the cntk package
+    assert not hasattr(C, 'LRUCache')
+
+
+def test_conversion_warning_policy():
+    x = C.sequence.input_variable((2,))
+    y = C.sequence.input_variable((2,))
+    data = [np.zeros((2, 2), dtype=np.float64)]
+
+    def count_warnings(var, times):
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            for _ in range(times):
+                C.Value.create(var, data)
+        return len(w)
+
+    previous = C.set_conversion_warning_policy('once')
+    try:
+        assert count_warnings(x, 3) == 1
+        assert count_warnings(x, 3) == 0
+        assert count_warnings(y, 2) == 1
+
+        C.set_conversion_warning_policy('always')
+        assert count_warnings(x, 3) == 3
+
+        C.set_conversion_warning_policy('never')
+        assert count_warnings(x, 3) == 0
+
+        with pytest.raises(ValueError):
+            C.set_conversion_warning_policy('sometimes')
+    finally:
+        C.set_conversion_warning_policy(previous)
+
+
+if __name__ == '__main__':
+    # Compares creating a Value from 1000 sequences of 100 steps, given as a
+    # list of arrays to Value.create (also of float64, which is converted)
+    # and as one array to Value.from_padded,
+    # and creating one-hot Values for 50k tokens of a 100k vocabulary from
+    # lists and from a flat array of ids. Then compares converting one-hot
+    # Values back to CSR matrices through a dense network (which needs a
+    # dense identity matrix of the vocabulary size) and directly, and the
+    # dense Value back to a list of sequences, a padded and a flat array.
+    import timeit
+    x = C.sequence.input_variable((8,))
+    data = np.random.rand(1000, 100, 8).astype(np.float32)
+    sequences = list(data)
+    lengths = np.full(1000, 100)
+    lengths[::10] = 50
+
+    sequences64 = [s.astype(np.float64) for s in sequences]
+    C.set_conversion_warning_policy('never')
+
+    for name, create in [
+            ('Value.create', lambda: C.Value.create(x, sequences)),
+            ('Value.create (float64)',
+             lambda: C.Value.create(x, sequences64)),
+            ('Value.from_padded', lambda: C.Value.from_padded(x, data)),
+            ('Value.from_padded (masked)',
+             lambda: C.Value.from_padded(x, data, lengths))]:
+        print('%-28s %.3f ms' % (name, 1000 *
+              min(timeit.repeat(create, number=10, repeat=3)) / 10))
+
+    vocab_size = 100000
+    token_ids = np.random.randint(0, vocab_size, 50000).astype(np.int32)
+    offsets = np.arange(0, 50001, 50)
+    offsets[1:-1] -= np.random.randint(0, 25, 999)
+    token_sequences = [token_ids[b:e].tolist() for b, e in
+                       zip(offsets[:-1], offsets[1:])]
+
+    for name, create in [
+            ('Value.one_hot', lambda: C.Value.one_hot(
+                token_sequences, vocab_size)),
+            ('Value.one_hot_from_offsets', lambda: C.Value.one_hot_from_offsets(
+                token_ids, offsets, vocab_size))]:
+        print('%-28s %.3f ms' % (name, 1000 *
+              min(timeit.repeat(create, number=10, repeat=3)) / 10))
+
+    from cntk.internal.sanitize import _sparse_to_dense_network_cache
+
+    def to_csr_through_dense(value, vocab_size):
+        network = _sparse_to_dense_network_cache((vocab_size,), True, C.cpu())
+        return [sparse.csr_matrix(seq) for seq in network.eval(value)]
+
+    for vocab_size in [1000, 200000]:
+        sparse_x = C.sequence.input_variable(vocab_size, is_sparse=True)
+        value = C.Value.one_hot_from_offsets(token_ids % vocab_size, offsets,
+                                             vocab_size)
+        conversions = [('as_sequences', lambda: value.as_sequences(sparse_x))]
+        if vocab_size <= 1000:
+            conversions.append(('through dense', lambda: to_csr_through_dense(
+                value, vocab_size)))
+        for name, convert in conversions:
+            print('%-28s %.3f ms' % ('%s (%i)' % (name, vocab_size), 1000 *
+                  min(timeit.repeat(convert, number=3, repeat=3)) / 3))
+
+    value = C.Value.from_padded(x, data, lengths)
+    for name, convert in [
+            ('as_sequences', lambda: value.as_sequences()),
+            ('as_padded', lambda: value.as_padded()),
+            ('as_flat', lambda: value.as_flat())]:
+        print('%-28s %.3f ms' % (name, 1000 *
+              min(timeit.repeat(convert, number=10, repeat=3)) / 10))
@@ -4,6 +4,7 @@
 # for full license information.
 # ==============================================================================
 
+import os
 import warnings
 import numpy as np
 from cntk import Value, Function, sequence, as_block, times, parameter, plus, reduce_sum
@@ -333,3 +334,136 @@ def test_scalar_loss_function():
     assert trainer.total_number_of_samples_seen == 2
 
 
+
+
+def _accumulation_trainer(accumulate_steps, progress_writers=None):
+    x = C.input_variable(2)
+    l = C.input_variable(2)
+    z = C.layers.Dense(2, init=C.glorot_uniform(seed=1))(x)
+    ce = cross_entropy_with_softmax(z, l)
+    lr_per_minibatch = C.learning_rate_schedule(0.5, C.UnitType.minibatch)
+    trainer = C.Trainer(z, (ce, None), C.sgd(z.parameters, lr_per_minibatch),
+                        progress_writers, accumulate_steps=accumulate_steps)
+    return x, l, z, trainer
+
+
+def test_trainer_gradient_accumulation(tmpdir):
+    features = np.asarray([[1, 0], [0, 1], [1, 1], [2, 0]], dtype=np.float32)
+    labels = np.asarray([[1, 0], [0, 1], [0, 1], [1, 0]], dtype=np.float32)
+
+    x, l, z, reference = _accumulation_trainer(1)
+    reference.train_minibatch({x: features, l: labels})
+    expected = [p.value for p in z.parameters]
+
+    printer = C.logging.ProgressPrinter(0)
+    x, l, z, trainer = _accumulation_trainer(2, printer)
+    assert trainer.accumulate_steps == 2
+    initial = [p.value for p in z.parameters]
+
+    assert trainer.train_minibatch({x: features[:2], l: labels[:2]})
+    assert trainer.accumulated_minibatch_count == 1
+    assert trainer.accumulated_sample_count == 2
+    assert trainer.previous_minibatch_sample_count == 2
+    for p, v in zip(z.parameters, initial):
+        assert np.array_equal(p.value, v)
+
+    checkpoint = str(tmpdir / 'accumulation.dat')
+    trainer.save_checkpoint(checkpoint)
+
+    assert trainer.train_minibatch({x: features[2:], l: labels[2:]})
+    assert trainer.accumulated_minibatch_count == 0
+    assert trainer.total_number_of_samples_seen == 4
+    assert printer.samples_since_start == 4
+    for p, v in zip(z.parameters, expected):
+        assert np.allclose(p.value, v)
+
+    # the pending gradients are restored from the checkpoint
+    trainer.restore_from_checkpoint(checkpoint)
+    assert trainer.accumulated_minibatch_count == 1
+    assert trainer.accumulated_sample_count == 2
+    for p, v in zip(z.parameters, initial):
+        assert np.array_equal(p.value, v)
+    trainer.train_minibatch({x: features[2:], l: labels[2:]})
+    for p, v in zip(z.parameters, expected):
+        assert np.allclose(p.value, v)
+
+    # an empty minibatch applies the pending gradients
+    trainer.train_minibatch({x: features[:2], l: labels[:2]})
+    assert trainer.accumulated_minibatch_count == 1
+    trainer.train_minibatch({})
+    assert trainer.accumulated_minibatch_count == 0
+    assert trainer.total_number_of_samples_seen == 6
+
+    with pytest.raises(ValueError):
+        _accumulation_trainer(0)
+
+
+def test_trainer_background_checkpoint(tmpdir):
+    features = np.asarray([[1, 0], [0, 1]], dtype=np.float32)
+    labels = np.asarray([[1, 0], [0, 1]], dtype=np.float32)
+
+    x, l, z, trainer = _accumulation_trainer(1)
+    trainer.set_checkpoint_writing(background=True, keep_last=2)
+
+    checkpoints = [str(tmpdir / ('background%d.dat' % i)) for i in range(3)]
+    saved = []
+    for checkpoint in checkpoints:
+        trainer.train_minibatch({x: features, l: labels})
+        saved.append([p.value for p in z.parameters])
+        trainer.save_checkpoint(checkpoint, {'index': len(saved)})
+    trainer.wait_for_checkpoint()
+
+    # only the last two checkpoints are kept
+    assert not os.path.exists(checkpoints[0])
+    assert not os.path.exists(checkpoints[0] + '.ckp')
+    for checkpoint in checkpoints[1:]:
+        assert os.path.exists(checkpoint)
+        assert os.path.exists(checkpoint + '.ckp')
+    assert not [f for f in os.listdir(str(tmpdir)) if f.endswith('.tmp')]
+
+    stats = trainer.checkpoint_stats()
+    assert isinstance(stats, C.train.CheckpointStats)
+    assert stats.checkpoints == 3
+    assert stats.snapshot_time >= stats.last_snapshot_time >= 0
+    assert stats.write_time >= stats.last_write_time >= 0
+
+    # the checkpoint holds the parameters at the time of the snapshot
+    trainer.train_minibatch({x: features, l: labels})
+    trainer.restore_from_checkpoint(checkpoints[1])
+    for p, v in zip(z.parameters, saved[1]):
+        assert np.array_equal(p.value, v)
+    assert trainer.total_number_of_samples_seen == 4
+
+    with pytest.raises(ValueError):
+        trainer.set_checkpoint_writing(keep_last=0)
+
+
+if __name__ == '__main__':
+    # Compares how long synchronous and background checkpoints pause the
+    # training of a model with about 64 MB of parameters.
+    import shutil
+    import tempfile
+    import time
+
+    x = C.input_variable(2048)
+    l = C.input_variable(2048)
+    z = C.layers.Sequential([C.layers.Dense(2048) for _ in range(4)])(x)
+    ce = cross_entropy_with_softmax(z, l)
+    trainer = C.Trainer(z, (ce, None), C.sgd(
+        z.parameters, C.learning_rate_schedule(0.1, C.UnitType.minibatch)))
+    data = {x: np.random.rand(64, 2048).astype(np.float32),
+            l: np.eye(2048, dtype=np.float32)[:64]}
+
+    directory = tempfile.mkdtemp()
+    try:
+        for background in [False, True]:
+            trainer.set_checkpoint_writing(background, keep_last=2)
+            start = time.time()
+            for i in range(10):
+                trainer.train_minibatch(data)
+                trainer.save_checkpoint(os.path.join(directory, 'model%d' % i))
+            trainer.wait_for_checkpoint()
+            print('background=%s: %.3fs' % (background, time.time() - start))
+            print(trainer.checkpoint_stats())
+    finally:
+        shutil.rmtree(directory)
@@ -4,6 +4,8 @@
 # for full license information.
 # ==============================================================================
 
+import collections
+
 from .. import cntk_py
 from ..device import use_default_device
 from cntk.internal import sanitize_var_map, sanitize_function, typemap, \
@@ -11,6 +13,11 @@ from cntk.internal import sanitize_var_map, sanitize_function, typemap, \
 from cntk.internal.utils import _py_dict_to_cntk_dict
 from ..io import MinibatchData
 
+CheckpointStats = collections.namedtuple('CheckpointStats',
+                                         ['checkpoints', 'snapshot_time',
+                                          'write_time', 'last_snapshot_time',
+                                          'last_write_time'])
+
 
 __doc__ = '''\
 A trainer encapsulates the overall training process and employs one or more
@@ -37,6 +44,14 @@ class Trainer(cntk_py.Trainer):
         progress_writers (progress writer or list of them): optionally, list of
         progress writers from :mod:`cntk.utils` to automatically track training
         progress.
+       accumulate_steps (int, default 1): number of minibatches whose gradients
+        are summed up before the learners update the parameters once, with
+        the total number of samples of these minibatches. This trains with an
+        effective minibatch ``accumulate_steps`` times as large, while the
+        memory needed per minibatch stays the same. The gradients are applied
+        early at the end of a sweep and at the end of the data (an empty
+        minibatch). Pending gradients are saved in checkpoints. Not supported
+        with distributed learners.
 
     Todo:
        Allow to skip some parameters that should not be updated.
@@ -55,7 +70,10 @@ class Trainer(cntk_py.Trainer):
             raise ValueError("criterion parameter must be a singleton or a tuple of 2 elements")
         return criterion
 
-    def __init__(self, model, criterion, parameter_learners, progress_writers=None):
+    def __init__(self, model, criterion, parameter_learners, progress_writers=None,
+                 accumulate_steps=1):
+        if accumulate_steps < 1:
+            raise ValueError('accumulate_steps must be positive')
         loss_function, eval_function = Trainer._get_loss_metric(criterion)
         # TODO sanitizing should be removed once Swig's typemaps are in place
         if model is not None:  # None means dummy model that is, e.g., the same as a criterion
@@ -73,6 +91,8 @@ class Trainer(cntk_py.Trainer):
         trainer = cntk_py.trainer_impl(model, loss_function, eval_function, parameter_learners, progress_writers)
         # transplant into this class instance
         self.__dict__ = trainer.__dict__
+        if accumulate_steps != 1:
+            self.accumulate_steps = accumulate_steps
 
     # TODO: bring this back once the design has been settled
     def _train_test_mb_map_args(self, *args, **kwargs):
@@ -131,6 +151,8 @@ class Trainer(cntk_py.Trainer):
             indicate end of learning (through their update). Otherwise, the
             return value is a tuple of the that `bool` and a dictionary that
             maps the variables in `outputs` to their respective NumPy arrays.
+            Minibatches whose gradients are only accumulated (see
+            ``accumulate_steps``) return `True`.
         '''
         if not device:
             device = use_default_device()
@@ -230,12 +252,65 @@ class Trainer(cntk_py.Trainer):
         In distributed environment the checkpointing is done by 
         the main worker.
 
+        If the checkpoints are written in the background (see
+        :meth:`set_checkpoint_writing`), this only takes a snapshot of the
+        model and the Trainer state in host memory and returns while the
+        checkpoint is written.
+
         Args:
             filename (str): filename to store the checkpoint.
         '''
 
         super(Trainer, self).save_checkpoint(filename, _py_dict_to_cntk_dict(external_state))
 
+    def set_checkpoint_writing(self, background=False, keep_last=None):
+        '''
+        Configures how :meth:`save_checkpoint` writes the checkpoints.
+
+        In the background mode, :meth:`save_checkpoint` takes a snapshot of
+        the parameters and the Trainer state in host memory, and the files are
+        written on a worker thread while the training continues. They are
+        written to temporary files first and renamed on completion, so an
+        interrupted write never leaves a partial checkpoint behind. At most
+        one checkpoint is written at a time; saving the next one waits for
+        the previous one. Distributed trainers always write synchronously.
+
+        Args:
+            background (bool, default False): whether to write the
+             checkpoints on a worker thread
+            keep_last (int, default None): if set, only the last
+             ``keep_last`` checkpoints written by this trainer are kept and
+             older ones are deleted
+        '''
+        if keep_last is not None and keep_last < 1:
+            raise ValueError('keep_last must be positive')
+        super(Trainer, self).set_checkpoint_writing(background, keep_last or 0)
+
+    def wait_for_checkpoint(self):
+        '''
+        Waits until the checkpoint written in the background is complete, and
+        raises the error that occurred while writing it, if any.
+        :meth:`restore_from_checkpoint` waits automatically.
+        '''
+        super(Trainer, self).wait_for_checkpoint()
+
+    def checkpoint_stats(self):
+        '''
+        Returns how long the checkpoints paused the training. In the
+        background mode, only the snapshot time pauses the training, while
+        the write time overlaps with it.
+
+        Returns:
+            :class:`CheckpointStats` with the number of checkpoints written,
+            the total seconds spent taking snapshots and writing them, and
+            the seconds spent on the snapshot and the write of the last one
+        '''
+        return CheckpointStats(super(Trainer, self).checkpoint_count(),
+                               super(Trainer, self).checkpoint_snapshot_time(),
+                               super(Trainer, self).checkpoint_write_time(),
+                               super(Trainer, self).last_checkpoint_snapshot_time(),
+                               super(Trainer, self).last_checkpoint_write_time())
+
     def restore_from_checkpoint(self, filename):
         '''
         Restores a checkpoint of the model and Trainer state from the
@@ -304,9 +379,40 @@ class Trainer(cntk_py.Trainer):
     def total_number_of_samples_seen(self):
         '''
         The number of samples seen globally between all workers from the beginning of training.
+        Samples whose gradients are still being accumulated are not counted yet.
         '''
         return super(Trainer, self).total_number_of_samples_seen()
 
+    @property
+    def accumulate_steps(self):
+        '''
+        The number of minibatches whose gradients are summed up before the
+        parameters are updated.
+        '''
+        return super(Trainer, self).gradient_accumulation_steps()
+
+    @accumulate_steps.setter
+    def accumulate_steps(self, steps):
+        if steps < 1:
+            raise ValueError('accumulate_steps must be positive')
+        super(Trainer, self).set_gradient_accumulation_steps(steps)
+
+    @property
+    def accumulated_minibatch_count(self):
+        '''
+        The number of minibatches whose gradients have been accumulated, but
+        not yet applied to the parameters.
+        '''
+        return super(Trainer, self).accumulated_minibatch_count()
+
+    @property
+    def accumulated_sample_count(self):
+        '''
+        The number of samples in the minibatches whose gradients have been
+        accumulated, but not yet applied to the parameters.
+        '''
+        return super(Trainer, self).accumulated_sample_count()
+
     def summarize_training_progress(self):
         '''
         Updates the progress writers with the summary of training progress since start and resets the internal
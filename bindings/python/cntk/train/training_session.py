@@ -21,9 +21,13 @@ class CheckpointConfig(cntk_py.CheckpointConfig):
           If ``sys.maxsize``, a single checkpoint is taken at the end of the training.
         preserve_all (bool): saves all checkpoints, using ``filename`` as prefix and checkpoint index as a suffix.
         restore (bool): flag, indicating whether to restore from available checkpoint before the start of the training
+        background (bool): writes the checkpoints on a worker thread while the training continues,
+          see :meth:`~cntk.train.trainer.Trainer.set_checkpoint_writing`.
+        keep_last (int): if set, only the last ``keep_last`` checkpoints are kept. Useful with ``preserve_all``.
     '''
     def __init__(self, filename, frequency=None,
-                 restore=True, preserve_all=False):
+                 restore=True, preserve_all=False,
+                 background=False, keep_last=None):
         '''Sets configuration of checkpointing behavior.
 
         Args:
@@ -32,6 +36,8 @@ class CheckpointConfig(cntk_py.CheckpointConfig):
               If ``sys.maxsize``, a single checkpoint is taken at the end of the training.
             preserve_all (bool): saves all checkpoints, using ``filename`` as prefix and checkpoint index as a suffix.
             restore (bool): flag, indicating whether to restore from available checkpoint before the start of the training
+            background (bool): writes the checkpoints on a worker thread while the training continues.
+            keep_last (int): if set, only the last ``keep_last`` checkpoints are kept.
 
         Returns:
             Reconfigured self.
@@ -46,8 +52,12 @@ class CheckpointConfig(cntk_py.CheckpointConfig):
         if frequency is None:
             frequency = sys.maxsize
 
+        if keep_last is not None and keep_last < 1:
+            raise ValueError("keep_last must be positive")
+
         super(CheckpointConfig, self).__init__(filename, frequency,
-                                               restore, preserve_all)
+                                               restore, preserve_all,
+                                               background, keep_last or 0)
 
 class CrossValidationConfig(cntk_py.CrossValidationConfig):
     '''